@@ -17,18 +17,44 @@ FEATURES:
 """
 
 import os
+import base64
+import codecs
+import contextlib
+import csv
+import hashlib
+import hmac
+import secrets
+import random
+import socket
+import queue
+import re
+import weakref
+from collections import deque, OrderedDict
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING as URLLIB3_ACCEPT_ENCODING
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import scrolledtext
+from tkinter import scrolledtext, filedialog
 from dotenv import load_dotenv
 import json
 import threading
-from PIL import Image
+import concurrent.futures
+from PIL import Image, features
 import io
 import asyncio
 import websockets
 
+try:
+    import aiohttp
+except ImportError:  # Simulated clients fall back to pooled requests sessions on worker threads
+    aiohttp = None
+
 # === Load .env ===
 load_dotenv()
 # Hardcoded Firebase credentials for internal testing (NOT SAFE FOR PRODUCTION)
@@ -54,11 +80,80 @@ TEST_USERS = [
     {"email": "b@b.com", "password": "bbbbbb"},
     {"email": "c@c.com", "password": "cccccc"},
 ]
+# Optional CSV (email,password header) or JSON user pool that replaces TEST_USERS at startup
+TEST_USERS_FILE = os.getenv("TEST_USERS_FILE", "")
+BULK_SIGNIN_CONCURRENCY = int(os.getenv("BULK_SIGNIN_CONCURRENCY", "50"))
+BULK_SIGNIN_RATE = float(os.getenv("BULK_SIGNIN_RATE", "0"))  # Sign-ins per second, 0 = unlimited
+# Local identitytoolkit stand-in (LOCAL_AUTH=1): HS256 JWTs a local backend verifies with LOCAL_AUTH_SECRET
+LOCAL_AUTH_PORT = int(os.getenv("LOCAL_AUTH_PORT", "9099"))
+LOCAL_AUTH_SECRET = os.getenv("LOCAL_AUTH_SECRET", "local-dev-secret")
+LOCAL_AUTH_TOKEN_LIFETIME = int(os.getenv("LOCAL_AUTH_TOKEN_LIFETIME", "3600"))
+LOCAL_AUTH_ACCEPT_ANY = os.getenv("LOCAL_AUTH_ACCEPT_ANY", "0") == "1"  # Accept any email with a non-empty password
 
 # === Backend URLs ===
 LOCAL_BASE_URL = "http://127.0.0.1:8000/"
 BASE_URL = LOCAL_BASE_URL
 WEBSOCKET_URL = "ws://127.0.0.1:8766/"
+CURRENT_TARGET = "Local"  # Key into ENV_TARGETS for the active BASE_URL
+
+# === HTTP connection pooling ===
+# Max keep-alive connections kept per target (override with HTTP_POOL_SIZE in .env)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+AUTH_TARGET = "Firebase Auth"  # Session pool key for identitytoolkit calls
+# Share one in-flight response between identical concurrent GETs (set COALESCE_GETS=0 for real fan-out)
+COALESCE_GETS = os.getenv("COALESCE_GETS", "1") != "0"
+# Retries for idempotent requests; POST retries are opt-in with HTTP_RETRY_POST=1
+HTTP_RETRY_ATTEMPTS = int(os.getenv("HTTP_RETRY_ATTEMPTS", "3"))
+HTTP_RETRY_POST = os.getenv("HTTP_RETRY_POST", "0") == "1"
+# Per-target circuit breaker: open after N consecutive failures, probe again after the cooldown
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "15"))
+# Outbound shaping per (target, endpoint class); 0 means unlimited
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "0"))
+PRODUCTION_RATE_LIMIT_RPS = float(os.getenv("PRODUCTION_RATE_LIMIT_RPS", "0"))  # Opt-in Production cap unless RATE_LIMIT_RPS is set
+# Response bodies at or above this many bytes are logged as a size, not parsed and printed
+LOG_PAYLOAD_MAX_BYTES = 1000
+STREAM_CHUNK_SIZE = 16 * 1024
+# Streamed song rows are handed to the Tk thread in batches of this size (or every 50 ms)
+SONG_ROW_BATCH = int(os.getenv("SONG_ROW_BATCH", "25"))
+# Refresh ID tokens this many seconds before they expire (Firebase tokens last one hour)
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+# Optional token cache file (e.g. ~/.music_room_tokens.json); empty disables it. Never stores passwords.
+TOKEN_CACHE_PATH = os.path.expanduser(os.getenv("TOKEN_CACHE_PATH", ""))
+# HAR recording: output folder, bodies above HAR_INLINE_BODY_MAX bytes go to side files
+HAR_DIR = os.getenv("HAR_DIR", "har_recordings")
+HAR_INLINE_BODY_MAX = int(os.getenv("HAR_INLINE_BODY_MAX", str(64 * 1024)))
+HAR_REDACT = os.getenv("HAR_REDACT", "1") != "0"  # Mask tokens, passwords and API keys in recordings
+# Override the negotiated Accept-Encoding (e.g. "identity" to measure an uncompressed baseline)
+HTTP_ACCEPT_ENCODING = os.getenv("HTTP_ACCEPT_ENCODING", "")
+# Byte budgets for the in-memory image store (process-wide, a hard cap) and for what the host and each
+# simulated client may pin in it (never more than half the store)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+HOST_IMAGE_CACHE_MAX_BYTES = int(os.getenv("HOST_IMAGE_CACHE_MAX_BYTES", str(24 * 1024 * 1024)))
+CLIENT_IMAGE_CACHE_MAX_BYTES = int(os.getenv("CLIENT_IMAGE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Decoded, resized images ready for display, keyed by (ETag, max size)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Downscaling: "fast" (JPEG draft decode, box reduce, bilinear) or "quality" (LANCZOS); tiles are <= TILE_MAX_SIDE px
+RESAMPLE_MODE = os.getenv("RESAMPLE_MODE", "quality")
+TILE_RESAMPLE_MODE = os.getenv("TILE_RESAMPLE_MODE", "fast")
+TILE_MAX_SIDE = 256
+# Worker threads that decode and resize images off the Tk main thread
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(min(4, os.cpu_count() or 2))))
+# Host page prefetch: pages on each side of the current one, and a bandwidth cap in bytes/s (0 = unlimited)
+PREFETCH_WINDOW = int(os.getenv("PREFETCH_WINDOW", "2"))
+PREFETCH_MAX_BYTES_PER_SEC = int(os.getenv("PREFETCH_MAX_BYTES_PER_SEC", str(2 * 1024 * 1024)))
+# Opt-in (IMAGE_NEGOTIATION=1): image fetches advertise WebP/AVIF and the display size (X-Display-Size: WxH)
+IMAGE_NEGOTIATION = os.getenv("IMAGE_NEGOTIATION", "0") == "1"
+IMAGE_VARIANT_PORT = int(os.getenv("IMAGE_VARIANT_PORT", "9098"))  # Local stand-in that honours them
+# Write per-user/per-client image cache metrics as JSON here when the app exits (empty disables)
+IMAGE_METRICS_PATH = os.path.expanduser(os.getenv("IMAGE_METRICS_PATH", ""))
+# Opt-in on-disk image tier kept across restarts (IMAGE_DISK_CACHE=1), in the per-user cache dir
+IMAGE_DISK_CACHE = os.getenv("IMAGE_DISK_CACHE", "0") == "1"
+IMAGE_DISK_CACHE_DIR = os.path.expanduser(os.getenv("IMAGE_DISK_CACHE_DIR", os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.getenv("LOCALAPPDATA") or "~/.cache", "educationalGUI", "images")))
+IMAGE_DISK_CACHE_MAX_BYTES = int(os.getenv("IMAGE_DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
 
 # Static target environments (extend via env variables)
 # You can set VM1_BASE_URL / VM1_WS_URL, VM2_BASE_URL / VM2_WS_URL, etc. in .env
@@ -79,11 +174,794 @@ for i in range(1, 5):
         ENV_TARGETS[f"VM{i}"] = {"base_url": base, "ws_url": ws}
 
 # === Centralized Cache and State Management ===
+def _format_size(n):
+    """n bytes as MiB, or KiB below 1 MiB so small caps do not read as 0."""
+    return f"{n / 1024 / 1024:.1f} MiB" if n >= 1024 * 1024 else f"{n / 1024:.1f} KiB"
+
+class DiskImageStore:
+    """Image files on disk, keyed by (target, URL, normalized ETag).
+
+    Each image is written once to objects/<sha256 of the key> by an atomic
+    rename; writes run on a single background writer, and reads are made
+    from worker threads, so the Tk thread never waits on the disk. The
+    newest file access is tracked in memory (and in the file mtime across
+    restarts); files are removed least recently used first once
+    IMAGE_DISK_CACHE_MAX_BYTES is exceeded. rooms.json remembers the last ETag
+    seen per (target, room) so a restarted host or client can send
+    If-None-Match and accept a 304 instead of the full image.
+    """
+    active = IMAGE_DISK_CACHE
+    root = IMAGE_DISK_CACHE_DIR
+    max_bytes = IMAGE_DISK_CACHE_MAX_BYTES
+    _entries = None  # object name -> size in bytes, least recently used first
+    _bytes = 0
+    _rooms = None    # "target|netloc|room_id" -> [normalized ETag, object name]
+    _lock = threading.Lock()
+    _writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-disk")
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    @classmethod
+    def enabled(cls):
+        return cls.active and bool(cls.root) and cls.max_bytes > 0
+
+    @staticmethod
+    def _name(url, etag):
+        return hashlib.sha256(f"{CURRENT_TARGET}\n{url}\n{etag}".encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _object_path(cls, name):
+        return os.path.join(cls.root, "objects", name[:2], name)
+
+    @classmethod
+    def _load(cls):
+        """Index existing objects by mtime on first use. Caller holds _lock."""
+        if cls._entries is not None:
+            return
+        found = []
+        objects = os.path.join(cls.root, "objects")
+        try:
+            os.makedirs(objects, exist_ok=True)
+            for bucket in os.scandir(objects):
+                if bucket.is_dir():
+                    for entry in os.scandir(bucket.path):
+                        if entry.is_file() and not entry.name.endswith(".tmp"):
+                            st = entry.stat()
+                            found.append((st.st_mtime, entry.name, st.st_size))
+        except OSError as e:
+            log("Cache", "error", f"Image disk cache {cls.root} unavailable: {e}")
+        found.sort()
+        cls._entries = OrderedDict((name, size) for _, name, size in found)
+        cls._bytes = sum(cls._entries.values())
+        try:
+            with open(os.path.join(cls.root, "rooms.json"), encoding="utf-8") as f:
+                cls._rooms = json.load(f)
+        except (OSError, ValueError):
+            cls._rooms = {}
+
+    @classmethod
+    def get(cls, url, etag):
+        """Return the stored bytes for (current target, url, etag), or None."""
+        if not url or not etag or not cls.enabled():
+            return None
+        name = cls._name(url, etag)
+        path = cls._object_path(name)
+        with cls._lock:
+            cls._load()
+            if name not in cls._entries:
+                cls.misses += 1
+                return None
+            cls._entries.move_to_end(name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError as e:
+            with cls._lock:
+                size = cls._entries.pop(name, None)
+                if size is not None:
+                    cls._bytes -= size
+                cls.misses += 1
+            log("Cache", "warning", f"Dropped unreadable disk cache entry for ETag {etag[:10]}...: {e}")
+            return None
+        with cls._lock:
+            cls.hits += 1
+        return data
+
+    @classmethod
+    def put(cls, url, etag, data):
+        """Queue data for (current target, url, etag); storing the same key again only refreshes recency."""
+        if not url or not etag or not data or not cls.enabled() or len(data) > cls.max_bytes:
+            return
+        cls._writer.submit(cls._write, cls._name(url, etag), etag, data)
+
+    @classmethod
+    def _write(cls, name, etag, data):
+        path = cls._object_path(name)
+        with cls._lock:
+            cls._load()
+            if name in cls._entries:
+                cls._entries.move_to_end(name)
+                return
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            log("Cache", "error", f"Could not write image {etag[:10]}... to disk cache: {e}")
+            return
+        with cls._lock:
+            if name not in cls._entries:
+                cls._entries[name] = len(data)
+                cls._bytes += len(data)
+            victims = []
+            while cls._bytes > cls.max_bytes and len(cls._entries) > 1:
+                victim, size = cls._entries.popitem(last=False)
+                cls._bytes -= size
+                cls.evictions += 1
+                victims.append(victim)
+        for victim in victims:
+            try:
+                os.remove(cls._object_path(victim))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _room_key(room_id):
+        return f"{CURRENT_TARGET}|{urlsplit(BASE_URL).netloc}|{room_id}"
+
+    @classmethod
+    def room_etag(cls, room_id):
+        """Last ETag stored for room_id on the current target, if its image is still on disk."""
+        if not room_id or not cls.enabled():
+            return None
+        with cls._lock:
+            cls._load()
+            entry = cls._rooms.get(cls._room_key(room_id))
+            return entry[0] if isinstance(entry, list) and entry[1] in cls._entries else None
+
+    @classmethod
+    def remember_room(cls, room_id, etag):
+        """Record etag as room_id's image; queued behind the image's own write."""
+        if not room_id or not etag or not cls.enabled():
+            return
+        entry = [etag, cls._name(_room_image_url(room_id), etag)]
+        cls._writer.submit(cls._remember_room, cls._room_key(room_id), entry)
+
+    @classmethod
+    def _remember_room(cls, key, entry):
+        with cls._lock:
+            cls._load()
+            if cls._rooms.get(key) == entry:
+                return
+            cls._rooms[key] = entry
+            # Forget rooms whose image has been evicted (and entries from the older ETag-only format)
+            cls._rooms = {k: v for k, v in cls._rooms.items() if isinstance(v, list) and v[1] in cls._entries}
+            rooms = dict(cls._rooms)
+        path = os.path.join(cls.root, "rooms.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rooms, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            log("Cache", "error", f"Could not write {path}: {e}")
+
+    @classmethod
+    def describe(cls):
+        with cls._lock:
+            cls._load()
+            return (f"{cls.root}: {len(cls._entries)} images, {_format_size(cls._bytes)}/"
+                    f"{_format_size(cls.max_bytes)} | hits {cls.hits} misses {cls.misses} | evicted {cls.evictions}")
+
+class ImageCache:
+    """Process-wide, byte-bounded segmented LRU of image bytes keyed by normalized ETag.
+
+    New entries land in a probation segment; a second hit promotes them to the
+    protected segment (at most 80% of the budget). Eviction takes the least
+    recently used probation entry first, so one pass over many pages cannot
+    flush images that are viewed repeatedly. Entries referenced by an
+    ImageCacheView are never evicted; each image is held once however many
+    views reference it. max_bytes is a hard cap: a new image that does not fit
+    after evicting every unreferenced entry is refused (put returns None).
+    """
+    PROTECTED_SHARE = 0.8
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._probation = OrderedDict()  # etag -> bytes, LRU first
+        self._protected = OrderedDict()
+        self._probation_bytes = 0
+        self._protected_bytes = 0
+        self._refs = {}  # etag -> number of views holding it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0  # puts that found the bytes already stored
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.refused = 0  # New images turned away because pinned entries filled the budget
+
+    @property
+    def resident_bytes(self):
+        return self._probation_bytes + self._protected_bytes
+
+    def __len__(self):
+        return len(self._probation) + len(self._protected)
+
+    def __contains__(self, etag):
+        """Membership test that does not count as a hit or touch recency."""
+        return etag in self._probation or etag in self._protected
+
+    def get(self, etag):
+        """Return the stored bytes object (shared, never copied) or None."""
+        if not etag:
+            return None
+        with self._lock:
+            if etag in self._protected:
+                self._protected.move_to_end(etag)
+                self.hits += 1
+                return self._protected[etag]
+            data = self._probation.pop(etag, None)
+            if data is None:
+                self.misses += 1
+                return None
+            self._probation_bytes -= len(data)
+            self._protected[etag] = data
+            self._protected_bytes += len(data)
+            self._demote_overflow()
+            self.hits += 1
+            return data
+
+    def put(self, etag, data, acquire=False):
+        """Store data under etag and return the canonical bytes object.
+
+        If the ETag is already stored its existing bytes are kept and returned,
+        so N clients receiving the same page image share one buffer. With
+        acquire=True the entry is pinned atomically with the insert. Returns
+        None if a new image cannot fit under max_bytes.
+        """
+        if not etag or not data:
+            return None
+        with self._lock:
+            existing = self._protected.get(etag)
+            if existing is None:
+                existing = self._probation.get(etag)
+                if existing is not None:
+                    self._probation.move_to_end(etag)
+            else:
+                self._protected.move_to_end(etag)
+            if existing is not None:
+                self.deduplicated += 1
+                data = existing
+            else:
+                self._evict(incoming=len(data))
+                if self.resident_bytes + len(data) > self.max_bytes:
+                    self.refused += 1
+                    return None
+                data = bytes(data)
+                self._probation[etag] = data
+                self._probation_bytes += len(data)
+            if acquire:
+                self._refs[etag] = self._refs.get(etag, 0) + 1
+            return data
+
+    def acquire(self, etag):
+        with self._lock:
+            self._refs[etag] = self._refs.get(etag, 0) + 1
+
+    def release(self, etags):
+        """Drop one reference to each ETag; unreferenced entries become evictable."""
+        with self._lock:
+            for etag in etags:
+                count = self._refs.get(etag, 0) - 1
+                if count > 0:
+                    self._refs[etag] = count
+                else:
+                    self._refs.pop(etag, None)
+            self._evict()
+
+    def _evict(self, incoming=0):
+        """Evict unreferenced entries, probation first, until incoming more bytes fit. Caller holds _lock."""
+        for segment in (self._probation, self._protected):
+            if self.resident_bytes + incoming <= self.max_bytes:
+                return
+            for etag in [e for e in segment if e not in self._refs]:
+                victim = segment.pop(etag)
+                if segment is self._probation:
+                    self._probation_bytes -= len(victim)
+                else:
+                    self._protected_bytes -= len(victim)
+                self.evictions += 1
+                self.evicted_bytes += len(victim)
+                if self.resident_bytes + incoming <= self.max_bytes:
+                    return
+
+    def _demote_overflow(self):
+        limit = self.max_bytes * self.PROTECTED_SHARE
+        while self._protected_bytes > limit and len(self._protected) > 1:
+            etag, data = self._protected.popitem(last=False)
+            self._protected_bytes -= len(data)
+            self._probation[etag] = data
+            self._probation_bytes += len(data)
+
+    def memoryview(self, etag):
+        """Zero-copy read-only view of a stored image, or None."""
+        data = self.get(etag)
+        return memoryview(data) if data is not None else None
+
+    def describe(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"{self.name}: {len(self)} images ({len(self._refs)} referenced), "
+                f"{self.resident_bytes / 1024:.0f}/{self.max_bytes / 1024:.0f} KiB | "
+                f"hits {self.hits} misses {self.misses} ({hit_rate:.0f}% hit), {self.deduplicated} duplicate puts shared | "
+                f"evicted {self.evictions} ({self.evicted_bytes / 1024:.0f} KiB), refused {self.refused}")
+
+SHARED_IMAGE_CACHE = ImageCache("Shared", IMAGE_CACHE_MAX_BYTES)
+
+class ImageCacheView:
+    """One owner's (host or simulated client) set of ETags in SHARED_IMAGE_CACHE.
+
+    A view only reports the images its owner has fetched, so "found in client
+    cache" logs stay per client, but the bytes themselves live once in the
+    shared store. Held images are pinned there; the least recently used ones
+    are released to make room once the view's own byte budget (at most
+    MAX_STORE_SHARE of the store) would be exceeded. Misses fall through to
+    the optional backing tier (DiskImageStore).
+    """
+    MAX_STORE_SHARE = 0.5
+    _instances = weakref.WeakSet()
+
+    def __init__(self, name, max_bytes, store=SHARED_IMAGE_CACHE, backing=None, source=None):
+        self.name = name
+        self.source = source or name  # Log source whose room image requests count toward this view
+        self.max_bytes = min(max_bytes, int(store.max_bytes * self.MAX_STORE_SHARE))
+        self.store = store
+        self.backing = backing
+        self._held = OrderedDict()  # etag -> size, LRU first
+        self._held_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0  # Bytes served from memory instead of the network
+        self.evictions = 0
+        ImageCacheView._instances.add(self)
+        # Unpin whatever a discarded view still holds
+        weakref.finalize(self, store.release, self._held)
+
+    @classmethod
+    def all(cls):
+        return sorted(cls._instances, key=lambda v: v.name)
+
+    @property
+    def resident_bytes(self):
+        return self._held_bytes
+
+    def __len__(self):
+        return len(self._held)
+
+    def __contains__(self, etag):
+        return etag in self._held
+
+    def get(self, etag, url=None):
+        """Held bytes for etag; with the image's url, a miss falls through to the backing tier."""
+        if not etag:
+            return None
+        with self._lock:
+            held = etag in self._held
+            if held:
+                self._held.move_to_end(etag)
+                self.hits += 1
+                self.hit_bytes += self._held[etag]
+            else:
+                self.misses += 1
+        if held:
+            return self.store.get(etag)
+        data = self.backing.get(url, etag) if self.backing and url else None
+        if data is not None:
+            data = self.put(etag, data) or data
+        return data
+
+    def peek(self, etag):
+        """Held bytes for etag without counting a hit, e.g. the copy a 304 revalidates."""
+        return self.store.get(etag) if etag in self._held else None
+
+    def put(self, etag, data):
+        """Hold etag in this view; returns the shared bytes, or None if it does not fit."""
+        if not etag or not data or len(data) > self.max_bytes:
+            return None
+        with self._lock:
+            if etag in self._held:
+                self._held.move_to_end(etag)
+                return self.store.put(etag, data)
+            # Release our own oldest images first so the store can evict them for this one
+            released = []
+            while self._held and self._held_bytes + len(data) > self.max_bytes:
+                old, size = self._held.popitem(last=False)
+                self._held_bytes -= size
+                self.evictions += 1
+                released.append(old)
+            if released:
+                self.store.release(released)
+            shared = self.store.put(etag, data, acquire=True)
+            if shared is None:
+                return None  # Store is full of images other views still pin
+            self._held[etag] = len(shared)
+            self._held_bytes += len(shared)
+        return shared
+
+    def clear(self):
+        with self._lock:
+            released = list(self._held)
+            self._held.clear()
+            self._held_bytes = 0
+        self.store.release(released)
+
+    def metrics(self):
+        """Structured counters for this owner, merged with its conditional GET results."""
+        full, not_modified, saved, downloaded = ConditionalGetStats.counts(self.source)
+        lookups = self.hits + self.misses
+        return {
+            "owner": self.name,
+            "source": self.source,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "full_downloads": full,
+            "revalidated_304": not_modified,
+            "bytes_downloaded": downloaded,
+            "bytes_avoided": self.hit_bytes + saved,
+            "resident_images": len(self._held),
+            "resident_bytes": self._held_bytes,
+            "released": self.evictions,
+        }
+
+    def describe(self):
+        return (f"{self.name}: holds {len(self._held)} images ({self._held_bytes / 1024:.0f} KiB) | "
+                f"hits {self.hits} misses {self.misses} | released {self.evictions}")
+
+class ThumbnailCache:
+    """Decoded and resized PIL images keyed by (normalized ETag, max_size, resample mode).
+
+    Displaying an image otherwise costs a full decode plus a resize every
+    time, even on an ETag hit; flipping back to a page or N clients showing
+    the same page reuse one display-ready image instead. Images without an
+    ETag are decoded but not cached. Bounded by decoded pixel bytes, least
+    recently used first.
+
+    Resample modes: "quality" is LANCZOS via thumbnail()'s default 2x reducing
+    gap; "fast" asks the JPEG decoder for the smallest DCT scale still at
+    least max_size, box-reduces to within 1x and finishes with BILINEAR.
+    Tiles (both sides <= TILE_MAX_SIDE) use tile_mode, everything else mode.
+    """
+    MODES = ("fast", "quality")
+    mode = RESAMPLE_MODE if RESAMPLE_MODE in MODES else "quality"
+    tile_mode = TILE_RESAMPLE_MODE if TILE_RESAMPLE_MODE in MODES else "fast"
+    max_bytes = THUMBNAIL_CACHE_MAX_BYTES
+    _entries = OrderedDict()  # (etag, max_size, mode) -> (PIL image, decoded bytes), LRU first
+    _timings = {}  # (mode, max_size) -> deque of decode+resize ms
+    _bytes = 0
+    _lock = threading.Lock()
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    @classmethod
+    def mode_for(cls, max_size):
+        return cls.tile_mode if max(max_size) <= TILE_MAX_SIDE else cls.mode
+
+    @staticmethod
+    def resample(image_bytes, max_size, mode):
+        """Decode image_bytes and shrink it to fit max_size using the given mode."""
+        pil_img = Image.open(io.BytesIO(image_bytes))
+        if mode == "fast":
+            if pil_img.format == "JPEG":
+                pil_img.draft(None, max_size)  # DCT scaling: decode at 1/2, 1/4 or 1/8 size directly
+            pil_img.thumbnail(max_size, Image.Resampling.BILINEAR, reducing_gap=1.0)
+        else:
+            pil_img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        pil_img.load()  # Images already within max_size are otherwise decoded lazily, on first draw
+        return pil_img
+
+    @classmethod
+    def _decode(cls, image_bytes, max_size, mode=None):
+        mode = mode or cls.mode_for(max_size)
+        started = time.perf_counter()
+        pil_img = cls.resample(image_bytes, max_size, mode)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with cls._lock:
+            cls._timings.setdefault((mode, tuple(max_size)), deque(maxlen=500)).append(elapsed_ms)
+        return pil_img
+
+    @classmethod
+    def cached(cls, etag, max_size):
+        """The cached image for (etag, max_size) in the current mode, or None; never decodes."""
+        if not etag:
+            return None
+        key = (etag, tuple(max_size), cls.mode_for(max_size))
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            cls._entries.move_to_end(key)
+            cls.hits += 1
+            return entry[0]
+
+    @classmethod
+    def timing_summary(cls):
+        """[(mode, max_size, count, p50 ms, p95 ms)] of decode+resize times."""
+        with cls._lock:
+            items = [(k, sorted(v)) for k, v in cls._timings.items()]
+        return [(mode, size, len(ms), ms[len(ms) // 2], ms[min(len(ms) - 1, int(len(ms) * 0.95))])
+                for (mode, size), ms in sorted(items) if ms]
+
+    @classmethod
+    def thumbnail(cls, image_bytes, max_size, etag=None):
+        """Return a display-ready PIL image no larger than max_size; callers must not modify it."""
+        if not etag or cls.max_bytes <= 0:
+            return cls._decode(image_bytes, max_size)
+        mode = cls.mode_for(max_size)
+        key = (etag, tuple(max_size), mode)
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None:
+                cls._entries.move_to_end(key)
+                cls.hits += 1
+                return entry[0]
+            cls.misses += 1
+        pil_img = cls._decode(image_bytes, max_size, mode)
+        size = pil_img.width * pil_img.height * len(pil_img.getbands())
+        with cls._lock:
+            if key not in cls._entries and size <= cls.max_bytes:
+                cls._entries[key] = (pil_img, size)
+                cls._bytes += size
+                while cls._bytes > cls.max_bytes:
+                    _, (_, evicted) = cls._entries.popitem(last=False)
+                    cls._bytes -= evicted
+                    cls.evictions += 1
+        return pil_img
+
+    @classmethod
+    def describe(cls):
+        return (f"resample {cls.mode} (tiles {cls.tile_mode}) | {len(cls._entries)} thumbnails, {cls._bytes / 1024 / 1024:.1f}/{cls.max_bytes / 1024 / 1024:.0f} MiB | "
+                f"hits {cls.hits} misses {cls.misses} | evicted {cls.evictions}")
+
+class DecodePipeline:
+    """Decode and resize images on a worker pool, then hand them to Tk with after().
+
+    Each display slot (a frame, popup or client) keeps only its newest
+    request: submitting again cancels a decode still queued, and a result that
+    was superseded while decoding is dropped instead of drawn. A cached
+    thumbnail is drawn immediately without a thread hop. Queue wait, decode
+    and submit-to-draw times are kept for Show HTTP Stats.
+    """
+    _executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, DECODE_WORKERS), thread_name_prefix="decode")
+    _latest = {}  # slot -> (ticket, future) of the newest submission
+    _ticket = 0
+    _lock = threading.Lock()
+    wait_ms = deque(maxlen=1000)
+    decode_ms = deque(maxlen=1000)
+    total_ms = deque(maxlen=1000)
+    from_cache = 0
+    cancelled = 0
+    failed = 0
+
+    @classmethod
+    def submit(cls, slot, widget, image_bytes, max_size, etag, on_ready, on_error=None):
+        """Call on_ready(pil_image) on the Tk thread once decoded; call from the Tk thread."""
+        pil_img = ThumbnailCache.cached(etag, max_size)
+        with cls._lock:
+            previous = cls._latest.pop(slot, None)
+            if previous and previous[1].cancel():
+                cls.cancelled += 1
+            if pil_img is not None:
+                cls.from_cache += 1
+            else:
+                cls._ticket += 1
+                ticket, submitted = cls._ticket, time.perf_counter()
+                future = cls._executor.submit(cls._decode, slot, ticket, image_bytes, max_size, etag, submitted)
+                cls._latest[slot] = (ticket, future)
+        if pil_img is not None:
+            on_ready(pil_img)
+            return
+        future.add_done_callback(lambda f: cls._deliver(f, slot, ticket, widget, on_ready, on_error, submitted))
+
+    @classmethod
+    def cancel(cls, slot):
+        """Drop the pending decode for slot, e.g. when its view switches to a message."""
+        with cls._lock:
+            previous = cls._latest.pop(slot, None)
+            if previous and previous[1].cancel():
+                cls.cancelled += 1
+
+    @classmethod
+    def _is_latest(cls, slot, ticket):
+        """Caller holds _lock."""
+        latest = cls._latest.get(slot)
+        return latest is not None and latest[0] == ticket
+
+    @classmethod
+    def _decode(cls, slot, ticket, image_bytes, max_size, etag, submitted):
+        started = time.perf_counter()
+        with cls._lock:
+            if not cls._is_latest(slot, ticket):
+                cls.cancelled += 1
+                return None  # A newer image for this slot arrived while we were queued
+            cls.wait_ms.append((started - submitted) * 1000)
+        pil_img = ThumbnailCache.thumbnail(image_bytes, max_size, etag)
+        with cls._lock:
+            cls.decode_ms.append((time.perf_counter() - started) * 1000)
+        return pil_img
+
+    @classmethod
+    def _deliver(cls, future, slot, ticket, widget, on_ready, on_error, submitted):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None and future.result() is None:
+            return
+
+        def apply():
+            with cls._lock:
+                if not cls._is_latest(slot, ticket):
+                    cls.cancelled += 1
+                    return
+                del cls._latest[slot]
+                if error is not None:
+                    cls.failed += 1
+            if not widget.winfo_exists():
+                return
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    log("Image", "error", f"Error decoding image: {error}")
+                return
+            on_ready(future.result())
+            with cls._lock:
+                cls.total_ms.append((time.perf_counter() - submitted) * 1000)
+
+        try:
+            widget.after(0, apply)
+        except (RuntimeError, tk.TclError):
+            with cls._lock:
+                if cls._is_latest(slot, ticket):
+                    del cls._latest[slot]  # Widget destroyed or Tk shut down before delivery
+
+    @classmethod
+    def describe(cls):
+        def pct(values, q):
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+        with cls._lock:
+            decode, wait, total = list(cls.decode_ms), list(cls.wait_ms), list(cls.total_ms)
+            from_cache, cancelled, failed = cls.from_cache, cls.cancelled, cls.failed
+        return (f"{DECODE_WORKERS} workers | decoded {len(decode)} (p50 {pct(decode, 0.5):.1f} ms, p95 {pct(decode, 0.95):.1f} ms), "
+                f"queue p95 {pct(wait, 0.95):.1f} ms, submit-to-draw p95 {pct(total, 0.95):.1f} ms | "
+                f"{from_cache} drawn from thumbnail cache, {cancelled} stale decodes cancelled, {failed} failed")
+
+class ImageView:
+    """An image area that keeps its widgets and only swaps the image and text.
+
+    Built once per frame (ImageView.for_frame) with an optional caption, a
+    message label and an image label. Updates reconfigure the existing
+    CTkImage instead of destroying and recreating labels, so a page flip costs
+    one PhotoImage rather than new Tk widgets. Time spent in Tk calls per
+    update is kept for Show HTTP Stats. Use from the Tk thread only.
+    """
+    render_ms = deque(maxlen=1000)
+    views_built = 0
+    image_updates = 0
+    text_updates = 0
+
+    def __init__(self, frame):
+        for widget in frame.winfo_children():
+            widget.destroy()  # Placeholders packed before the view existed
+        self.frame = frame
+        self.caption = ctk.CTkLabel(frame, text="")
+        self.message = ctk.CTkLabel(frame, text="")
+        self.image_label = ctk.CTkLabel(frame, text="")
+        self._text_color = self.message.cget("text_color")
+        self._ctk_img = None
+        self._body = None  # Whichever of message/image_label is packed
+        self._caption_packed = False
+        frame._image_view = self
+        ImageView.views_built += 1
+
+    @classmethod
+    def for_frame(cls, frame):
+        """The view attached to frame, rebuilt if something destroyed its widgets."""
+        view = getattr(frame, "_image_view", None)
+        if view is None or not view.image_label.winfo_exists():
+            view = cls(frame)
+        return view
+
+    def set_caption(self, text):
+        started = time.perf_counter()
+        self.caption.configure(text=text)
+        if not self._caption_packed:
+            if self._body is not None:
+                self.caption.pack(pady=5, before=self._body)
+            else:
+                self.caption.pack(pady=5)
+            self._caption_packed = True
+        ImageView.render_ms.append((time.perf_counter() - started) * 1000)
+
+    def show_image(self, pil_img):
+        started = time.perf_counter()
+        if self._ctk_img is None:
+            self._ctk_img = ctk.CTkImage(light_image=pil_img, size=pil_img.size)
+            self.image_label.configure(image=self._ctk_img)
+        else:
+            self._ctk_img.configure(light_image=pil_img, size=pil_img.size)
+        self._switch_to(self.image_label)
+        ImageView.image_updates += 1
+        ImageView.render_ms.append((time.perf_counter() - started) * 1000)
+
+    def show_text(self, text, text_color=None):
+        DecodePipeline.cancel(str(self.frame))  # A late decode must not replace the message
+        started = time.perf_counter()
+        self.message.configure(text=text, text_color=text_color or self._text_color)
+        self._switch_to(self.message)
+        ImageView.text_updates += 1
+        ImageView.render_ms.append((time.perf_counter() - started) * 1000)
+
+    def _switch_to(self, label):
+        if self._body is label:
+            return
+        if self._body is not None:
+            self._body.pack_forget()
+        label.pack(expand=True, pady=5)
+        self._body = label
+
+    @classmethod
+    def describe(cls):
+        ordered = sorted(cls.render_ms)
+        def pct(q):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+        return (f"{cls.views_built} views built, {cls.image_updates} image and {cls.text_updates} text updates on reused widgets | "
+                f"render p50 {pct(0.5):.2f} ms, p95 {pct(0.95):.2f} ms")
+
+class ConditionalGetStats:
+    """Full (200) vs revalidated (304) image responses per log source, with bytes downloaded and saved."""
+    _counts = {}  # source -> [full downloads, not modified, bytes saved, bytes downloaded]
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, source, status, saved_bytes=0, downloaded_bytes=0):
+        with cls._lock:
+            counts = cls._counts.setdefault(source, [0, 0, 0, 0])
+            if status == 200:
+                counts[0] += 1
+                counts[3] += downloaded_bytes
+            elif status == 304:
+                counts[1] += 1
+                counts[2] += saved_bytes
+
+    @classmethod
+    def counts(cls, source):
+        """(full, not_modified, bytes_saved, bytes_downloaded) for one source."""
+        with cls._lock:
+            return tuple(cls._counts.get(source, (0, 0, 0, 0)))
+
+    @classmethod
+    def summary(cls):
+        """[(source, full, not_modified, bytes_saved, bytes_downloaded)] sorted by source, plus a "Total" row."""
+        with cls._lock:
+            rows = [(source, *counts) for source, counts in sorted(cls._counts.items())]
+        if rows:
+            rows.append(("Total", *(sum(r[i] for r in rows) for i in range(1, 5))))
+        return rows
+
 class UserCache:
     """Centralized cache for a single user with all their data and clients."""
     def __init__(self, user_email):
         self.user_email = user_email
-        self.id_token = None
         self.room_id = None
         
         # Host state
@@ -92,6 +970,7 @@ class UserCache:
         self.host_current_song_id = None
         self.host_last_image_etag = None
         self.host_last_image_bytes = None
+        self.host_image_request = None  # Token of the newest off-thread room image fetch
         self.host_ws_thread = None
         self.host_ws_connection = None
         self.host_is_disconnecting = False
@@ -114,11 +993,16 @@ class UserCache:
         self.ws_connections = {}  # client_id -> connection info
         
         # Image cache for all clients
-        self.image_cache = {}  # etag -> image_bytes
+        self.image_cache = ImageCacheView(f"User {user_email}", HOST_IMAGE_CACHE_MAX_BYTES, backing=DiskImageStore, source="Host")  # etag -> image_bytes
         
         # API response cache
         self.api_cache = {}  # endpoint -> cached_response
         
+    @property
+    def id_token(self):
+        """Current ID token for this user, kept fresh by TokenManager."""
+        return TokenManager.current_token(self.user_email)
+
     def clear_all_caches(self):
         """Clear all cached data for this user."""
         self.songs_current_list.clear()
@@ -160,17 +1044,22 @@ class UserCache:
             log("Cache", "info", f"Removed client {client.client_id} from user {self.user_email}")
     
     def cache_image(self, etag, image_bytes):
-        """Cache an image with its ETag."""
+        """Cache an image with its ETag; returns the shared copy, or None if not cached."""
         if etag and image_bytes:
-            self.image_cache[etag] = image_bytes
-            log("Cache", "info", f"Cached image with ETag {etag[:10]}... ({len(image_bytes)} bytes)")
+            shared = self.image_cache.put(etag, image_bytes)
+            if shared is not None:
+                log("Cache", "info", f"Cached image with ETag {etag[:10]}... ({len(image_bytes)} bytes)")
+            else:
+                log("Cache", "warning", f"Image {etag[:10]}... ({len(image_bytes)} bytes) exceeds the image cache budget; not cached")
+            return shared
+        return None
     
-    def get_cached_image(self, etag):
-        """Get cached image by ETag."""
-        if etag in self.image_cache:
+    def get_cached_image(self, etag, url=None):
+        """Get cached image by ETag (and url, to also look on disk)."""
+        image_bytes = self.image_cache.get(etag, url)
+        if image_bytes is not None:
             log("Cache", "info", f"Retrieved cached image for ETag {etag[:10]}...")
-            return self.image_cache[etag]
-        return None
+        return image_bytes
     
     def cache_api_response(self, endpoint, response):
         """Cache an API response."""
@@ -192,91 +1081,2075 @@ class UserCache:
                 log("Cache", "info", f"Expired cached response for {endpoint}")
         return None
 
-# === Global Cache Management ===
-user_caches = {}  # user_email -> UserCache
-current_user_email = HOST_EMAIL  # Default user
+# === Global Cache Management ===
+user_caches = {}  # user_email -> UserCache
+current_user_email = HOST_EMAIL  # Default user
+
+def get_current_user_cache():
+    """Get or create cache for current user."""
+    global current_user_email
+    if current_user_email not in user_caches:
+        user_caches[current_user_email] = UserCache(current_user_email)
+        log("Cache", "info", f"Created new cache for user {current_user_email}")
+    return user_caches[current_user_email]
+
+def switch_user(user_email):
+    """Switch to a different user and clear their cache."""
+    global current_user_email
+    if current_user_email != user_email:
+        # Clear previous user's cache
+        if current_user_email in user_caches:
+            user_caches[current_user_email].clear_all_caches()
+        
+        current_user_email = user_email
+        log("Cache", "success", f"Switched to user {user_email}")
+
+def clear_all_user_caches():
+    """Clear all caches for all users."""
+    for user_cache in user_caches.values():
+        user_cache.clear_all_caches()
+    user_caches.clear()
+    log("Cache", "success", "Cleared all user caches")
+
+# === SECTION 1: CORE CLASSES & CACHE MANAGEMENT ===
+# All classes and cache management logic grouped here
+
+# Import time for cache timestamps
+import time
+
+# === SECTION 2: HELPER CLASSES & UTILITIES ===
+
+class Logger:
+    """Centralized logging system with color-coded output."""
+    output_widget = None
+    
+    @classmethod
+    def set_output_widget(cls, widget):
+        """Set the main output widget for logging."""
+        cls.output_widget = widget
+    
+    @classmethod
+    def log(cls, source, log_type, text, payload=None):
+        """Log a message with proper formatting and colors; safe to call from any thread."""
+        if cls.output_widget is not None and threading.current_thread() is not threading.main_thread():
+            try:
+                cls.output_widget.after(0, cls.log, source, log_type, text, payload)
+            except (RuntimeError, tk.TclError):
+                pass  # Tk already shut down
+            return
+        if not cls.output_widget or not cls.output_widget.winfo_exists():
+            return
+        
+        prefix_map = {
+            "api_call": "[API CALL] >", "api_resp": "[API RESP] <",
+            "ws_send": "[WS SEND]  >", "ws_recv": "[WS RECV]  <",
+            "cache": "[CACHE] *", "info": "[INFO]",
+            "success": "[SUCCESS]", "error": "[ERROR]", "warning": "[WARNING]"
+        }
+        
+        color_map = {
+            "api_call": "api_call", "api_resp": "api_resp",
+            "ws_send": "ws_send", "ws_recv": "ws_recv",
+            "cache": "cache", "info": "info",
+            "success": "success", "error": "error", "warning": "warning"
+        }
+
+        prefix = prefix_map.get(log_type, "[INFO]")
+        tag = color_map.get(log_type, "info")
+        
+        full_message = f"[{source}] {prefix} {text}\n"
+        if payload:
+            # Truncate long tokens or data for readability
+            if isinstance(payload, dict):
+                if 'idToken' in payload: 
+                    payload['idToken'] = f"{payload['idToken'][:15]}..."
+                if 'token' in payload: 
+                    payload['token'] = f"{payload['token'][:15]}..."
+            payload_str = json.dumps(payload, indent=2)
+            full_message += f"  Payload: {payload_str}\n"
+
+        cls.output_widget.configure(state='normal')
+        cls.output_widget.insert(tk.END, full_message, tag)
+        cls.output_widget.configure(state='disabled')
+        cls.output_widget.see(tk.END)
+
+def endpoint_template(url):
+    """Collapse IDs in a URL path so metrics group by endpoint, e.g. /songs/{id}/page/{n}."""
+    parts = urlsplit(url).path.split('/')
+    for i in range(1, len(parts)):
+        prev, seg = parts[i - 1], parts[i]
+        if not seg:
+            continue
+        if prev in ("rooms", "playlists") or (prev == "songs" and seg not in ("list", "search")):
+            parts[i] = "{id}"
+        elif prev == "page":
+            parts[i] = "{n}"
+    return '/'.join(parts) or '/'
+
+class RequestTiming:
+    """Phase timings (seconds) and byte counts for one HTTP request."""
+    def __init__(self, method, url, target):
+        self.method = method.upper()
+        self.url = url
+        self.target = target
+        self.endpoint = endpoint_template(url)
+        self.started_at = time.time()
+        self.status = None
+        self.reused_connection = True
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0      # None when the client cannot separate it from connect
+        self.ttfb = 0.0     # request sent -> first response byte (server think-time + 1 RTT)
+        self.body = 0.0
+        self.total = 0.0
+        self.bytes_received = 0  # decoded body bytes
+        self.bytes_wire = 0      # body bytes as sent on the wire (None if unknown)
+        self.encoding = None     # Content-Encoding of the response, if any
+
+    def summary(self):
+        def ms(value):
+            return "n/a" if value is None else f"{value * 1000:.1f}ms"
+        conn = "reused conn" if self.reused_connection else f"dns {ms(self.dns)}, connect {ms(self.connect)}, tls {ms(self.tls)}"
+        return f"{conn} | ttfb {ms(self.ttfb)} | body {ms(self.body)} | {self.bytes_received} B"
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+class RequestMetrics:
+    """In-memory store of RequestTiming samples."""
+    max_samples = 10000
+    _samples = deque(maxlen=max_samples)
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, timing):
+        with cls._lock:
+            cls._samples.append(timing)
+
+    @classmethod
+    def samples(cls):
+        with cls._lock:
+            return list(cls._samples)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._samples.clear()
+
+    @classmethod
+    def summary(cls):
+        """Per-endpoint aggregates: count, p50/p95 total, mean phases and bytes."""
+        groups = {}
+        for t in cls.samples():
+            groups.setdefault((t.method, t.endpoint), []).append(t)
+        rows = []
+        for (method, endpoint), items in sorted(groups.items()):
+            totals = sorted(t.total for t in items)
+            n = len(items)
+            def mean(attr):
+                values = [getattr(t, attr) for t in items if getattr(t, attr) is not None]
+                return sum(values) / len(values) if values else 0.0
+            rows.append({
+                "endpoint": f"{method} {endpoint}", "count": n,
+                "p50_ms": totals[n // 2] * 1000, "p95_ms": totals[min(n - 1, int(n * 0.95))] * 1000,
+                "dns_ms": mean("dns") * 1000, "connect_ms": mean("connect") * 1000, "tls_ms": mean("tls") * 1000,
+                "ttfb_ms": mean("ttfb") * 1000, "body_ms": mean("body") * 1000,
+                "avg_bytes": int(mean("bytes_received")), "new_connections": sum(1 for t in items if not t.reused_connection),
+            })
+        return rows
+
+    @classmethod
+    def compression_summary(cls):
+        """Per-endpoint wire vs decoded body bytes for successful responses with a known wire size."""
+        groups = {}
+        for t in cls.samples():
+            if t.status == 200 and t.bytes_received and t.bytes_wire is not None:
+                groups.setdefault((t.method, t.endpoint), []).append(t)
+        rows = []
+        for (method, endpoint), items in sorted(groups.items()):
+            wire = sum(t.bytes_wire for t in items)
+            decoded = sum(t.bytes_received for t in items)
+            rows.append({
+                "endpoint": f"{method} {endpoint}", "count": len(items),
+                "wire_bytes": wire, "decoded_bytes": decoded,
+                "ratio": decoded / wire if wire else 1.0,
+                "saved_pct": 100.0 * (decoded - wire) / decoded if decoded else 0.0,
+                "encodings": sorted({t.encoding or "identity" for t in items}),
+            })
+        return rows
+
+def accept_encoding(decodable):
+    """Accept-Encoding header value for the codings a client can decode, best first."""
+    if HTTP_ACCEPT_ENCODING:
+        return HTTP_ACCEPT_ENCODING
+    return ", ".join(c for c in ("zstd", "br", "gzip", "deflate") if c in decodable)
+
+# Timing of the request currently being sent on this thread (read by the connection classes below)
+_timing_context = threading.local()
+
+class _TimedConnectionMixin:
+    """Records DNS / TCP connect / TLS handshake time into the thread's RequestTiming."""
+    def _new_conn(self):
+        timing = getattr(_timing_context, "current", None)
+        if timing is None:
+            return super()._new_conn()
+        timing.reused_connection = False
+        dns_host = self._dns_host
+        t0 = time.perf_counter()
+        try:
+            # Resolve once ourselves so DNS and TCP connect can be timed separately
+            self._dns_host = socket.getaddrinfo(dns_host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            pass  # Let urllib3 raise its usual NameResolutionError
+        t1 = time.perf_counter()
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+        timing.dns = t1 - t0
+        timing.connect = time.perf_counter() - t1
+        return sock
+
+    def connect(self):
+        t0 = time.perf_counter()
+        super().connect()
+        timing = getattr(_timing_context, "current", None)
+        if timing is not None and isinstance(self, HTTPSConnection):
+            timing.tls = max(0.0, time.perf_counter() - t0 - timing.dns - timing.connect)
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections report connection-setup timings."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+class RetryPolicy:
+    """Retry schedule for one HTTP method: exponential backoff with full jitter."""
+    retry_counts = {}      # (target, method) -> retries performed
+    exhausted_counts = {}  # (target, method) -> requests that failed after the last attempt
+    _lock = threading.Lock()
+
+    def __init__(self, max_attempts=1, base_delay=0.25, max_delay=4.0, retry_statuses=(429, 502, 503, 504)):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt (honours a numeric Retry-After)."""
+        if retry_after and str(retry_after).isdigit():
+            return min(self.max_delay, float(retry_after))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    @classmethod
+    def for_method(cls, method):
+        return RETRY_POLICIES.get(method.upper(), NO_RETRY)
+
+    @classmethod
+    def count(cls, table, target, method):
+        with cls._lock:
+            key = (target, method.upper())
+            table[key] = table.get(key, 0) + 1
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+# Method -> policy; edit at runtime to change behaviour (e.g. RETRY_POLICIES["POST"] = RetryPolicy(3))
+RETRY_POLICIES = {
+    "GET": RetryPolicy(max_attempts=HTTP_RETRY_ATTEMPTS),
+    "HEAD": RetryPolicy(max_attempts=HTTP_RETRY_ATTEMPTS),
+}
+if HTTP_RETRY_POST:
+    RETRY_POLICIES["POST"] = RetryPolicy(max_attempts=HTTP_RETRY_ATTEMPTS)
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without touching the network while a target's circuit is open."""
+
+class CircuitBreaker:
+    """Per-target breaker: opens after consecutive failures and fails fast until a probe succeeds."""
+    _breakers = {}  # target name -> CircuitBreaker
+    _registry_lock = threading.Lock()
+
+    def __init__(self, target, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS):
+        self.target = target
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self.rejected_count = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_target(cls, target):
+        with cls._registry_lock:
+            breaker = cls._breakers.get(target)
+            if breaker is None:
+                breaker = cls._breakers[target] = CircuitBreaker(target)
+            return breaker
+
+    @classmethod
+    def all(cls):
+        with cls._registry_lock:
+            return list(cls._breakers.values())
+
+    def check(self):
+        """Raise CircuitOpenError if requests to this target should fail fast."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+            if self.state == "closed" or (self.state == "half-open" and not self._probe_in_flight):
+                self._probe_in_flight = self.state == "half-open"
+                return
+            self.rejected_count += 1
+            remaining = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"Circuit open for {self.target}; failing fast (retry in {remaining:.1f}s)")
+
+    def release_probe(self):
+        """Give back a half-open probe slot when the request ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != "closed"
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+        if recovered:
+            log("System", "success", f"Circuit for {self.target} closed - target is healthy again")
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            should_open = self.state == "half-open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold)
+            if should_open:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.open_count += 1
+        if should_open:
+            log("System", "warning", f"Circuit for {self.target} OPEN after {self.consecutive_failures} failures; "
+                                     f"failing fast for {self.reset_timeout:.0f}s")
+
+    def describe(self):
+        return (f"{self.target}: {self.state} (consecutive failures {self.consecutive_failures}, "
+                f"opened {self.open_count}x, fast-failed {self.rejected_count})")
+
+class ThrottledError(requests.RequestException):
+    """Raised on the Tk thread instead of blocking when a RateLimiter has no capacity."""
+
+class RateLimiter:
+    """Token bucket plus max-in-flight cap for one (target, endpoint class).
+
+    Endpoint classes are "auth", "rest" and "images". Worker threads sleep and
+    coroutines on ClientEventLoop await, so the shared loop is never blocked.
+    The Tk thread never waits: a throttled request raises ThrottledError.
+    """
+    CLASSES = ("auth", "rest", "images")
+    _limiters = {}   # (target, endpoint class) -> RateLimiter
+    _overrides = {}  # (target or None, endpoint class or None) -> settings from configure()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, target, endpoint_class, rate=0.0, burst=10, max_in_flight=0):
+        self.target = target
+        self.endpoint_class = endpoint_class
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.throttled_count = 0
+        self.rejected_count = 0  # Tk-thread requests refused instead of waited for
+        self.waited_seconds = 0.0
+        self._waiters = deque()  # concurrent Futures waiting for an in-flight slot
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def classify(url, target):
+        if target == AUTH_TARGET:
+            return "auth"
+        endpoint = endpoint_template(url)
+        return "images" if endpoint.endswith("/image") or "/page/" in endpoint else "rest"
+
+    @classmethod
+    def _settings_for(cls, target, endpoint_class):
+        settings = {"rate": RATE_LIMIT_RPS, "burst": RATE_LIMIT_BURST, "max_in_flight": MAX_IN_FLIGHT}
+        if target == "Production" and not RATE_LIMIT_RPS:
+            settings["rate"] = PRODUCTION_RATE_LIMIT_RPS
+        # Most specific override wins
+        for key in ((None, None), (None, endpoint_class), (target, None), (target, endpoint_class)):
+            settings.update(cls._overrides.get(key, {}))
+        return settings
+
+    @classmethod
+    def for_request(cls, url, target):
+        endpoint_class = cls.classify(url, target)
+        created = False
+        with cls._registry_lock:
+            limiter = cls._limiters.get((target, endpoint_class))
+            if limiter is None:
+                limiter = RateLimiter(target, endpoint_class, **cls._settings_for(target, endpoint_class))
+                cls._limiters[(target, endpoint_class)] = limiter
+                created = True
+        if (created and target == "Production" and not RATE_LIMIT_RPS and PRODUCTION_RATE_LIMIT_RPS
+                and limiter.rate == PRODUCTION_RATE_LIMIT_RPS):
+            log("System", "info", f"Production {endpoint_class} requests are capped at {limiter.rate:g} req/s "
+                                  f"(set RATE_LIMIT_RPS or PRODUCTION_RATE_LIMIT_RPS to change)")
+        return limiter
+
+    @classmethod
+    def all(cls):
+        with cls._registry_lock:
+            return list(cls._limiters.values())
+
+    @classmethod
+    def configure(cls, target=None, endpoint_class=None, rate=None, burst=None, max_in_flight=None):
+        """Change limits at runtime; None for target / endpoint_class means all of them."""
+        settings = {k: v for k, v in (("rate", rate), ("burst", burst), ("max_in_flight", max_in_flight)) if v is not None}
+        with cls._registry_lock:
+            cls._overrides.setdefault((target, endpoint_class), {}).update(settings)
+            limiters = [l for (t, c), l in cls._limiters.items()
+                        if target in (None, t) and endpoint_class in (None, c)]
+            # Re-resolve each limiter so a more specific override is not clobbered
+            updates = [(l, cls._settings_for(l.target, l.endpoint_class)) for l in limiters]
+        for limiter, resolved in updates:
+            limiter.update(**resolved)
+
+    def update(self, rate, burst, max_in_flight):
+        with self._lock:
+            self.rate = rate
+            self.burst = max(1, burst)
+            self.max_in_flight = max_in_flight
+            self.tokens = min(self.tokens, self.burst)
+            self._grant_waiters()
+
+    def _reserve(self):
+        """Take a token and an in-flight slot; returns (seconds to wait, Future or None)."""
+        with self._lock:
+            wait = 0.0
+            if self.rate > 0:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = -self.tokens / self.rate
+            slot = None
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                slot = concurrent.futures.Future()
+                self._waiters.append(slot)
+            else:
+                self.in_flight += 1
+            if wait or slot:
+                self.throttled_count += 1
+            return wait, slot
+
+    def _grant_waiters(self):
+        while self._waiters and (not self.max_in_flight or self.in_flight < self.max_in_flight):
+            waiter = self._waiters.popleft()
+            if waiter.set_running_or_notify_cancel():  # False if the waiter gave up
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _note_wait(self, seconds):
+        with self._lock:
+            self.waited_seconds += seconds
+
+    def _try_acquire(self):
+        """Take a token and a slot now, or raise ThrottledError without consuming either."""
+        with self._lock:
+            wait = 0.0
+            if self.rate > 0:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+            full = self.max_in_flight and self.in_flight >= self.max_in_flight
+            if wait or full:
+                self.throttled_count += 1
+                self.rejected_count += 1
+                reason = f"{self.in_flight} requests in flight" if full else f"retry in {wait:.2f}s"
+                raise ThrottledError(f"Throttled by {self.target}/{self.endpoint_class} limit ({reason})")
+            if self.rate > 0:
+                self.tokens -= 1
+            self.in_flight += 1
+
+    def acquire(self):
+        """Wait for capacity on worker threads; on the Tk thread raise ThrottledError instead."""
+        if threading.current_thread() is threading.main_thread():
+            self._try_acquire()
+            return
+        wait, slot = self._reserve()
+        started = time.perf_counter()
+        if wait:
+            time.sleep(wait)
+        if slot:
+            slot.result()
+        self._note_wait(time.perf_counter() - started)
+
+    async def acquire_async(self):
+        wait, slot = self._reserve()
+        started = time.perf_counter()
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            if slot:
+                await asyncio.wrap_future(slot)
+        except BaseException:
+            # Cancelled while queued: give back the slot if it was already ours
+            if slot is None or not slot.cancel():
+                self.release()
+            raise
+        self._note_wait(time.perf_counter() - started)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._grant_waiters()
+
+    def describe(self):
+        rate = f"{self.rate:g} req/s (burst {self.burst})" if self.rate > 0 else "unlimited rate"
+        cap = self.max_in_flight or "∞"
+        return (f"{self.target}/{self.endpoint_class}: {rate}, in flight {self.in_flight}/{cap}, "
+                f"queued {len(self._waiters)}, throttled {self.throttled_count} ({self.rejected_count} refused on the UI thread), "
+                f"waited {self.waited_seconds:.1f}s")
+
+class HTTPTransport:
+    """Shared HTTP layer with one pooled keep-alive session per target."""
+    # urllib3 advertises br / zstd only when brotli / zstandard are importable
+    accept_encoding = accept_encoding({c.strip() for c in URLLIB3_ACCEPT_ENCODING.split(",")})
+    _sessions = {}  # target name -> requests.Session
+    _lock = threading.Lock()
+    pool_size = HTTP_POOL_SIZE
+
+    @classmethod
+    def session(cls, target=None):
+        """Get (or lazily create) the pooled session for a target."""
+        key = target or CURRENT_TARGET
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.headers["Accept-Encoding"] = cls.accept_encoding
+                # Bulk sign-in runs BULK_SIGNIN_CONCURRENCY auth calls at once; size that pool to match
+                pool_size = max(cls.pool_size, BULK_SIGNIN_CONCURRENCY) if key == AUTH_TARGET else cls.pool_size
+                adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._sessions[key] = session
+            return session
+
+    @classmethod
+    def request(cls, method, url, target=None, timeout=10, retry=None, **kwargs):
+        """Send a request over the target's pooled session.
+
+        Identical concurrent GETs sent with the same Authorization header share
+        one response (see SingleFlight).
+        retry overrides the method's RetryPolicy; the target's CircuitBreaker
+        is consulted before every attempt. Calls from the Tk thread get a
+        single attempt so a dead target cannot freeze the window in backoff.
+        """
+        key = SingleFlight.key(method, url, target, kwargs.get("headers"))
+        return SingleFlight.run(key, lambda: cls._send_with_retry(method, url, target, timeout, retry, **kwargs))
+
+    @classmethod
+    def _send_with_retry(cls, method, url, target, timeout, retry, **kwargs):
+        target = target or CURRENT_TARGET
+        policy = retry or RetryPolicy.for_method(method)
+        if threading.current_thread() is threading.main_thread():
+            policy = NO_RETRY  # Fail fast like RateLimiter; workers and ClientEventLoop still retry
+        breaker = CircuitBreaker.for_target(target)
+        attempt = 0
+        while True:
+            attempt += 1
+            # Take the limiter first: a throttled request must not claim the half-open probe
+            limiter = RateLimiter.for_request(url, target)
+            limiter.acquire()
+            try:
+                breaker.check()
+            except CircuitOpenError:
+                limiter.release()
+                raise
+            try:
+                resp = cls._send(method, url, target, timeout, **kwargs)
+            except requests.RequestException:
+                breaker.record_failure()
+                if attempt >= policy.max_attempts:
+                    if policy.max_attempts > 1:
+                        RetryPolicy.count(RetryPolicy.exhausted_counts, target, method)
+                    raise
+                delay = policy.delay(attempt)
+            except BaseException:
+                breaker.release_probe()
+                raise
+            else:
+                if resp.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                resp.attempts = attempt
+                if resp.status_code not in policy.retry_statuses or attempt >= policy.max_attempts:
+                    if resp.status_code in policy.retry_statuses and policy.max_attempts > 1:
+                        RetryPolicy.count(RetryPolicy.exhausted_counts, target, method)
+                    return resp
+                delay = policy.delay(attempt, resp.headers.get("Retry-After"))
+            finally:
+                limiter.release()
+            RetryPolicy.count(RetryPolicy.retry_counts, target, method)
+            time.sleep(delay)
+
+    @classmethod
+    def _send(cls, method, url, target, timeout, **kwargs):
+        """Perform one request and attach a RequestTiming as resp.timing."""
+        resp, t0, t_headers = cls._open(method, url, target, timeout, **kwargs)
+        content = resp.content
+        cls._finish_timing(resp, t0, t_headers, len(content))
+        return resp
+
+    @classmethod
+    def _open(cls, method, url, target, timeout, **kwargs):
+        """Send the request and return once headers arrive; the body is left unread."""
+        timing = RequestTiming(method, url, target or CURRENT_TARGET)
+        _timing_context.current = timing
+        t0 = time.perf_counter()
+        try:
+            # stream=True returns once headers arrive, so TTFB and body download can be split
+            resp = cls.session(target).request(method, url, timeout=timeout, stream=True, **kwargs)
+        finally:
+            _timing_context.current = None
+        resp.timing = timing
+        return resp, t0, time.perf_counter()
+
+    @staticmethod
+    def _finish_timing(resp, t0, t_headers, bytes_received):
+        timing = resp.timing
+        t_done = time.perf_counter()
+        setup = timing.dns + timing.connect + (timing.tls or 0.0)
+        timing.ttfb = max(0.0, t_headers - t0 - setup)
+        timing.body = t_done - t_headers
+        timing.total = t_done - t0
+        timing.status = resp.status_code
+        timing.bytes_received = bytes_received
+        # urllib3 counts bytes read off the socket, i.e. before gzip/br/zstd decoding
+        timing.bytes_wire = resp.raw.tell() if resp.raw is not None else bytes_received
+        timing.encoding = resp.headers.get("Content-Encoding")
+        RequestMetrics.record(timing)
+        if HARRecorder.active:
+            version = getattr(resp.raw, "version", 11)
+            # Streamed bodies were handed to the caller and are not retained
+            body = resp._content if isinstance(resp._content, bytes) else None
+            HARRecorder.record_http(timing, resp.request.headers, resp.request.body, resp.status_code, resp.reason,
+                                    f"HTTP/{version // 10}.{version % 10}", resp.headers, body)
+
+    @classmethod
+    @contextlib.contextmanager
+    def stream(cls, method, url, target=None, timeout=10, **kwargs):
+        """Open a response whose body is consumed incrementally via resp.chunks.
+
+        Streams are never coalesced or retried (the body can only be read once),
+        but still respect the target's CircuitBreaker. Timing is recorded on exit.
+        """
+        target = target or CURRENT_TARGET
+        breaker = CircuitBreaker.for_target(target)
+        limiter = RateLimiter.for_request(url, target)
+        limiter.acquire()
+        try:
+            breaker.check()
+        except CircuitOpenError:
+            limiter.release()
+            raise
+        try:
+            resp, t0, t_headers = cls._open(method, url, target, timeout, **kwargs)
+        except requests.RequestException:
+            limiter.release()
+            breaker.record_failure()
+            raise
+        except BaseException:
+            limiter.release()
+            breaker.release_probe()
+            raise
+        if resp.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        received = [0]
+
+        def chunks():
+            for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+                received[0] += len(chunk)
+                yield chunk
+
+        resp.chunks = chunks()
+        try:
+            yield resp
+        finally:
+            cls._finish_timing(resp, t0, t_headers, received[0])
+            resp.close()
+            limiter.release()
+
+    @classmethod
+    def reset_sessions(cls, keep_auth=True):
+        """Close pooled sessions so the next request reconnects (e.g. after a target switch)."""
+        with cls._lock:
+            for key in list(cls._sessions):
+                if keep_auth and key == AUTH_TARGET:
+                    continue
+                cls._sessions.pop(key).close()
+
+    @classmethod
+    def configure(cls, pool_size):
+        """Change the per-target pool size; existing sessions are rebuilt on next use."""
+        cls.pool_size = max(1, int(pool_size))
+        cls.reset_sessions(keep_auth=False)
+        AsyncHTTPTransport.reset_sessions(keep_auth=False)
+
+def iter_json_array(chunks, encoding="utf-8"):
+    """Yield the elements of a top-level JSON array as its bytes arrive.
+
+    Only the unparsed tail of the body is buffered, so rows can be consumed
+    before the download finishes. Raises ValueError if the body is not an
+    array, its separators are malformed (e.g. "[1,,2]", "[1 2]" or "[1,]")
+    or anything but whitespace follows the closing bracket.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    buf, pos, done = "", 0, False
+    expect = "open"  # open -> first (value or "]") -> sep ("," or "]") -> value -> sep ... -> end
+    chunks = iter(chunks)
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == "end":
+                raise ValueError(f"Unexpected {char!r} after JSON array")
+            if expect == "open":
+                if char != "[":
+                    raise ValueError("Response body is not a JSON array")
+                expect, pos = "first", pos + 1
+                continue
+            if expect == "sep":
+                if char == "]":
+                    expect, pos = "end", pos + 1
+                    continue
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+                expect, pos = "value", pos + 1
+                continue
+            if char == "]" and expect == "first":
+                expect, pos = "end", pos + 1
+                continue
+            if char in ",]":
+                raise ValueError(f"Unexpected {char!r} in JSON array")
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                value, end = None, -1
+            # Only accept a value once its delimiter has arrived: "12" may still become "12.5"
+            follow = end
+            while 0 <= follow < len(buf) and buf[follow].isspace():
+                follow += 1
+            if end != -1 and follow < len(buf):
+                if buf[follow] in ",]":
+                    yield value
+                    expect, pos = "sep", end
+                    continue
+                # A number directly followed by ".", "e", a digit or a sign may still be growing
+                growing = (follow == end and isinstance(value, (int, float)) and not isinstance(value, bool)
+                           and buf[follow] in "0123456789.eE+-")
+                if not growing or done:
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {buf[follow]!r}")
+            if done:
+                raise ValueError("Truncated JSON array in response body")
+        elif done:
+            if expect == "end":
+                return
+            raise ValueError("Truncated JSON array in response body")
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+            buf = buf[pos:] + text.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+
+class SingleFlight:
+    """Coalesce identical concurrent GETs into one in-flight request.
+
+    Works across the Tk thread, worker threads and ClientEventLoop: the first
+    caller (leader) performs the request and every caller that arrives while it
+    is in flight waits on the same concurrent Future. Requests are only shared
+    between callers with the same Authorization header. If the leader is
+    cancelled, its followers retry and one of them becomes the new leader;
+    the cancellation itself is never handed to them.
+    """
+    enabled = COALESCE_GETS
+    coalesced_count = 0
+    # Request headers a negotiating server varies on (image format and display size)
+    VARY_HEADERS = ("Accept", "X-Display-Size")
+    _inflight = {}  # key -> concurrent.futures.Future
+    _lock = threading.Lock()
+    _RETRY = object()  # Result left for followers when the leader is cancelled
+
+    @classmethod
+    def set_enabled(cls, enabled):
+        cls.enabled = bool(enabled)
+        log("System", "info", f"GET coalescing {'enabled' if cls.enabled else 'disabled (real fan-out load)'}")
+
+    @classmethod
+    def key(cls, method, url, target, headers):
+        """Build the coalescing key, or None if the request must not be shared."""
+        if method.upper() != "GET":
+            return None
+        headers = headers or {}
+        auth = headers.get("Authorization")
+        auth = hashlib.sha256(auth.encode()).hexdigest() if auth else None  # Keep tokens out of the table
+        variant = tuple(headers.get(name) for name in cls.VARY_HEADERS)
+        return (target or CURRENT_TARGET, "GET", url, auth, headers.get("If-None-Match"), variant)
+
+    @classmethod
+    def _join(cls, key):
+        with cls._lock:
+            future = cls._inflight.get(key)
+            if future is not None:
+                cls.coalesced_count += 1
+                return future, False
+            future = concurrent.futures.Future()
+            cls._inflight[key] = future
+            return future, True
+
+    @classmethod
+    def _finish(cls, key, future, result=None, error=None):
+        with cls._lock:
+            cls._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @classmethod
+    def run(cls, key, func):
+        """Call func(), or wait for an identical call already in flight."""
+        if not cls.enabled or key is None:
+            return func()
+        future, leader = cls._join(key)
+        if not leader:
+            result = future.result()
+            return cls.run(key, func) if result is cls._RETRY else result
+        try:
+            result = func()
+        except Exception as e:
+            cls._finish(key, future, error=e)
+            raise
+        except BaseException:
+            cls._finish(key, future, cls._RETRY)
+            raise
+        cls._finish(key, future, result)
+        return result
+
+    @classmethod
+    async def run_async(cls, key, coro_func):
+        """Async variant of run() for coroutines on ClientEventLoop."""
+        if not cls.enabled or key is None:
+            return await coro_func()
+        future, leader = cls._join(key)
+        if not leader:
+            # shield: cancelling this follower must not cancel the shared future
+            result = await asyncio.shield(asyncio.wrap_future(future))
+            return await cls.run_async(key, coro_func) if result is cls._RETRY else result
+        try:
+            result = await coro_func()
+        except Exception as e:
+            cls._finish(key, future, error=e)
+            raise
+        except BaseException:
+            cls._finish(key, future, cls._RETRY)  # Cancelled: followers retry rather than inherit it
+            raise
+        cls._finish(key, future, result)
+        return result
+
+class ClientEventLoop:
+    """One background asyncio loop shared by all simulated clients."""
+    _loop = None
+    _thread = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """Get (or start) the shared event loop."""
+        with cls._lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                cls._thread = threading.Thread(target=cls._loop.run_forever, name="client-event-loop", daemon=True)
+                cls._thread.start()
+            return cls._loop
+
+    @classmethod
+    def submit(cls, coro):
+        """Schedule a coroutine on the shared loop and return its concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, cls.get())
+
+class AsyncResponse:
+    """Minimal requests.Response look-alike returned by AsyncHTTPTransport."""
+    def __init__(self, status_code, headers, content, timing=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.timing = timing
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+class AsyncHTTPTransport:
+    """asyncio counterpart of HTTPTransport; only call from ClientEventLoop."""
+    _sessions = {}  # target name -> aiohttp.ClientSession
+    RequestError = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) if aiohttp else (requests.RequestException,)
+
+    @staticmethod
+    def _decodable_encodings():
+        codings = {"gzip", "deflate"}
+        try:
+            from aiohttp import compression_utils
+        except ImportError:
+            return codings
+        if getattr(compression_utils, "HAS_BROTLI", False):
+            codings.add("br")
+        if getattr(compression_utils, "HAS_ZSTD", False):
+            codings.add("zstd")
+        return codings
+
+    @classmethod
+    def _session(cls, target):
+        key = target or CURRENT_TARGET
+        session = cls._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=max(100, HTTPTransport.pool_size))
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[cls._trace_config()],
+                                            headers={"Accept-Encoding": accept_encoding(cls._decodable_encodings())})
+            cls._sessions[key] = session
+        return session
+
+    @staticmethod
+    def _trace_config():
+        """aiohttp hooks that fill the RequestTiming passed as trace_request_ctx."""
+        trace = aiohttp.TraceConfig()
+
+        async def dns_start(session, ctx, params):
+            ctx.dns_started = time.perf_counter()
+
+        async def dns_end(session, ctx, params):
+            ctx.trace_request_ctx.dns = time.perf_counter() - ctx.dns_started
+
+        async def conn_start(session, ctx, params):
+            ctx.conn_started = time.perf_counter()
+
+        async def conn_end(session, ctx, params):
+            timing = ctx.trace_request_ctx
+            timing.reused_connection = False
+            # aiohttp resolves DNS and performs TLS inside connection creation
+            timing.connect = time.perf_counter() - ctx.conn_started - timing.dns
+            timing.tls = None if timing.url.startswith("https") else 0.0
+
+        trace.on_dns_resolvehost_start.append(dns_start)
+        trace.on_dns_resolvehost_end.append(dns_end)
+        trace.on_connection_create_start.append(conn_start)
+        trace.on_connection_create_end.append(conn_end)
+        return trace
+
+    @classmethod
+    async def request(cls, method, url, target=None, timeout=10, headers=None, json=None, retry=None):
+        """Send a request without blocking the shared loop; returns an AsyncResponse."""
+        key = SingleFlight.key(method, url, target, headers)
+        return await SingleFlight.run_async(key, lambda: cls._send_with_retry(method, url, target, timeout, headers, json, retry))
+
+    @classmethod
+    async def _send_with_retry(cls, method, url, target, timeout, headers, json, retry):
+        """Async mirror of HTTPTransport._send_with_retry."""
+        target = target or CURRENT_TARGET
+        policy = retry or RetryPolicy.for_method(method)
+        breaker = CircuitBreaker.for_target(target)
+        attempt = 0
+        while True:
+            attempt += 1
+            # Take the limiter first: a request cancelled while queued must not hold the half-open probe
+            limiter = RateLimiter.for_request(url, target)
+            await limiter.acquire_async()
+            try:
+                breaker.check()
+            except CircuitOpenError:
+                limiter.release()
+                raise
+            try:
+                resp = await cls._send(method, url, target, timeout, headers, json)
+            except cls.RequestError:
+                breaker.record_failure()
+                if attempt >= policy.max_attempts:
+                    if policy.max_attempts > 1:
+                        RetryPolicy.count(RetryPolicy.exhausted_counts, target, method)
+                    raise
+                delay = policy.delay(attempt)
+            except BaseException:
+                breaker.release_probe()  # Cancelled mid-request: no verdict on the target
+                raise
+            else:
+                if resp.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                resp.attempts = attempt
+                if resp.status_code not in policy.retry_statuses or attempt >= policy.max_attempts:
+                    if resp.status_code in policy.retry_statuses and policy.max_attempts > 1:
+                        RetryPolicy.count(RetryPolicy.exhausted_counts, target, method)
+                    return resp
+                delay = policy.delay(attempt, resp.headers.get("Retry-After"))
+            finally:
+                limiter.release()
+            RetryPolicy.count(RetryPolicy.retry_counts, target, method)
+            await asyncio.sleep(delay)
+
+    @classmethod
+    async def _send(cls, method, url, target, timeout, headers, json):
+        if aiohttp is None:
+            resp = await asyncio.to_thread(HTTPTransport._send, method, url, target, timeout,
+                                           headers=headers, json=json)
+            return AsyncResponse(resp.status_code, resp.headers, resp.content, resp.timing)
+
+        timing = RequestTiming(method, url, target or CURRENT_TARGET)
+        session = cls._session(target)
+        t0 = time.perf_counter()
+        async with session.request(method, url, headers=headers, json=json, trace_request_ctx=timing,
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            t_headers = time.perf_counter()
+            body = await resp.read()
+            t_done = time.perf_counter()
+            # aiohttp >= 3.12 counts body bytes before decompression
+            raw_bytes = getattr(resp.content, "total_raw_bytes", None)
+
+        setup = timing.dns + timing.connect
+        timing.ttfb = max(0.0, t_headers - t0 - setup)
+        timing.body = t_done - t_headers
+        timing.total = t_done - t0
+        timing.status = resp.status
+        timing.bytes_received = len(body)
+        timing.encoding = resp.headers.get("Content-Encoding")
+        if raw_bytes is None and resp.headers.get("Content-Length"):
+            raw_bytes = int(resp.headers["Content-Length"])  # Content-Length is the encoded size
+        # Without either, an encoded body's wire size is unknown rather than equal to the decoded size
+        timing.bytes_wire = raw_bytes if raw_bytes is not None or timing.encoding else len(body)
+        RequestMetrics.record(timing)
+        if HARRecorder.active:
+            HARRecorder.record_http(timing, resp.request_info.headers, json, resp.status, resp.reason,
+                                    f"HTTP/{resp.version.major}.{resp.version.minor}", resp.headers, body)
+        return AsyncResponse(resp.status, resp.headers, body, timing)
+
+    @classmethod
+    def reset_sessions(cls, keep_auth=True):
+        """Close async sessions on the shared loop (e.g. after a target switch)."""
+        if cls._sessions:
+            ClientEventLoop.submit(cls._close_sessions(keep_auth))
+
+    @classmethod
+    async def _close_sessions(cls, keep_auth):
+        for key in list(cls._sessions):
+            if keep_auth and key == AUTH_TARGET:
+                continue
+            await cls._sessions.pop(key).close()
+
+class WebSocketTrace:
+    """Frames of one WebSocket connection, written to the HAR as a single entry on close."""
+    def __init__(self, url):
+        self.url = url
+        self.auth = HARRecorder.identity(dict(parse_qsl(urlsplit(url).query)).get("token"))
+        self.enabled = HARRecorder.active
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.messages = []
+        if self.enabled:
+            HARRecorder.open_traces.add(self)
+
+    def _add(self, kind, data):
+        if not self.enabled:
+            return
+        opcode = 2 if isinstance(data, (bytes, bytearray)) else 1
+        # started_at + perf_counter delta keeps sub-millisecond ordering between frames
+        self.messages.append({"type": kind, "time": self.started_at + (time.perf_counter() - self.t0),
+                              "opcode": opcode, "data": data})
+
+    def sent(self, data):
+        self._add("send", data)
+
+    def received(self, data):
+        self._add("receive", data)
+
+    def close(self):
+        if self.enabled:
+            self.enabled = False
+            HARRecorder.open_traces.discard(self)
+            HARRecorder.record_websocket(self)
+
+class HARRecorder:
+    """Streams REST and WebSocket traffic into a HAR 1.2 file.
+
+    Entries are queued and serialized by a background writer thread, so
+    recording adds little latency to the Tk thread or ClientEventLoop. Bodies
+    larger than HAR_INLINE_BODY_MAX are written to a side folder and
+    referenced by a "_file" field.
+    """
+    active = False
+    path = None
+    open_traces = set()
+    entry_count = 0
+    _queue = None
+    _writer = None
+    _body_seq = 0
+    _lock = threading.Lock()
+    REDACTED = "<redacted>"
+    SECRET_FIELDS = ("password", "idToken", "refreshToken", "id_token", "refresh_token", "access_token", "token")
+
+    @classmethod
+    def start(cls, path=None):
+        with cls._lock:
+            if cls.active:
+                return cls.path
+            if path is None:
+                os.makedirs(HAR_DIR, exist_ok=True)
+                path = os.path.join(HAR_DIR, f"session-{datetime.now():%Y%m%d-%H%M%S}.har")
+            cls.path = path
+            cls.entry_count = 0
+            cls._body_seq = 0
+            cls._queue = queue.Queue()
+            cls._writer = threading.Thread(target=cls._write_loop, args=(path, cls._queue), daemon=True, name="har-writer")
+            cls._writer.start()
+            cls.active = True
+        log("System", "success", f"Recording HTTP and WebSocket traffic to {path}")
+        return path
+
+    @classmethod
+    def stop(cls):
+        """Flush open WebSocket traces, finish the JSON document and close the file."""
+        if not cls.active:
+            return
+        for trace in list(cls.open_traces):
+            trace.close()
+        with cls._lock:
+            cls.active = False
+            cls._queue.put(None)
+            writer = cls._writer
+        writer.join(timeout=10)
+        log("System", "success", f"HAR recording saved: {cls.path} ({cls.entry_count} entries)")
+
+    @classmethod
+    def _write_loop(cls, path, entries):
+        bodies_dir = path + ".bodies"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"log": {"version": "1.2", "creator": {"name": "Music Room API Testing GUI", "version": "1.0"}, '
+                    '"pages": [], "entries": [\n')
+            first = True
+            while True:
+                item = entries.get()
+                if item is None:
+                    break
+                entry, side_files = item
+                for name, data in side_files:
+                    os.makedirs(bodies_dir, exist_ok=True)
+                    with open(os.path.join(bodies_dir, name), "wb") as side:
+                        side.write(data)
+                f.write(("" if first else ",\n") + json.dumps(entry, ensure_ascii=False))
+                first = False
+                if entries.empty():
+                    f.flush()
+            f.write("\n]}}\n")
+
+    @staticmethod
+    def identity(token):
+        """Stable, non-reversible label for a token so replays can tell users apart."""
+        if not token:
+            return None
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()[:12]
+
+    @classmethod
+    def _redact_url(cls, url):
+        if not HAR_REDACT or "?" not in url:
+            return url
+        base, query = url.split("?", 1)
+        params = [(k, cls.REDACTED if k in ("key", "token") else v) for k, v in parse_qsl(query, keep_blank_values=True)]
+        return base + "?" + urlencode(params)
+
+    @classmethod
+    def _redact_value(cls, value):
+        if isinstance(value, dict):
+            return {k: cls.REDACTED if k in cls.SECRET_FIELDS else cls._redact_value(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [cls._redact_value(v) for v in value]
+        return value
+
+    @classmethod
+    def _headers(cls, headers):
+        out = []
+        for name, value in (headers or {}).items():
+            if HAR_REDACT and name.lower() == "authorization":
+                value = value.split(" ", 1)[0] + " " + cls.REDACTED
+            out.append({"name": name, "value": str(value)})
+        return out
+
+    @classmethod
+    def _content(cls, data, mime_type, side_files):
+        """HAR content/postData fields for a body, moving large ones out of band."""
+        content = {"size": len(data), "mimeType": mime_type}
+        if len(data) > HAR_INLINE_BODY_MAX:
+            with cls._lock:
+                cls._body_seq += 1
+                name = f"{cls._body_seq:06d}.bin"
+            side_files.append((name, data))
+            content["_file"] = f"{os.path.basename(cls.path)}.bodies/{name}"
+            return content
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            content.update(text=base64.b64encode(data).decode("ascii"), encoding="base64")
+            return content
+        content["text"] = cls._redact_text(text, mime_type)
+        return content
+
+    @classmethod
+    def _redact_text(cls, text, mime_type):
+        """Mask SECRET_FIELDS in a JSON or form-encoded body; other bodies are returned unchanged."""
+        if HAR_REDACT and "json" in mime_type:
+            try:
+                return json.dumps(cls._redact_value(json.loads(text)))
+            except ValueError:
+                return text
+        if HAR_REDACT and "x-www-form-urlencoded" in mime_type:
+            return urlencode([(k, cls.REDACTED if k in cls.SECRET_FIELDS else v) for k, v in parse_qsl(text, keep_blank_values=True)])
+        return text
+
+    @classmethod
+    def record_http(cls, timing, request_headers, request_body, status, reason, http_version, response_headers, body):
+        """Queue one request/response pair; request_body may be bytes, str or a JSON-able object."""
+        side_files = []
+        if request_body is not None and not isinstance(request_body, (bytes, str)):
+            request_body = json.dumps(request_body)
+        if isinstance(request_body, str):
+            request_body = request_body.encode("utf-8")
+        url = cls._redact_url(timing.url)
+        mime_type = response_headers.get("Content-Type", "")
+
+        def ms(value):
+            return -1 if value is None else round(value * 1000, 3)
+
+        entry = {
+            "startedDateTime": datetime.fromtimestamp(timing.started_at, timezone.utc).isoformat(),
+            "time": ms(timing.total),
+            "request": {
+                "method": timing.method, "url": url, "httpVersion": http_version,
+                "headers": cls._headers(request_headers), "cookies": [],
+                "queryString": [{"name": k, "value": v} for k, v in parse_qsl(urlsplit(url).query, keep_blank_values=True)],
+                "headersSize": -1, "bodySize": len(request_body or b""),
+            },
+            "response": {
+                "status": status, "statusText": reason or "", "httpVersion": http_version,
+                "headers": cls._headers(response_headers), "cookies": [],
+                "content": cls._content(body, mime_type, side_files) if body is not None
+                           else {"size": timing.bytes_received, "mimeType": mime_type, "comment": "streamed; body not retained"},
+                "redirectURL": response_headers.get("Location", ""),
+                "headersSize": -1, "bodySize": timing.bytes_wire if timing.bytes_wire is not None else -1,
+            },
+            "cache": {},
+            "timings": {
+                "blocked": -1, "dns": ms(timing.dns) if not timing.reused_connection else -1,
+                "connect": ms(timing.connect + (timing.tls or 0.0)) if not timing.reused_connection else -1,
+                "ssl": ms(timing.tls) if not timing.reused_connection else -1,
+                "send": 0, "wait": ms(timing.ttfb), "receive": ms(timing.body),
+            },
+            "_target": timing.target,
+            "_endpoint": timing.endpoint,
+            "_auth": cls.identity((request_headers or {}).get("Authorization", "").partition(" ")[2]),
+        }
+        if request_body:
+            entry["request"]["postData"] = cls._content(request_body, request_headers.get("Content-Type", "application/json"), side_files)
+        if timing.encoding and timing.bytes_wire is not None:
+            entry["response"]["content"]["compression"] = timing.bytes_received - timing.bytes_wire
+        cls._enqueue(entry, side_files)
+
+    @classmethod
+    def record_websocket(cls, trace):
+        side_files = []
+        messages = []
+        for message in trace.messages:
+            data = message["data"]
+            # Frames carry JSON, so they get the same field masking as REST bodies
+            if isinstance(data, str):
+                data = cls._redact_text(data, "application/json")
+            else:
+                try:
+                    data = cls._redact_text(bytes(data).decode("utf-8"), "application/json").encode("utf-8")
+                except UnicodeDecodeError:
+                    pass
+            message = dict(message, data=data)
+            raw = data if isinstance(data, (bytes, bytearray)) else data.encode("utf-8")
+            if len(raw) > HAR_INLINE_BODY_MAX:
+                message = dict(message, data="", _size=len(raw), _file=cls._content(bytes(raw), "", side_files)["_file"])
+            elif isinstance(data, (bytes, bytearray)):
+                message = dict(message, data=base64.b64encode(data).decode("ascii"))
+            messages.append(message)
+        duration = time.perf_counter() - trace.t0
+        entry = {
+            "startedDateTime": datetime.fromtimestamp(trace.started_at, timezone.utc).isoformat(),
+            "time": round(duration * 1000, 3),
+            "request": {"method": "GET", "url": cls._redact_url(trace.url), "httpVersion": "HTTP/1.1",
+                        "headers": [], "cookies": [], "queryString": [], "headersSize": -1, "bodySize": 0},
+            "response": {"status": 101, "statusText": "Switching Protocols", "httpVersion": "HTTP/1.1",
+                         "headers": [], "cookies": [], "content": {"size": 0, "mimeType": ""},
+                         "redirectURL": "", "headersSize": -1, "bodySize": 0},
+            "cache": {},
+            "timings": {"send": 0, "wait": round(duration * 1000, 3), "receive": 0},
+            "_resourceType": "websocket",
+            "_webSocketMessages": messages,
+            "_auth": trace.auth,
+        }
+        cls._enqueue(entry, side_files)
+
+    @classmethod
+    def _enqueue(cls, entry, side_files):
+        with cls._lock:
+            if not cls.active:
+                return
+            cls.entry_count += 1
+            cls._queue.put((entry, side_files))
+
+class TrafficReplayer:
+    """Re-issues a recorded HAR session against any ENV_TARGETS entry.
+
+    Each recorded user (the _auth token label) replays its calls in order on
+    its own task, so create room -> join -> select song stays causal while
+    users overlap as they did in the recording. speed scales the recorded
+    gaps (1.0, 10.0, ...); speed=0 sends as fast as possible. Sign-in calls are
+    skipped: recorded users are mapped onto the fresh tokens given, and room
+    IDs returned by the target replace the recorded ones in later calls (a
+    call that uses a room another user creates waits for that create).
+    """
+    ID_WAIT_SECONDS = 30
+    def __init__(self, har_path, target, tokens, speed=1.0, id_map=None):
+        self.har_dir = os.path.dirname(os.path.abspath(har_path))
+        with open(har_path, encoding="utf-8") as f:
+            self.entries = json.load(f)["log"]["entries"]
+        self.target = target
+        self.base_url = ENV_TARGETS[target]["base_url"]
+        self.ws_url = ENV_TARGETS[target]["ws_url"]
+        self.tokens = list(tokens)
+        self.speed = speed
+        self.token_map = {}          # recorded _auth label -> fresh token
+        self.id_map = dict(id_map or {})  # recorded room ID -> replayed room ID
+        self.results = []            # (endpoint, recorded ms, replayed ms, recorded status, replayed status)
+        self.skipped = 0
+        self.errors = 0
+        self.non_json = 0            # replayed responses labelled JSON whose body did not parse
+        self.ws_sent = 0
+        self.ws_received = 0
+        self._ws_tasks = []
+        self._id_ready = {}  # recorded room ID -> asyncio.Event set once its create call was replayed
+
+    def _token(self, label):
+        if not label or not self.tokens:
+            return None
+        if label not in self.token_map:
+            self.token_map[label] = self.tokens[len(self.token_map) % len(self.tokens)]
+        return self.token_map[label]
+
+    def _rewrite(self, text):
+        for old, new in self.id_map.items():
+            text = text.replace(old, new)
+        return text
+
+    def _produced_ids(self, entry):
+        try:
+            recorded = json.loads(self._read_content(entry["response"].get("content")) or "null")
+        except (ValueError, OSError):
+            return []
+        return [str(recorded["room_id"])] if isinstance(recorded, dict) and recorded.get("room_id") else []
+
+    async def _resolve(self, text):
+        """Rewrite recorded IDs, first waiting for any whose create call has not been replayed yet."""
+        for old, ready in self._id_ready.items():
+            if old in text and not ready.is_set():
+                try:
+                    await asyncio.wait_for(ready.wait(), self.ID_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    log("Replay", "warning", f"Room {old} was never re-created; sending recorded ID")
+        return self._rewrite(text)
+
+    def _read_content(self, content):
+        """Text of a recorded body, following out-of-band _file references."""
+        if not content:
+            return None
+        if "_file" in content:
+            with open(os.path.join(self.har_dir, content["_file"]), "rb") as f:
+                return f.read().decode("utf-8", errors="replace")
+        if content.get("encoding") == "base64":
+            return None
+        return content.get("text")
+
+    def _learn_ids(self, recorded_text, replayed):
+        try:
+            recorded = json.loads(recorded_text) if recorded_text else None
+        except ValueError:
+            return
+        if isinstance(recorded, dict) and isinstance(replayed, dict):
+            old, new = recorded.get("room_id"), replayed.get("room_id")
+            if old and new and old != new:
+                self.id_map[str(old)] = str(new)
+
+    async def run(self):
+        started = [datetime.fromisoformat(e["startedDateTime"]) for e in self.entries]
+        origin = min(started) if started else None
+        streams = {}
+        for entry, at in sorted(zip(self.entries, started), key=lambda pair: pair[1]):
+            streams.setdefault(entry.get("_auth"), []).append(((at - origin).total_seconds(), entry))
+            if entry.get("_resourceType") != "websocket":
+                for room_id in self._produced_ids(entry):
+                    self._id_ready.setdefault(room_id, asyncio.Event())
+        log("Replay", "info", f"Replaying {len(self.entries)} entries for {len(streams)} users against "
+                              f"{self.target} at {f'{self.speed:g}x' if self.speed else 'max speed'}")
+        t0 = time.monotonic()
+        await asyncio.gather(*(self._replay_stream(items, t0) for items in streams.values()))
+        await asyncio.gather(*self._ws_tasks, return_exceptions=True)
+        return self.report(time.monotonic() - t0)
+
+    async def _replay_stream(self, items, t0):
+        for offset, entry in items:
+            if self.speed:
+                delay = offset / self.speed - (time.monotonic() - t0)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if entry.get("_resourceType") == "websocket":
+                self._ws_tasks.append(asyncio.ensure_future(self._replay_websocket(entry)))
+            elif entry.get("_target") == AUTH_TARGET:
+                self.skipped += 1
+            else:
+                await self._replay_http(entry)
+
+    async def _replay_http(self, entry):
+        request = entry["request"]
+        produced = self._produced_ids(entry)
+        try:
+            parts = urlsplit(request["url"])
+            url = await self._resolve(self.base_url.rstrip('/') + parts.path + (f"?{parts.query}" if parts.query else ""))
+            token = self._token(entry.get("_auth"))
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            body_text = self._read_content(request.get("postData"))
+            try:
+                payload = json.loads(await self._resolve(body_text)) if body_text else None
+            except ValueError:
+                payload = None
+            try:
+                resp = await AsyncHTTPTransport.request(request["method"], url, target=self.target, headers=headers, json=payload)
+            except AsyncHTTPTransport.RequestError as e:
+                self.errors += 1
+                log("Replay", "error", f"{request['method']} {url} failed: {e}")
+                return
+            if resp.status_code == 200 and "json" in resp.headers.get("Content-Type", ""):
+                try:
+                    replayed = resp.json()
+                except ValueError:
+                    # e.g. an HTML error page from a proxy; keep replaying with the recorded IDs
+                    self.non_json += 1
+                    log("Replay", "warning", f"{request['method']} {url} returned a non-JSON body")
+                else:
+                    self._learn_ids(self._read_content(entry["response"].get("content")), replayed)
+        finally:
+            # Unblock waiters even if the create failed; they fall back to the recorded ID
+            for room_id in produced:
+                self._id_ready[room_id].set()
+        self.results.append((f"{request['method']} {endpoint_template(url)}", entry.get("time", -1),
+                             resp.timing.total * 1000, entry["response"].get("status"), resp.status_code))
+
+    async def _replay_websocket(self, entry):
+        token = self._token(entry.get("_auth"))
+        recorded = urlsplit(entry["request"]["url"])
+        target = urlsplit(_normalize_websocket_url(self.ws_url, None))
+        ws_url = _normalize_websocket_url(f"{target.scheme}://{target.netloc}{recorded.path}", token)
+        t_open = datetime.fromisoformat(entry["startedDateTime"]).timestamp()
+        try:
+            async with websockets.connect(ws_url) as websocket:
+                async def receive():
+                    async for _ in websocket:
+                        self.ws_received += 1
+                receiver = asyncio.ensure_future(receive())
+                t0 = time.monotonic()
+                for message in entry.get("_webSocketMessages", []):
+                    if message["type"] != "send":
+                        continue
+                    if self.speed:
+                        delay = (message["time"] - t_open) / self.speed - (time.monotonic() - t0)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    data = await self._resolve(message["data"])
+                    await websocket.send(base64.b64decode(data) if message.get("opcode") == 2 else data)
+                    self.ws_sent += 1
+                if self.speed:
+                    remaining = entry.get("time", 0) / 1000 / self.speed - (time.monotonic() - t0)
+                    if remaining > 0:
+                        await asyncio.sleep(remaining)
+                receiver.cancel()
+        except Exception as e:
+            self.errors += 1
+            log("Replay", "error", f"WebSocket replay failed: {e}")
+
+    def report(self, elapsed):
+        """Log recorded vs replayed latency per endpoint and return the rows."""
+        def pct(values, q):
+            values = sorted(values)
+            return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+        groups = {}
+        for endpoint, recorded_ms, replayed_ms, recorded_status, status in self.results:
+            groups.setdefault(endpoint, []).append((recorded_ms, replayed_ms, recorded_status != status))
+        rows = []
+        for endpoint, items in sorted(groups.items()):
+            recorded = [r for r, _, _ in items if r >= 0]
+            replayed = [r for _, r, _ in items]
+            rows.append({"endpoint": endpoint, "count": len(items),
+                         "recorded_p50_ms": pct(recorded, 0.5), "recorded_p95_ms": pct(recorded, 0.95),
+                         "replayed_p50_ms": pct(replayed, 0.5), "replayed_p95_ms": pct(replayed, 0.95),
+                         "status_mismatches": sum(1 for _, _, mismatch in items if mismatch)})
+        log("Replay", "success", f"Replay finished in {elapsed:.1f}s: {len(self.results)} requests, {self.errors} errors, "
+                                 f"{self.non_json} non-JSON bodies, {self.skipped} sign-ins skipped, {self.ws_sent} WS frames sent / {self.ws_received} received")
+        for r in rows:
+            log("Replay", "info", f"{r['endpoint']}: n={r['count']} p50 {r['recorded_p50_ms']:.1f} -> {r['replayed_p50_ms']:.1f}ms, "
+                                  f"p95 {r['recorded_p95_ms']:.1f} -> {r['replayed_p95_ms']:.1f}ms, "
+                                  f"{r['status_mismatches']} status changes")
+        return rows
+
+class AuthError(Exception):
+    """Firebase rejected a sign-in or refresh (bad password, revoked refresh token, ...)."""
+
+class Credential:
+    """One Firebase user's ID token, refresh token and expiry."""
+    def __init__(self, email, password):
+        self.email = email
+        self.password = password
+        self.id_token = None
+        self.refresh_token = None
+        self.expires_at = 0.0
+        self.lifetime = 3600.0
+        self.refresh_at = float("inf")  # When the background refresher should renew it
+        self.sign_in_count = 0
+        self.refresh_count = 0
+        self.renewal = None  # concurrent Future while a sign-in / refresh is in flight
+        self.lock = threading.Lock()  # Guards the fields above; never held across a network call
+
+    def expires_in(self):
+        return self.expires_at - time.time()
+
+    def is_valid(self, margin=None):
+        # Keep headroom for requests already in flight, but never more than a tenth of the lifetime
+        margin = min(60.0, self.lifetime / 10) if margin is None else margin
+        return bool(self.id_token) and self.expires_in() > margin
+
+class TokenStore:
+    """On-disk cache of ID and refresh tokens, keyed by identity provider and email.
+
+    The file is created with mode 0600 and replaced atomically. Saves are
+    batched for FLUSH_DELAY seconds so a bulk sign-in writes it a few times,
+    not once per user. Passwords are never written; a user whose refresh
+    token is revoked must sign in again.
+    """
+    path = TOKEN_CACHE_PATH
+    FLUSH_DELAY = 1.0
+    _pending = {}  # email -> Credential awaiting the next flush
+    _timer = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(email):
+        return f"{urlsplit(TokenManager.sign_in_url).netloc}|{email}"
+
+    @classmethod
+    def _read(cls):
+        if not cls.path or not os.path.exists(cls.path):
+            return {}
+        if os.name == "posix" and os.stat(cls.path).st_mode & 0o077:
+            os.chmod(cls.path, 0o600)
+            log("Tokens", "warning", f"Token cache {cls.path} was readable by others; permissions reset to 0600")
+        try:
+            with open(cls.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log("Tokens", "error", f"Ignoring unreadable token cache {cls.path}: {e}")
+            return {}
+
+    @classmethod
+    def load(cls):
+        """Return {email: saved fields} for the current identity provider."""
+        with cls._lock:
+            entries = cls._read()
+        prefix = cls.key("")
+        return {k[len(prefix):]: v for k, v in entries.items() if k.startswith(prefix)}
+
+    @classmethod
+    def save(cls, credentials):
+        """Schedule credentials to be written on the next flush."""
+        if not cls.path:
+            return
+        with cls._lock:
+            for cred in credentials:
+                cls._pending[cred.email] = cred
+            if cls._timer is None:
+                cls._timer = threading.Timer(cls.FLUSH_DELAY, cls.flush)
+                cls._timer.daemon = True
+                cls._timer.start()
+
+    @classmethod
+    def flush(cls):
+        with cls._lock:
+            cls._timer = None
+            credentials, cls._pending = list(cls._pending.values()), {}
+            if not credentials:
+                return
+            entries = cls._read()
+            for cred in credentials:
+                if cred.refresh_token:
+                    entries[cls.key(cred.email)] = {"id_token": cred.id_token, "refresh_token": cred.refresh_token,
+                                                    "expires_at": cred.expires_at, "lifetime": cred.lifetime}
+            tmp = f"{cls.path}.tmp"
+            try:
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                if hasattr(os, "fchmod"):
+                    os.fchmod(fd, 0o600)  # The mode above only applies on create; a stale tmp file keeps its own
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=1)
+                os.replace(tmp, cls.path)
+            except OSError as e:
+                log("Tokens", "error", f"Could not write token cache {cls.path}: {e}")
+
+class TokenManager:
+    """Process-wide credential store shared by every sign-in path.
+
+    Tokens are reused until shortly before expiry. A background thread
+    refreshes each one with its refresh token at a jittered point inside the
+    last TOKEN_REFRESH_MARGIN seconds, so long runs survive the one-hour
+    lifetime without failed requests or bursts of new sign-ins.
+    """
+    sign_in_url = "https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={key}"
+    refresh_url = "https://securetoken.googleapis.com/v1/token?key={key}"
+    _credentials = {}  # email -> Credential
+    _lock = threading.Lock()
+    _refresher = None
+    _wakeup = threading.Event()
+
+    @classmethod
+    def credential(cls, email, password=None):
+        with cls._lock:
+            cred = cls._credentials.get(email)
+            if cred is None:
+                cred = cls._credentials[email] = Credential(email, password)
+            elif password:
+                cred.password = password
+            return cred
+
+    @classmethod
+    def credentials(cls):
+        with cls._lock:
+            return list(cls._credentials.values())
+
+    @classmethod
+    def warm_from_disk(cls):
+        """Load cached tokens from TokenStore without any network calls."""
+        saved = TokenStore.load()
+        for email, fields in saved.items():
+            cred = cls.credential(email)
+            with cred.lock:
+                if cred.id_token:
+                    continue
+                cred.id_token = fields.get("id_token")
+                cred.refresh_token = fields.get("refresh_token")
+                cred.lifetime = float(fields.get("lifetime", 3600))
+                cred.expires_at = float(fields.get("expires_at", 0))
+                margin = min(TOKEN_REFRESH_MARGIN, cred.lifetime / 4)
+                cred.refresh_at = max(time.time(), cred.expires_at - margin - random.uniform(0, margin))
+        if saved:
+            valid = sum(1 for email in saved if cls.credential(email).is_valid())
+            log("Tokens", "cache", f"Warmed {len(saved)} users from {TokenStore.path} ({valid} tokens still valid)")
+            cls._start_refresher()
+        return len(saved)
+
+    @classmethod
+    def current_token(cls, email):
+        """Latest ID token for email without any network call (None if never signed in)."""
+        cred = cls._credentials.get(email) if email else None
+        return cred.id_token if cred else None
+
+    @classmethod
+    def ensure(cls, email, password, source="Auth"):
+        """Return (Credential, how) with a usable token; how is "cached", "refreshed" or "signed in".
+
+        source is the console label for the auth calls (None logs nothing).
+
+        Concurrent callers share one renewal, except on the Tk thread: it never
+        waits for another thread's renewal (whose log() calls need the Tk
+        thread), and uses the current token or renews on its own instead.
+
+        Raises AuthError if Firebase rejects the credentials and
+        requests.RequestException on network failure.
+        """
+        cred = cls.credential(email, password)
+        with cred.lock:
+            if cred.is_valid():
+                return cred, "cached"
+            renewal = cred.renewal
+            if renewal is None:
+                renewal = cred.renewal = concurrent.futures.Future()
+                leader = True
+            else:
+                leader = False
+        if leader:
+            how = cls._renew(cred, source, renewal)
+        elif threading.current_thread() is not threading.main_thread():
+            how = renewal.result()
+        elif cred.is_valid(margin=0):
+            how = "cached"
+        else:
+            how = cls._renew(cred, source)
+        cls._start_refresher()
+        return cred, how
+
+    @classmethod
+    async def ensure_async(cls, email, password, source="Auth"):
+        """ensure() for coroutines on ClientEventLoop; runs on a worker thread."""
+        return await asyncio.to_thread(cls.ensure, email, password, source)
+
+    @staticmethod
+    def _error_message(resp):
+        try:
+            return resp.json().get("error", {}).get("message", f"HTTP {resp.status_code}")
+        except ValueError:
+            return f"HTTP {resp.status_code}"
+
+    @classmethod
+    def _renew(cls, cred, source, renewal=None):
+        """Refresh (or sign in again) without holding cred.lock; publish the outcome to renewal's waiters."""
+        try:
+            how = None
+            if cred.refresh_token:
+                try:
+                    cls._refresh(cred, source)
+                    how = "refreshed"
+                except AuthError as e:
+                    if source:
+                        log(source, "warning", f"Refresh rejected for {cred.email} ({e}); signing in again")
+            if how is None:
+                cls._sign_in(cred, source)
+                how = "signed in"
+        except BaseException as e:
+            if renewal is not None:
+                cls._end_renewal(cred, renewal)
+                renewal.set_exception(e)
+            raise
+        if renewal is not None:
+            cls._end_renewal(cred, renewal)
+            renewal.set_result(how)
+        return how
+
+    @staticmethod
+    def _end_renewal(cred, renewal):
+        with cred.lock:
+            if cred.renewal is renewal:
+                cred.renewal = None
+
+    @classmethod
+    def _sign_in(cls, cred, source):
+        if not cred.password:
+            raise AuthError(f"no password known for {cred.email} (only a cached token); sign in again")
+        if source:
+            log(source, "api_call", f"POST signInWithPassword for {cred.email}")
+        resp = HTTPTransport.request("POST", cls.sign_in_url.format(key=FIREBASE_API_KEY), target=AUTH_TARGET,
+                                     json={"email": cred.email, "password": cred.password, "returnSecureToken": True})
+        if resp.status_code != 200:
+            raise AuthError(cls._error_message(resp))
+        data = resp.json()
+        with cred.lock:
+            cls._store(cred, data["idToken"], data.get("refreshToken"), data.get("expiresIn", 3600))
+            cred.sign_in_count += 1
+        TokenStore.save([cred])
+
+    @classmethod
+    def _refresh(cls, cred, source):
+        if source:
+            log(source, "api_call", f"POST securetoken refresh for {cred.email}")
+        resp = HTTPTransport.request("POST", cls.refresh_url.format(key=FIREBASE_API_KEY), target=AUTH_TARGET,
+                                     data={"grant_type": "refresh_token", "refresh_token": cred.refresh_token})
+        if resp.status_code != 200:
+            raise AuthError(cls._error_message(resp))
+        data = resp.json()
+        with cred.lock:
+            cls._store(cred, data["id_token"], data.get("refresh_token", cred.refresh_token), data.get("expires_in", 3600))
+            cred.refresh_count += 1
+        TokenStore.save([cred])
+
+    @staticmethod
+    def _store(cred, id_token, refresh_token, expires_in):
+        lifetime = float(expires_in)
+        margin = min(TOKEN_REFRESH_MARGIN, lifetime / 4)
+        cred.id_token = id_token
+        cred.refresh_token = refresh_token
+        cred.lifetime = lifetime
+        cred.expires_at = time.time() + lifetime
+        # Jitter inside the margin so tokens minted together are not all refreshed together
+        cred.refresh_at = cred.expires_at - margin - random.uniform(0, margin) if refresh_token else float("inf")
+
+    @classmethod
+    def _start_refresher(cls):
+        with cls._lock:
+            if cls._refresher is None or not cls._refresher.is_alive():
+                cls._refresher = threading.Thread(target=cls._refresh_loop, daemon=True, name="token-refresher")
+                cls._refresher.start()
+        cls._wakeup.set()
+
+    @classmethod
+    def _refresh_loop(cls):
+        # A few workers so a large user pool renews within its refresh window
+        workers = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="token-refresh")
+        while True:
+            due = [cred for cred in cls.credentials() if cred.refresh_at <= time.time()]
+            list(workers.map(cls._refresh_in_background, due))
+            next_due = min((c.refresh_at for c in cls.credentials()), default=float("inf"))
+            cls._wakeup.wait(timeout=min(60.0, max(1.0, next_due - time.time())))
+            cls._wakeup.clear()
+
+    @classmethod
+    def _refresh_in_background(cls, cred):
+        with cred.lock:
+            if cred.refresh_at > time.time() or cred.renewal is not None:
+                return  # Renewed (or being renewed) by a foreground ensure() meanwhile
+            renewal = cred.renewal = concurrent.futures.Future()
+        try:
+            cls._renew(cred, "Tokens", renewal)
+            log("Tokens", "success", f"Renewed token for {cred.email}; expires in {cred.expires_in():.0f}s")
+        except (AuthError, requests.RequestException) as e:
+            with cred.lock:
+                cred.refresh_at = time.time() + 30
+            log("Tokens", "error", f"Token renewal failed for {cred.email}: {e}; retrying in 30s")
+
+    @classmethod
+    def describe(cls):
+        creds = cls.credentials()
+        valid = sum(1 for c in creds if c.is_valid(margin=0))
+        return (f"{len(creds)} users, {valid} with valid tokens, "
+                f"{sum(c.sign_in_count for c in creds)} sign-ins, {sum(c.refresh_count for c in creds)} refreshes")
 
-def get_current_user_cache():
-    """Get or create cache for current user."""
-    global current_user_email
-    if current_user_email not in user_caches:
-        user_caches[current_user_email] = UserCache(current_user_email)
-        log("Cache", "info", f"Created new cache for user {current_user_email}")
-    return user_caches[current_user_email]
+    @classmethod
+    def forget_tokens(cls):
+        """Drop all tokens (passwords are kept), e.g. after switching identity provider."""
+        for cred in cls.credentials():
+            with cred.lock:
+                cred.id_token = cred.refresh_token = None
+                cred.expires_at = 0.0
+                cred.refresh_at = float("inf")
+
+class _LocalAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep the console for application logs
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        try:
+            data = json.loads(body) if "json" in self.headers.get("Content-Type", "") else dict(parse_qsl(body))
+        except ValueError:
+            data = {}
+        if path.endswith("/accounts:signInWithPassword"):
+            status, payload = LocalAuthServer.sign_in(data)
+        elif path.endswith("/token"):
+            status, payload = LocalAuthServer.refresh(data)
+        else:
+            status, payload = LocalAuthServer.error(404, "NOT_FOUND")
+        out = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+class LocalAuthServer:
+    """In-process stand-in for identitytoolkit signInWithPassword and securetoken refresh.
+
+    Accepts HOST_EMAIL and TEST_USERS (or any account with LOCAL_AUTH_ACCEPT_ANY)
+    and issues Firebase-shaped HS256 ID tokens signed with LOCAL_AUTH_SECRET,
+    so load tests run offline and auth latency stays out of the measurements.
+    """
+    project_id = FIREBASE_JSON["project_id"]
+    _server = None
+    _previous_urls = None
+    _refresh_tokens = {}  # refresh token -> email
+    _accounts = {}  # email -> password; rebuilt by load_accounts() whenever the user pool changes
+    _lock = threading.Lock()
 
-def switch_user(user_email):
-    """Switch to a different user and clear their cache."""
-    global current_user_email
-    if current_user_email != user_email:
-        # Clear previous user's cache
-        if current_user_email in user_caches:
-            user_caches[current_user_email].clear_all_caches()
-        
-        current_user_email = user_email
-        log("Cache", "success", f"Switched to user {user_email}")
+    @classmethod
+    def start(cls, port=LOCAL_AUTH_PORT):
+        """Serve on 127.0.0.1:port and point TokenManager at it; returns the base URL."""
+        with cls._lock:
+            if cls._server is None:
+                try:
+                    cls._server = ThreadingHTTPServer(("127.0.0.1", port), _LocalAuthHandler)
+                except OSError as e:
+                    log("Auth", "error", f"Cannot start local auth stand-in on port {port}: {e}")
+                    return None
+                cls._server.daemon_threads = True
+                threading.Thread(target=cls._server.serve_forever, daemon=True, name="local-auth").start()
+                cls._previous_urls = (TokenManager.sign_in_url, TokenManager.refresh_url)
+            base = f"http://127.0.0.1:{cls._server.server_port}"
+        cls.load_accounts(TEST_USERS)
+        TokenManager.sign_in_url = base + "/v1/accounts:signInWithPassword?key={key}"
+        TokenManager.refresh_url = base + "/v1/token?key={key}"
+        TokenManager.forget_tokens()
+        log("Auth", "success", f"Local auth stand-in listening on {base} (HS256, secret from LOCAL_AUTH_SECRET)")
+        return base
 
-def clear_all_user_caches():
-    """Clear all caches for all users."""
-    for user_cache in user_caches.values():
-        user_cache.clear_all_caches()
-    user_caches.clear()
-    log("Cache", "success", "Cleared all user caches")
+    @classmethod
+    def stop(cls):
+        with cls._lock:
+            server, cls._server = cls._server, None
+        if server is None:
+            return
+        server.shutdown()
+        server.server_close()
+        TokenManager.sign_in_url, TokenManager.refresh_url = cls._previous_urls
+        TokenManager.forget_tokens()
+        log("Auth", "info", "Local auth stand-in stopped; signing in against Firebase again")
 
-# === SECTION 1: CORE CLASSES & CACHE MANAGEMENT ===
-# All classes and cache management logic grouped here
+    @classmethod
+    def running(cls):
+        return cls._server is not None
 
-# Import time for cache timestamps
-import time
+    @staticmethod
+    def error(status, message):
+        return status, {"error": {"code": status, "message": message,
+                                  "errors": [{"message": message, "domain": "global", "reason": "invalid"}]}}
 
-# === SECTION 2: HELPER CLASSES & UTILITIES ===
+    @classmethod
+    def load_accounts(cls, users):
+        """Register HOST_EMAIL and users as the accounts that may sign in; the first entry for an email wins."""
+        accounts = {HOST_EMAIL: HOST_PASSWORD}
+        duplicates = 0
+        for user in users:
+            if user["email"] in accounts:
+                duplicates += 1
+                continue
+            accounts[user["email"]] = user["password"]
+        with cls._lock:
+            cls._accounts = accounts
+        if duplicates:
+            log("Auth", "warning", f"Local auth stand-in ignored {duplicates} duplicate email(s) in the user pool")
 
-class Logger:
-    """Centralized logging system with color-coded output."""
-    output_widget = None
-    
     @classmethod
-    def set_output_widget(cls, widget):
-        """Set the main output widget for logging."""
-        cls.output_widget = widget
-    
+    def _password_for(cls, email):
+        """The registered password for email, or None for an unknown account."""
+        with cls._lock:
+            return cls._accounts.get(email)
+
+    @staticmethod
+    def _b64(data):
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    @staticmethod
+    def local_id(email):
+        return hashlib.sha256(email.encode("utf-8")).hexdigest()[:28]
+
     @classmethod
-    def log(cls, source, log_type, text, payload=None):
-        """Log a message with proper formatting and colors."""
-        if not cls.output_widget or not cls.output_widget.winfo_exists():
-            return
-        
-        prefix_map = {
-            "api_call": "[API CALL] >", "api_resp": "[API RESP] <",
-            "ws_send": "[WS SEND]  >", "ws_recv": "[WS RECV]  <",
-            "cache": "[CACHE] *", "info": "[INFO]",
-            "success": "[SUCCESS]", "error": "[ERROR]", "warning": "[WARNING]"
-        }
-        
-        color_map = {
-            "api_call": "api_call", "api_resp": "api_resp",
-            "ws_send": "ws_send", "ws_recv": "ws_recv",
-            "cache": "cache", "info": "info",
-            "success": "success", "error": "error", "warning": "warning"
+    def issue_id_token(cls, email):
+        now = int(time.time())
+        uid = cls.local_id(email)
+        claims = {
+            "iss": f"https://securetoken.google.com/{cls.project_id}", "aud": cls.project_id,
+            "auth_time": now, "user_id": uid, "sub": uid, "iat": now, "exp": now + LOCAL_AUTH_TOKEN_LIFETIME,
+            "email": email, "email_verified": True,
+            "firebase": {"identities": {"email": [email]}, "sign_in_provider": "password"},
         }
+        header = {"alg": "HS256", "typ": "JWT", "kid": "local"}
+        signing_input = f"{cls._b64(json.dumps(header).encode())}.{cls._b64(json.dumps(claims).encode())}"
+        signature = hmac.new(LOCAL_AUTH_SECRET.encode("utf-8"), signing_input.encode("ascii"), hashlib.sha256).digest()
+        return f"{signing_input}.{cls._b64(signature)}"
 
-        prefix = prefix_map.get(log_type, "[INFO]")
-        tag = color_map.get(log_type, "info")
-        
-        full_message = f"[{source}] {prefix} {text}\n"
-        if payload:
-            # Truncate long tokens or data for readability
-            if isinstance(payload, dict):
-                if 'idToken' in payload: 
-                    payload['idToken'] = f"{payload['idToken'][:15]}..."
-                if 'token' in payload: 
-                    payload['token'] = f"{payload['token'][:15]}..."
-            payload_str = json.dumps(payload, indent=2)
-            full_message += f"  Payload: {payload_str}\n"
+    @classmethod
+    def verify(cls, token):
+        """Return the claims of a token issued here; raises AuthError if forged or expired.
 
-        cls.output_widget.configure(state='normal')
-        cls.output_widget.insert(tk.END, full_message, tag)
-        cls.output_widget.configure(state='disabled')
-        cls.output_widget.see(tk.END)
+        Reference for backends: HMAC-SHA256 over "header.payload" with LOCAL_AUTH_SECRET.
+        """
+        try:
+            signing_input, _, signature = token.rpartition(".")
+            expected = hmac.new(LOCAL_AUTH_SECRET.encode("utf-8"), signing_input.encode("ascii"), hashlib.sha256).digest()
+            if not hmac.compare_digest(cls._b64(expected), signature):
+                raise AuthError("INVALID_ID_TOKEN")
+            payload = signing_input.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (ValueError, IndexError, UnicodeEncodeError):
+            raise AuthError("INVALID_ID_TOKEN")
+        if claims.get("exp", 0) < time.time():
+            raise AuthError("TOKEN_EXPIRED")
+        return claims
+
+    @classmethod
+    def _new_refresh_token(cls, email):
+        token = secrets.token_urlsafe(32)
+        with cls._lock:
+            cls._refresh_tokens[token] = email
+        return token
+
+    @classmethod
+    def sign_in(cls, data):
+        """signInWithPassword request/response shapes."""
+        email, password = (data.get("email") or "").strip(), data.get("password")
+        if not email:
+            return cls.error(400, "INVALID_EMAIL")
+        if not password:
+            return cls.error(400, "MISSING_PASSWORD")
+        expected = cls._password_for(email)
+        if expected is None and not LOCAL_AUTH_ACCEPT_ANY:
+            return cls.error(400, "EMAIL_NOT_FOUND")
+        if expected is not None and password != expected:
+            return cls.error(400, "INVALID_PASSWORD")
+        return 200, {
+            "kind": "identitytoolkit#VerifyPasswordResponse", "localId": cls.local_id(email), "email": email,
+            "displayName": "", "idToken": cls.issue_id_token(email), "registered": True,
+            "refreshToken": cls._new_refresh_token(email), "expiresIn": str(LOCAL_AUTH_TOKEN_LIFETIME),
+        }
+
+    @classmethod
+    def refresh(cls, data):
+        """securetoken /v1/token (grant_type=refresh_token) request/response shapes."""
+        if data.get("grant_type") != "refresh_token":
+            return cls.error(400, "INVALID_GRANT_TYPE")
+        with cls._lock:
+            email = cls._refresh_tokens.get(data.get("refresh_token"))
+        if email is None:
+            return cls.error(400, "INVALID_REFRESH_TOKEN")
+        id_token = cls.issue_id_token(email)
+        return 200, {
+            "access_token": id_token, "expires_in": str(LOCAL_AUTH_TOKEN_LIFETIME), "token_type": "Bearer",
+            "refresh_token": data["refresh_token"], "id_token": id_token,
+            "user_id": cls.local_id(email), "project_id": cls.project_id,
+        }
 
 class APIHelper:
     """Helper class for making API requests with proper logging."""
@@ -296,11 +3169,11 @@ class APIHelper:
         Logger.log(source, "api_call", f"{method} {clean_url}", payload=json_payload)
 
         try:
-            resp = requests.request(method, clean_url, json=json_payload, headers=headers, timeout=10)
+            resp = HTTPTransport.request(method, clean_url, json=json_payload, headers=headers)
             content = resp.json() if resp.content else None
             
-            log_text = f"Status {resp.status_code}"
-            log_payload = content if content and len(str(content)) < 1000 else (f"<{len(resp.content)} bytes of data>" if resp.content else None)
+            log_text = f"Status {resp.status_code} ({resp.timing.summary()})"
+            log_payload = content if content and len(resp.content) < LOG_PAYLOAD_MAX_BYTES else (f"<{len(resp.content)} bytes of data>" if resp.content else None)
             Logger.log(source, "api_resp", log_text, payload=log_payload)
 
             return {"status": resp.status_code, "content": content}
@@ -308,72 +3181,6 @@ class APIHelper:
             Logger.log(source, "error", f"API request failed: {e}")
             return None
 
-class ImageHelper:
-    """Helper class for image operations and ETag handling."""
-    
-    @staticmethod
-    def normalize_etag(etag_header):
-        """Normalize ETag by removing quotes and W/ prefix for consistent comparison."""
-        if not etag_header: 
-            return None
-        et = etag_header.strip()
-        # Remove W/ prefix for weak ETags
-        if et.startswith('W/'):
-            et = et[2:].strip()
-        # Remove surrounding quotes
-        if et.startswith('"') and et.endswith('"') and len(et) >= 2:
-            et = et[1:-1]
-        return et
-    
-    @staticmethod
-    def fetch_room_image(source_log, token, room_id, prev_etag):
-        """Fetch room image with ETag caching."""
-        headers = {"Authorization": f"Bearer {token}"}
-        if prev_etag:
-            # Normalize ETag for If-None-Match header
-            normalized_etag = prev_etag.strip()
-            if not normalized_etag.startswith('"'):
-                normalized_etag = f'"{normalized_etag}"'
-            headers["If-None-Match"] = normalized_etag
-            Logger.log(source_log, "cache", f"Requesting image with If-None-Match header for ETag: {normalized_etag[:15]}...")
-        else:
-            Logger.log(source_log, "cache", "No previous ETag. Requesting full image.")
-
-        Logger.log(source_log, "api_call", f"GET /rooms/{room_id}/image")
-
-        try:
-            resp = requests.get(f"{BASE_URL.rstrip('/')}/rooms/{room_id}/image", headers=headers, timeout=10)
-            if resp.status_code == 200:
-                etag_raw = resp.headers.get('ETag', '')
-                etag_normalized = ImageHelper.normalize_etag(etag_raw)
-                Logger.log(source_log, "api_resp", f"Status 200 OK. Received new image ({len(resp.content)} bytes). New ETag: {etag_normalized} (Raw: {etag_raw})")
-                return 200, resp.content, etag_normalized
-            elif resp.status_code == 304:
-                Logger.log(source_log, "api_resp", "Status 304 Not Modified. Server confirms cached image is still valid.")
-                return 304, None, prev_etag
-            else:
-                Logger.log(source_log, "error", f"Image fetch failed: {resp.status_code} - {resp.text}")
-                return resp.status_code, None, prev_etag
-        except requests.RequestException as e:
-            Logger.log(source_log, "error", f"Image fetch error: {e}")
-            return 0, None, prev_etag
-    
-    @staticmethod
-    def display_image_bytes(target_frame, image_bytes, max_size=(400, 400)):
-        """Display image bytes in a frame."""
-        for widget in target_frame.winfo_children(): 
-            widget.destroy()
-        try:
-            pil_img = Image.open(io.BytesIO(image_bytes))
-            pil_img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            ctk_img = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=pil_img.size)
-            img_label = ctk.CTkLabel(target_frame, image=ctk_img, text="")
-            img_label.image = ctk_img
-            img_label.pack(expand=True)
-        except Exception as e:
-            Logger.log("Image", "error", f"Error displaying image: {e}")
-            ctk.CTkLabel(target_frame, text=f"Error displaying image:\n{e}", text_color="red").pack(expand=True)
-
 # === SECTION 3: GLOBAL STATE VARIABLES ===
 # UI References
 window = None
@@ -435,9 +3242,7 @@ def clear_cache_button_handler():
     
     # Reset UI elements
     if song_display_frame:
-        for widget in song_display_frame.winfo_children():
-            widget.destroy()
-        ctk.CTkLabel(song_display_frame, text="Cache cleared. Select a song to display.").pack(expand=True)
+        ImageView.for_frame(song_display_frame).show_text("Cache cleared. Select a song to display.")
     
     log("System", "success", "Manual cache clear completed")
 
@@ -456,7 +3261,7 @@ def setup_mode_selection_ui():
     env_dropdown.pack(pady=10)
 
     def apply_target_environment():
-        global BASE_URL, WEBSOCKET_URL
+        global BASE_URL, WEBSOCKET_URL, CURRENT_TARGET
         choice = target_dropdown_var.get()
         target = ENV_TARGETS.get(choice)
         if not target:
@@ -466,10 +3271,16 @@ def setup_mode_selection_ui():
         # Update URLs
         BASE_URL = target["base_url"].rstrip('/') + '/'
         WEBSOCKET_URL = target["ws_url"]
+        CURRENT_TARGET = choice
+        
+        # Drop keep-alive connections to the previous target
+        HTTPTransport.reset_sessions()
+        AsyncHTTPTransport.reset_sessions()
         
         log("Host", "info", f"Environment changed to {choice}")
         log("Host", "info", f"  Base URL set to: {BASE_URL}")
         log("Host", "info", f"  WebSocket URL set to: {WEBSOCKET_URL}")
+        log("Host", "info", f"  HTTP pool: {HTTPTransport.pool_size} keep-alive connections per target")
         
         setup_main_ui()
 
@@ -510,7 +3321,7 @@ def setup_room_simulator_tab(tab_frame):
     
     song_display_frame = ctk.CTkFrame(host_frame, fg_color="#1a1a1a")
     song_display_frame.grid(row=2, column=0, columnspan=2, pady=5, padx=5, sticky="nsew")
-    ctk.CTkLabel(song_display_frame, text="Select a song to display.").pack(expand=True)
+    ImageView.for_frame(song_display_frame).show_text("Select a song to display.")
     
     song_info_label = ctk.CTkLabel(host_frame, text="No song selected")
     song_info_label.grid(row=3, column=0, columnspan=2, pady=(5,0))
@@ -536,6 +3347,69 @@ def setup_room_simulator_tab(tab_frame):
     ctk.CTkLabel(client_frame, text="Client Controls", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
     ctk.CTkButton(client_frame, text="Add Client", command=add_client_user).pack(pady=5, padx=10, fill="x")
     ctk.CTkButton(client_frame, text="Show Guide", command=show_educational_guide).pack(pady=5, padx=10, fill="x")
+    
+    ctk.CTkButton(client_frame, text="Show HTTP Stats", command=show_http_stats).pack(pady=5, padx=10, fill="x")
+    ctk.CTkButton(client_frame, text="Image Cache Metrics", command=show_cache_metrics).pack(pady=5, padx=10, fill="x")
+    ctk.CTkButton(client_frame, text="Compare Image Sizes", command=compare_image_negotiation).pack(pady=5, padx=10, fill="x")
+    
+    coalesce_switch = ctk.CTkSwitch(client_frame, text="Share identical in-flight GETs",
+                                    command=lambda: SingleFlight.set_enabled(coalesce_switch.get() == 1))
+    if SingleFlight.enabled: coalesce_switch.select()
+    coalesce_switch.pack(pady=5, padx=10, anchor="w")
+    har_switch = ctk.CTkSwitch(client_frame, text="Record HAR trace",
+                               command=lambda: HARRecorder.start() if har_switch.get() == 1 else HARRecorder.stop())
+    if HARRecorder.active: har_switch.select()
+    har_switch.pack(pady=5, padx=10, anchor="w")
+
+    local_auth_switch = ctk.CTkSwitch(client_frame, text="Local auth stand-in (offline JWTs)",
+                                      command=lambda: LocalAuthServer.start() if local_auth_switch.get() == 1 else LocalAuthServer.stop())
+    if LocalAuthServer.running(): local_auth_switch.select()
+    local_auth_switch.pack(pady=5, padx=10, anchor="w")
+
+    pool_frame = ctk.CTkFrame(client_frame)
+    pool_frame.pack(pady=5, padx=10, fill="x")
+    ctk.CTkButton(pool_frame, text="Load User Pool...", command=choose_user_pool, width=120).pack(side="left", padx=(5, 2), pady=5, fill="x", expand=True)
+    ctk.CTkButton(pool_frame, text="Sign In All Users", command=start_bulk_sign_in, width=120).pack(side="left", padx=(2, 5), pady=5, fill="x", expand=True)
+
+    def set_resample_modes(_choice=None):
+        ThumbnailCache.mode, ThumbnailCache.tile_mode = page_mode_var.get(), tile_mode_var.get()
+        log("System", "info", f"Resize quality: pages {ThumbnailCache.mode}, {TILE_MAX_SIDE}px tiles {ThumbnailCache.tile_mode}")
+
+    resample_frame = ctk.CTkFrame(client_frame)
+    resample_frame.pack(pady=5, padx=10, fill="x")
+    page_mode_var = ctk.StringVar(value=ThumbnailCache.mode)
+    tile_mode_var = ctk.StringVar(value=ThumbnailCache.tile_mode)
+    ctk.CTkLabel(resample_frame, text="Resize pages").pack(side="left", padx=(5, 2), pady=5)
+    ctk.CTkComboBox(resample_frame, values=list(ThumbnailCache.MODES), variable=page_mode_var, state="readonly", width=90,
+                    command=set_resample_modes).pack(side="left", padx=2, pady=5)
+    ctk.CTkLabel(resample_frame, text="tiles").pack(side="left", padx=2, pady=5)
+    ctk.CTkComboBox(resample_frame, values=list(ThumbnailCache.MODES), variable=tile_mode_var, state="readonly", width=90,
+                    command=set_resample_modes).pack(side="left", padx=(2, 5), pady=5)
+
+    replay_frame = ctk.CTkFrame(client_frame)
+    replay_frame.pack(pady=5, padx=10, fill="x")
+    replay_speed_var = ctk.StringVar(value="1x")
+    ctk.CTkComboBox(replay_frame, values=list(REPLAY_SPEEDS), variable=replay_speed_var, state="readonly", width=110).pack(side="left", padx=(5, 2), pady=5)
+    ctk.CTkButton(replay_frame, text="Replay HAR...", command=lambda: start_traffic_replay(replay_speed_var.get())).pack(side="left", padx=(2, 5), pady=5, fill="x", expand=True)
+
+    def apply_rate_limits():
+        """Apply the entered limits to every endpoint class of the active target."""
+        try:
+            rate = float(rate_entry.get() or 0)
+            max_in_flight = int(in_flight_entry.get() or 0)
+        except ValueError:
+            log("System", "error", "Rate limit and max in-flight must be numbers (0 = unlimited)")
+            return
+        RateLimiter.configure(target=CURRENT_TARGET, rate=rate, max_in_flight=max_in_flight)
+        log("System", "info", f"{CURRENT_TARGET}: {rate:g} req/s and {max_in_flight} in flight per endpoint class (0 = unlimited)")
+
+    limit_frame = ctk.CTkFrame(client_frame)
+    limit_frame.pack(pady=5, padx=10, fill="x")
+    rate_entry = ctk.CTkEntry(limit_frame, placeholder_text="req/s", width=70)
+    rate_entry.pack(side="left", padx=(5, 2), pady=5)
+    in_flight_entry = ctk.CTkEntry(limit_frame, placeholder_text="in-flight", width=70)
+    in_flight_entry.pack(side="left", padx=2, pady=5)
+    ctk.CTkButton(limit_frame, text="Apply Limits", command=apply_rate_limits, width=90).pack(side="left", padx=(2, 5), pady=5)
 
 def setup_songs_tab(tab_frame):
     """Clean Songs tab - tests all song endpoints."""
@@ -670,6 +3544,14 @@ def setup_playlists_tab(tab_frame):
 
 # --- Instructional Logging ---
 def log(source, log_type, text, payload=None):
+    """Write a line to the console; calls from other threads are reposted to the Tk thread."""
+    if threading.current_thread() is not threading.main_thread():
+        if output is not None:
+            try:
+                output.after(0, log, source, log_type, text, payload)
+            except (RuntimeError, tk.TclError):
+                pass  # Tk already shut down
+        return
     if not output or not output.winfo_exists(): return
     
     prefix_map = {
@@ -714,18 +3596,77 @@ def make_api_request(source, method, endpoint, json_payload=None, token=None):
     log(source, "api_call", f"{method} {clean_url}", payload=json_payload)
 
     try:
-        resp = requests.request(method, clean_url, json=json_payload, headers=headers, timeout=10)
+        resp = HTTPTransport.request(method, clean_url, json=json_payload, headers=headers)
         content = resp.json() if resp.content else None
-        
-        log_text = f"Status {resp.status_code}"
-        log_payload = content if content and len(str(content)) < 1000 else (f"<{len(resp.content)} bytes of data>" if resp.content else None)
-        log(source, "api_resp", log_text, payload=log_payload)
-
+        _log_api_response(source, resp, content)
         return {"status": resp.status_code, "content": content}
     except requests.RequestException as e:
         log(source, "error", f"API request failed: {e}")
         return None
 
+async def make_api_request_async(source, method, endpoint, json_payload=None, token=None):
+    """Same contract as make_api_request, for coroutines running on ClientEventLoop."""
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    
+    clean_url = f"{BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
+    log(source, "api_call", f"{method} {clean_url}", payload=json_payload)
+
+    try:
+        resp = await AsyncHTTPTransport.request(method, clean_url, json=json_payload, headers=headers)
+        content = resp.json() if resp.content else None
+        _log_api_response(source, resp, content)
+        return {"status": resp.status_code, "content": content}
+    except AsyncHTTPTransport.RequestError as e:
+        log(source, "error", f"API request failed: {e}")
+        return None
+    except ValueError as e:  # Non-JSON body; requests raises this as a RequestException on the sync path
+        log(source, "error", f"API request failed: {e}")
+        return None
+
+def make_api_request_streaming(source, method, endpoint, on_row=None, json_payload=None, token=None):
+    """Like make_api_request, but parses a JSON array body incrementally.
+
+    on_row(row) is called for each element as soon as it has been received.
+    Non-array or error bodies are parsed whole. Returns the same dict shape.
+    """
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    clean_url = f"{BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
+    log(source, "api_call", f"{method} {clean_url} (streaming)", payload=json_payload)
+
+    try:
+        with HTTPTransport.stream(method, clean_url, json=json_payload, headers=headers) as resp:
+            is_json = "json" in resp.headers.get("Content-Type", "")
+            if resp.status_code == 200 and is_json:
+                content = []
+                for row in iter_json_array(resp.chunks, resp.encoding or "utf-8"):
+                    content.append(row)
+                    if on_row:
+                        on_row(row)
+            else:
+                body = b"".join(resp.chunks)
+                content = json.loads(body) if body and is_json else (body.decode(errors="replace") or None)
+        size = resp.timing.bytes_received
+        if isinstance(content, list):
+            log_payload = f"<{len(content)} rows, {size} bytes streamed>"
+        else:
+            log_payload = content if content and size < LOG_PAYLOAD_MAX_BYTES else (f"<{size} bytes of data>" if size else None)
+        log(source, "api_resp", f"Status {resp.status_code} ({resp.timing.summary()})", payload=log_payload)
+        return {"status": resp.status_code, "content": content}
+    except (requests.RequestException, ValueError) as e:
+        log(source, "error", f"API request failed: {e}")
+        return None
+
+def _log_api_response(source, resp, content):
+    log_text = f"Status {resp.status_code} ({resp.timing.summary()})"
+    # Size from the raw body: stringifying a large parsed payload just to measure it copies it again
+    log_payload = content if content and len(resp.content) < LOG_PAYLOAD_MAX_BYTES else (f"<{len(resp.content)} bytes of data>" if resp.content else None)
+    log(source, "api_resp", log_text, payload=log_payload)
+
 # --- Image Fetching Helpers (HTTP + ETag) ---
 def _normalize_etag(etag_header):
     """Normalize ETag by removing quotes and W/ prefix for consistent comparison."""
@@ -740,8 +3681,25 @@ def _normalize_etag(etag_header):
         et = et[1:-1]
     return et
 
-def fetch_room_image(source_log, token, room_id, prev_etag):
-    headers = {"Authorization": f"Bearer {token}"}
+def _pil_supports(module):
+    try:
+        return bool(features.check_module(module))
+    except ValueError:  # Pillow too old to know the module
+        return False
+
+IMAGE_DECODABLE_FORMATS = [mime for mime, module in (("image/avif", "avif"), ("image/webp", "webp")) if _pil_supports(module)]
+
+def image_negotiation_headers(display_size=None, always=False):
+    """Accept (formats PIL can decode, best first) and a size hint for the frame the image is shown in."""
+    if not (IMAGE_NEGOTIATION or always):
+        return {}
+    headers = {"Accept": ",".join(IMAGE_DECODABLE_FORMATS + ["image/*;q=0.8", "*/*;q=0.5"])}
+    if display_size:
+        headers["X-Display-Size"] = f"{int(display_size[0])}x{int(display_size[1])}"
+    return headers
+
+def _room_image_headers(source_log, token, room_id, prev_etag, display_size=None):
+    headers = {"Authorization": f"Bearer {token}", **image_negotiation_headers(display_size)}
     if prev_etag:
         # Normalize ETag for If-None-Match header - ensure it's properly quoted
         normalized_etag = prev_etag.strip()
@@ -753,36 +3711,106 @@ def fetch_room_image(source_log, token, room_id, prev_etag):
         log(source_log, "cache", "No previous ETag. Requesting full image.")
 
     log(source_log, "api_call", f"GET /rooms/{room_id}/image")
+    return headers
+
+def _room_image_url(room_id):
+    return f"{BASE_URL.rstrip('/')}/rooms/{room_id}/image"
+
+def _stored_room_image(source_log, room_id, prev_etag, cached_bytes=None):
+    """Pick the ETag to revalidate and the bytes a 304 will hand back.
+
+    The caller's own copy wins; without a previous ETag the disk cache's last
+    ETag for room_id is used. Returns (etag or None, bytes or None).
+    """
+    url = _room_image_url(room_id)
+    if prev_etag:
+        return prev_etag, cached_bytes or DiskImageStore.get(url, _normalize_etag(prev_etag))
+    etag = DiskImageStore.room_etag(room_id)
+    stored = DiskImageStore.get(url, etag)
+    if stored is None:
+        return None, None
+    log(source_log, "cache", f"Found image for room {room_id} on disk (ETag {etag[:10]}...). Revalidating instead of downloading.")
+    return etag, stored
+
+def _room_image_result(source_log, resp, room_id, prev_etag, stored=None):
+    ConditionalGetStats.record(source_log, resp.status_code, len(stored) if resp.status_code == 304 and stored else 0,
+                               len(resp.content) if resp.status_code == 200 else 0)
+    if resp.status_code == 200:
+        etag_raw = resp.headers.get('ETag', '')
+        etag_normalized = _normalize_etag(etag_raw)
+        log(source_log, "api_resp", f"Status 200 OK. Received new image ({len(resp.content)} bytes). New ETag: {etag_normalized} (Raw: {etag_raw}) [{resp.timing.summary()}]")
+        DiskImageStore.put(_room_image_url(room_id), etag_normalized, resp.content)
+        DiskImageStore.remember_room(room_id, etag_normalized)
+        return 200, resp.content, etag_normalized
+    elif resp.status_code == 304:
+        log(source_log, "api_resp", f"Status 304 Not Modified. Server confirms cached image is still valid. [{resp.timing.summary()}]")
+        return 304, stored, prev_etag
+    else:
+        log(source_log, "error", f"Image fetch failed: {resp.status_code} - {resp.text}")
+        return resp.status_code, None, prev_etag
+
+def fetch_room_image(source_log, token, room_id, prev_etag, cached_bytes=None, display_size=None):
+    """GET the room image with If-None-Match.
 
+    cached_bytes is the caller's copy for prev_etag; a 304 returns it (or the
+    disk-cached copy) so every caller gets displayable bytes back. display_size
+    is sent as a hint so a negotiating server can return a smaller variant.
+    """
+    prev_etag, stored = _stored_room_image(source_log, room_id, prev_etag, cached_bytes)
+    headers = _room_image_headers(source_log, token, room_id, prev_etag, display_size)
     try:
-        resp = requests.get(f"{BASE_URL.rstrip('/')}/rooms/{room_id}/image", headers=headers, timeout=10)
-        if resp.status_code == 200:
-            etag_raw = resp.headers.get('ETag', '')
-            etag_normalized = _normalize_etag(etag_raw)
-            log(source_log, "api_resp", f"Status 200 OK. Received new image ({len(resp.content)} bytes). New ETag: {etag_normalized} (Raw: {etag_raw})")
-            return 200, resp.content, etag_normalized
-        elif resp.status_code == 304:
-            log(source_log, "api_resp", "Status 304 Not Modified. Server confirms cached image is still valid.")
-            return 304, None, prev_etag
-        else:
-            log(source_log, "error", f"Image fetch failed: {resp.status_code} - {resp.text}")
-            return resp.status_code, None, prev_etag
+        resp = HTTPTransport.request("GET", _room_image_url(room_id), headers=headers)
+        return _room_image_result(source_log, resp, room_id, prev_etag, stored)
     except requests.RequestException as e:
         log(source_log, "error", f"Image fetch error: {e}")
         return 0, None, prev_etag
 
-def display_image_bytes(target_frame, image_bytes, max_size=(400, 400)):
-    for widget in target_frame.winfo_children(): widget.destroy()
+async def fetch_room_image_async(source_log, token, room_id, prev_etag, cached_bytes=None, display_size=None):
+    """Non-blocking fetch_room_image for coroutines running on ClientEventLoop."""
+    if DiskImageStore.enabled():
+        # Disk reads go to a worker thread so they do not stall the shared loop
+        prev_etag, stored = await asyncio.to_thread(_stored_room_image, source_log, room_id, prev_etag, cached_bytes)
+    else:
+        prev_etag, stored = _stored_room_image(source_log, room_id, prev_etag, cached_bytes)
+    headers = _room_image_headers(source_log, token, room_id, prev_etag, display_size)
     try:
-        pil_img = Image.open(io.BytesIO(image_bytes))
-        pil_img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        ctk_img = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=pil_img.size)
-        img_label = ctk.CTkLabel(target_frame, image=ctk_img, text="")
-        img_label.image = ctk_img
-        img_label.pack(expand=True)
-    except Exception as e:
+        resp = await AsyncHTTPTransport.request("GET", _room_image_url(room_id), headers=headers)
+        return _room_image_result(source_log, resp, room_id, prev_etag, stored)
+    except AsyncHTTPTransport.RequestError as e:
+        log(source_log, "error", f"Image fetch error: {e}")
+        return 0, None, prev_etag
+
+def display_image_bytes(target_frame, image_bytes, max_size=(400, 400), etag=None, slot=None):
+    """Show image_bytes in target_frame's ImageView, decoded on DecodePipeline.
+
+    Pass the normalized ETag to reuse a cached thumbnail. Decodes are keyed by
+    slot (default: the frame), so a newer image cancels the older decode.
+    """
+    def show(pil_img):
+        ImageView.for_frame(target_frame).show_image(pil_img)
+
+    def failed(e):
         log("Host", "error", f"Error displaying image: {e}")
-        ctk.CTkLabel(target_frame, text=f"Error displaying image:\n{e}", text_color="red").pack(expand=True)
+        ImageView.for_frame(target_frame).show_text(f"Error displaying image:\n{e}", text_color="red")
+
+    DecodePipeline.submit(slot or str(target_frame), target_frame, image_bytes, max_size, etag, show, failed)
+
+def show_popup_image(popup, image_data, max_size, error_message):
+    """Decode image_data off the Tk thread and show it as the next widget in popup."""
+    placeholder = ctk.CTkLabel(popup, text="Decoding image...")
+    placeholder.pack(padx=10, pady=10)
+
+    def show(pil_img):
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(pil_img)
+        placeholder.configure(image=photo, text="")
+        placeholder.image = photo  # Keep a reference
+
+    def failed(e):
+        log("Songs", "error", f"{error_message}: {e}")
+        placeholder.configure(text=f"{error_message}:\n{e}", text_color="red")
+
+    DecodePipeline.submit(str(popup), popup, image_data, max_size, None, show, failed)
 
 def open_song_pdf(song):
     """Open song PDF file."""
@@ -800,60 +3828,387 @@ def open_song_pdf(song):
     # This would typically open a PDF viewer or download the PDF
     log("Songs", "info", "PDF functionality not implemented yet")
 
-def show_song_pages(song):
-    """Show song pages information."""
-    song_id = song.get('id')
-    if not song_id:
-        log("Songs", "error", "No song ID available")
-        return
-    
+def show_song_pages(song):
+    """Show song pages information."""
+    song_id = song.get('id')
+    if not song_id:
+        log("Songs", "error", "No song ID available")
+        return
+    
+    cache = get_current_user_cache()
+    if not cache.id_token:
+        log("Songs", "error", "Please authenticate first")
+        return
+    
+    total_pages = song.get('total_pages', 1)
+    log("Songs", "info", f"Song {song_id} has {total_pages} page(s)")
+
+def host_fetch_and_display_image(expected_etag):
+    """Show the room image from memory, or look on disk and GET it on a worker thread.
+
+    The result is drawn on the Tk thread unless a newer call has started meanwhile.
+    """
+    cache = get_current_user_cache()
+    if not cache.id_token or not cache.room_id: 
+        return
+    
+    # Normalize both ETags for consistent comparison
+    expected_normalized = _normalize_etag(expected_etag) if expected_etag else None
+    cached_normalized = _normalize_etag(cache.host_last_image_etag) if cache.host_last_image_etag else None
+    
+    # First check the centralized image cache (memory only; the disk tier is read on the worker)
+    if expected_normalized:
+        cached_image = cache.get_cached_image(expected_normalized)
+        if cached_image:
+            log("Host", "cache", f"ETag from WebSocket ({expected_normalized[:10]}...) found in centralized cache. Using stored image.")
+            display_image_bytes(song_display_frame, cached_image, max_size=(400, 400), etag=expected_normalized)
+            return
+    
+    # Check legacy cache for backward compatibility
+    if expected_normalized and cached_normalized == expected_normalized and cache.host_last_image_bytes:
+        log("Host", "cache", f"ETag from WebSocket ({expected_normalized[:10]}...) matches legacy cache. Using stored image.")
+        display_image_bytes(song_display_frame, cache.host_last_image_bytes, max_size=(400, 400), etag=expected_normalized)
+        # Migrate to centralized cache
+        cache.cache_image(expected_normalized, cache.host_last_image_bytes)
+        return
+
+    request = cache.host_image_request = object()
+    room_id, token = cache.room_id, cache.id_token
+    prev_etag, prev_bytes = cache.host_last_image_etag, cache.host_last_image_bytes
+
+    def fetch():
+        stored = DiskImageStore.get(_room_image_url(room_id), expected_normalized) if expected_normalized else None
+        if stored is not None:
+            schedule_gui_update(show_from_disk, stored)
+            return
+        result = fetch_room_image("Host", token, room_id, prev_etag, cached_bytes=prev_bytes, display_size=(400, 400))
+        schedule_gui_update(show_fetched, *result)
+
+    def show_from_disk(stored):
+        with cache.host_state_lock:
+            if cache.host_image_request is not request:
+                return  # A newer image request superseded this one
+            log("Host", "cache", f"ETag from WebSocket ({expected_normalized[:10]}...) found in disk cache. Using stored image.")
+            display_image_bytes(song_display_frame, cache.cache_image(expected_normalized, stored) or stored,
+                                max_size=(400, 400), etag=expected_normalized)
+
+    def show_fetched(status, img_bytes, etag_hex):
+        with cache.host_state_lock:
+            if cache.host_image_request is not request:
+                return  # A newer image request superseded this one
+            if status == 200 and img_bytes:
+                # Update both legacy and new cache
+                cache.host_last_image_bytes = img_bytes
+                cache.host_last_image_etag = etag_hex or expected_normalized
+
+                # Store in centralized cache; the legacy field then points at the shared copy
+                final_etag = etag_hex or expected_normalized
+                if final_etag:
+                    cache.host_last_image_bytes = cache.cache_image(final_etag, img_bytes) or img_bytes
+
+                display_image_bytes(song_display_frame, img_bytes, max_size=(400, 400), etag=final_etag)
+            elif status == 304 and (img_bytes or cache.host_last_image_bytes):
+                if img_bytes and img_bytes is not cache.host_last_image_bytes:
+                    # Revalidated a copy from the disk cache
+                    cache.host_last_image_etag = etag_hex
+                    cache.host_last_image_bytes = cache.cache_image(_normalize_etag(etag_hex), img_bytes) or img_bytes
+                display_image_bytes(song_display_frame, cache.host_last_image_bytes, max_size=(400, 400),
+                                    etag=_normalize_etag(cache.host_last_image_etag))
+
+    threading.Thread(target=fetch, daemon=True, name="host-image").start()
+
+# --- Host Page Prefetch ---
+class PagePrefetcher:
+    """Background fetch of the pages around the host's current page.
+
+    One daemon worker pulls /songs/{id}/page/{n} for the PREFETCH_WINDOW pages
+    on either side (nearest first, forward before back) into the host's image
+    cache and warms ThumbnailCache at the host display size. Pages are looked
+    up by (target, song, page), so both host_change_page and the page_updated
+    WebSocket message render from memory. The worker only logs (log() reposts
+    itself to the Tk thread) and never touches widgets. Each schedule() replaces the pending
+    plan, transfers are paced to PREFETCH_MAX_BYTES_PER_SEC, and requests go
+    through the "images" RateLimiter like any other image fetch.
+    """
+    window = PREFETCH_WINDOW
+    max_bytes_per_sec = PREFETCH_MAX_BYTES_PER_SEC
+    DISPLAY_SIZE = (400, 400)
+    MAX_INDEX = 512
+    _pages = OrderedDict()  # (target netloc, song_id, page) -> normalized ETag
+    _plan = []  # (UserCache, song_id, page) still to fetch, in order
+    _cond = threading.Condition()
+    _thread = None
+    fetched = 0
+    fetched_bytes = 0
+
+    @staticmethod
+    def _key(song_id, page):
+        return (urlsplit(BASE_URL).netloc, str(song_id), int(page))
+
+    @classmethod
+    def lookup(cls, cache, song_id, page):
+        """Return (etag, image bytes) for a prefetched page, or (None, None)."""
+        with cls._cond:
+            etag = cls._pages.get(cls._key(song_id, page))
+        if etag and etag in cache.image_cache:
+            return etag, cache.image_cache.get(etag)
+        return None, None
+
+    @classmethod
+    def schedule(cls, cache):
+        """Plan prefetches around cache.host_current_page, dropping any older plan."""
+        song_id, current, total = cache.host_current_song_id, cache.host_current_page, cache.host_total_pages
+        if cls.window <= 0 or not song_id or not cache.id_token:
+            return
+        pages = []
+        for distance in range(1, cls.window + 1):
+            for page in (current + distance, current - distance):
+                if 1 <= page <= total and cls.lookup(cache, song_id, page)[0] is None:
+                    pages.append(page)
+        with cls._cond:
+            cls._plan = [(cache, song_id, page) for page in pages]
+            if cls._thread is None:
+                cls._thread = threading.Thread(target=cls._worker, name="page-prefetch", daemon=True)
+                cls._thread.start()
+            cls._cond.notify()
+
+    @classmethod
+    def _worker(cls):
+        while True:
+            with cls._cond:
+                while not cls._plan:
+                    cls._cond.wait()
+                cache, song_id, page = cls._plan.pop(0)
+            size = cls._fetch(cache, song_id, page)
+            if size and cls.max_bytes_per_sec > 0:
+                time.sleep(size / cls.max_bytes_per_sec)
+
+    @classmethod
+    def _fetch(cls, cache, song_id, page):
+        if cls.lookup(cache, song_id, page)[0] is not None:
+            return 0
+        endpoint = f"/songs/{song_id}/page/{page}"
+        try:
+            resp = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}{endpoint}",
+                                         headers={"Authorization": f"Bearer {cache.id_token}",
+                                                  **image_negotiation_headers(cls.DISPLAY_SIZE)})
+        except requests.RequestException as e:
+            log("Prefetch", "warning", f"GET {endpoint} failed: {e}")
+            return 0
+        if resp.status_code != 200 or not resp.content:
+            log("Prefetch", "warning", f"GET {endpoint} returned {resp.status_code}; not prefetched")
+            return 0
+        content = resp.content
+        etag = _normalize_etag(resp.headers.get("ETag")) or f"sha256-{hashlib.sha256(content).hexdigest()}"
+        cache.image_cache.put(etag, content)
+        try:
+            ThumbnailCache.thumbnail(content, cls.DISPLAY_SIZE, etag)  # Decode here, not on the UI thread
+        except OSError as e:
+            log("Prefetch", "warning", f"{endpoint} is not a displayable image: {e}")
+            return len(content)
+        with cls._cond:
+            cls._pages[cls._key(song_id, page)] = etag
+            while len(cls._pages) > cls.MAX_INDEX:
+                cls._pages.popitem(last=False)
+            cls.fetched += 1
+            cls.fetched_bytes += len(content)
+        log("Prefetch", "cache", f"Prefetched page {page} of song {song_id} ({len(content)} bytes, ETag {etag[:10]}...) "
+                                 f"[{resp.timing.summary()}]")
+        return len(content)
+
+    @classmethod
+    def describe(cls):
+        return (f"window +/-{cls.window}, cap {cls.max_bytes_per_sec / 1024:.0f} KiB/s | "
+                f"{cls.fetched} pages prefetched ({cls.fetched_bytes / 1024:.0f} KiB), {len(cls._plan)} pending")
+
+# --- Image Negotiation Stand-in ---
+IMAGE_DISPLAY_SIZES = {"client thumbnail": (200, 200), "host": (400, 400), "client": (450, 550), "popup": (650, 700)}
+_IMAGE_PATH = re.compile(r"^/(rooms/[^/]+/image|songs/[^/]+/(image|page/\d+))$")
+
+class _ImageVariantHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep the console for application logs
+
+    def _reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if not _IMAGE_PATH.match(path):
+            return self._reply(404, b'{"detail":"Not Found"}', {"Content-Type": "application/json"})
+        try:
+            upstream = ImageVariantServer.session.get(ImageVariantServer.upstream.rstrip("/") + path, timeout=30,
+                                                      headers={"Authorization": self.headers.get("Authorization", "")})
+        except requests.RequestException as e:
+            return self._reply(502, str(e).encode("utf-8"), {"Content-Type": "text/plain"})
+        if upstream.status_code != 200:
+            return self._reply(upstream.status_code, upstream.content,
+                               {"Content-Type": upstream.headers.get("Content-Type", "application/octet-stream")})
+        size = None
+        match = re.fullmatch(r"\s*(\d+)\s*x\s*(\d+)\s*", self.headers.get("X-Display-Size", ""))
+        if match:
+            size = (int(match.group(1)), int(match.group(2)))
+        try:
+            body, content_type, etag = ImageVariantServer.variant(upstream.content, upstream.headers.get("ETag", ""),
+                                                                  self.headers.get("Accept", ""), size)
+        except (OSError, ValueError) as e:
+            return self._reply(502, f"Cannot transcode upstream image: {e}".encode("utf-8"), {"Content-Type": "text/plain"})
+        headers = {"ETag": etag, "Vary": "Accept, X-Display-Size"}
+        if _normalize_etag(self.headers.get("If-None-Match")) == _normalize_etag(etag):
+            return self._reply(304, headers=headers)
+        self._reply(200, body, {"Content-Type": content_type, **headers})
+
+class ImageVariantServer:
+    """Local stand-in for server-side image negotiation.
+
+    Proxies GET /rooms/{id}/image and /songs/{id}/image|page/{n} to the target
+    that was active when it started, shrinks the image to fit X-Display-Size
+    and re-encodes it as the first of AVIF / WebP that the Accept header
+    allows (else keeps the original format). Encoded variants are kept in a
+    small LRU so many clients asking for the same page cost one encode.
+    """
+    upstream = BASE_URL
+    session = requests.Session()
+    MAX_VARIANTS = 64
+    QUALITY = 75
+    _server = None
+    _variants = OrderedDict()  # (content sha256, format, size) -> (body, content type, etag)
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls, port=IMAGE_VARIANT_PORT):
+        """Serve on 127.0.0.1:port in front of the current BASE_URL; returns the base URL."""
+        with cls._lock:
+            cls.upstream = BASE_URL
+            if cls._server is None:
+                try:
+                    cls._server = ThreadingHTTPServer(("127.0.0.1", port), _ImageVariantHandler)
+                except OSError as e:
+                    log("Images", "error", f"Cannot start image negotiation stand-in on port {port}: {e}")
+                    return None
+                cls._server.daemon_threads = True
+                threading.Thread(target=cls._server.serve_forever, daemon=True, name="image-variants").start()
+                log("Images", "success", f"Image negotiation stand-in on http://127.0.0.1:{cls._server.server_port} "
+                                         f"in front of {cls.upstream}")
+            return f"http://127.0.0.1:{cls._server.server_port}"
+
+    @classmethod
+    def stop(cls):
+        with cls._lock:
+            server, cls._server = cls._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    @classmethod
+    def variant(cls, original, upstream_etag, accept, size):
+        """Return (body, content type, ETag) of original re-encoded for accept and shrunk to fit size."""
+        fmt = next((f for mime, f in (("image/avif", "AVIF"), ("image/webp", "WEBP"))
+                    if mime in accept and mime in IMAGE_DECODABLE_FORMATS), None)
+        key = (hashlib.sha256(original).hexdigest(), fmt, size)
+        with cls._lock:
+            cached = cls._variants.get(key)
+            if cached is not None:
+                cls._variants.move_to_end(key)
+                return cached
+        pil_img = Image.open(io.BytesIO(original))
+        source_format = pil_img.format
+        if size:
+            pil_img.thumbnail(size, Image.Resampling.LANCZOS)
+        if fmt is None and (not size or pil_img.size == Image.open(io.BytesIO(original)).size):
+            body, fmt = original, source_format
+        else:
+            fmt = fmt or source_format or "PNG"
+            if fmt in ("AVIF", "WEBP", "JPEG") and pil_img.mode not in ("RGB", "RGBA"):
+                pil_img = pil_img.convert("RGBA" if "A" in pil_img.getbands() or "transparency" in pil_img.info else "RGB")
+            if fmt == "JPEG" and pil_img.mode == "RGBA":
+                pil_img = pil_img.convert("RGB")
+            out = io.BytesIO()
+            pil_img.save(out, format=fmt, quality=cls.QUALITY)
+            body = out.getvalue()
+        tag = hashlib.sha256(f"{upstream_etag or key[0]}|{fmt}|{size}".encode("utf-8")).hexdigest()[:32]
+        result = (body, Image.MIME.get(fmt, "application/octet-stream"), f'W/"{tag}"')
+        with cls._lock:
+            cls._variants[key] = result
+            while len(cls._variants) > cls.MAX_VARIANTS:
+                cls._variants.popitem(last=False)
+        return result
+
+def _best_decode_ms(image_bytes, size, mode=None, runs=3):
+    mode = mode or ThumbnailCache.mode_for(size)
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        ThumbnailCache.resample(image_bytes, size, mode)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _image_format(image_bytes):
+    try:
+        return Image.open(io.BytesIO(image_bytes)).format or "?"
+    except OSError:
+        return "?"
+
+def _run_image_comparison(token, endpoints, variant_base, clients):
+    for endpoint in endpoints:
+        try:
+            full = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}{endpoint}", headers={"Authorization": f"Bearer {token}"})
+        except requests.RequestException as e:
+            log("Images", "error", f"GET {endpoint} failed: {e}")
+            continue
+        if full.status_code != 200 or not full.content:
+            log("Images", "error", f"GET {endpoint} returned {full.status_code}; skipping")
+            continue
+        full_bytes, full_format = len(full.content), _image_format(full.content)
+        log("Images", "info", f"{endpoint}: original {full_format} {full_bytes / 1024:.0f} KiB")
+        for label, size in IMAGE_DISPLAY_SIZES.items():
+            timings = ", ".join(f"{mode} {_best_decode_ms(full.content, size, mode):.1f} ms" for mode in ThumbnailCache.MODES)
+            log("Images", "info", f"  decode+resize original to {label} {size[0]}x{size[1]}: {timings}")
+            try:
+                variant = requests.get(f"{variant_base}{endpoint}", timeout=60, headers={
+                    "Authorization": f"Bearer {token}", **image_negotiation_headers(size, always=True)})
+            except requests.RequestException as e:
+                log("Images", "error", f"Stand-in request for {endpoint} failed: {e}")
+                break
+            if variant.status_code != 200:
+                log("Images", "error", f"Stand-in returned {variant.status_code} for {endpoint}")
+                break
+            variant_bytes = len(variant.content)
+            full_ms, variant_ms = _best_decode_ms(full.content, size), _best_decode_ms(variant.content, size)
+            saved = 100.0 * (1 - variant_bytes / full_bytes)
+            log("Images", "success",
+                f"  {label} {size[0]}x{size[1]}: {_image_format(variant.content)} {variant_bytes / 1024:.0f} KiB "
+                f"({saved:.0f}% fewer bytes), decode+fit {variant_ms:.1f} ms vs {full_ms:.1f} ms full | "
+                f"{clients} clients per page turn: {variant_bytes * clients / 1024 / 1024:.1f} MiB "
+                f"instead of {full_bytes * clients / 1024 / 1024:.1f} MiB")
+
+def compare_image_negotiation():
+    """Compare full-size image fetches with negotiated variants from ImageVariantServer at every display size."""
     cache = get_current_user_cache()
     if not cache.id_token:
-        log("Songs", "error", "Please authenticate first")
-        return
-    
-    total_pages = song.get('total_pages', 1)
-    log("Songs", "info", f"Song {song_id} has {total_pages} page(s)")
-
-def host_fetch_and_display_image(expected_etag):
-    cache = get_current_user_cache()
-    if not cache.id_token or not cache.room_id: 
+        log("Images", "warning", "Authenticate as host first.")
         return
-    
-    # Normalize both ETags for consistent comparison
-    expected_normalized = _normalize_etag(expected_etag) if expected_etag else None
-    cached_normalized = _normalize_etag(cache.host_last_image_etag) if cache.host_last_image_etag else None
-    
-    # First check the centralized image cache
-    if expected_normalized:
-        cached_image = cache.get_cached_image(expected_normalized)
-        if cached_image:
-            log("Host", "cache", f"ETag from WebSocket ({expected_normalized[:10]}...) found in centralized cache. Using stored image.")
-            display_image_bytes(song_display_frame, cached_image, max_size=(400, 400))
-            return
-    
-    # Check legacy cache for backward compatibility
-    if expected_normalized and cached_normalized == expected_normalized and cache.host_last_image_bytes:
-        log("Host", "cache", f"ETag from WebSocket ({expected_normalized[:10]}...) matches legacy cache. Using stored image.")
-        display_image_bytes(song_display_frame, cache.host_last_image_bytes, max_size=(400, 400))
-        # Migrate to centralized cache
-        cache.cache_image(expected_normalized, cache.host_last_image_bytes)
+    endpoints = []
+    if cache.room_id:
+        endpoints.append(f"/rooms/{cache.room_id}/image")
+    if cache.host_current_song_id:
+        endpoints.append(f"/songs/{cache.host_current_song_id}/page/{cache.host_current_page}")
+    if not endpoints:
+        log("Images", "warning", "Create a room or select a song first.")
         return
-
-    status, img_bytes, etag_hex = fetch_room_image("Host", cache.id_token, cache.room_id, cache.host_last_image_etag)
-    if status == 200 and img_bytes:
-        # Update both legacy and new cache
-        cache.host_last_image_bytes = img_bytes
-        cache.host_last_image_etag = etag_hex or expected_normalized
-        
-        # Store in centralized cache
-        final_etag = etag_hex or expected_normalized
-        if final_etag:
-            cache.cache_image(final_etag, img_bytes)
-        
-        display_image_bytes(song_display_frame, img_bytes, max_size=(400, 400))
-    elif status == 304 and cache.host_last_image_bytes:
-        display_image_bytes(song_display_frame, cache.host_last_image_bytes, max_size=(400, 400))
+    base = ImageVariantServer.start()
+    if base:
+        clients = len(simulated_clients) or 100
+        threading.Thread(target=_run_image_comparison, args=(cache.id_token, endpoints, base, clients),
+                         daemon=True, name="image-compare").start()
 
 # --- Host Functions ---
 def get_host_token():
@@ -862,27 +4217,18 @@ def get_host_token():
         log("Host", "error", "FIREBASE_API_KEY is not set. Check .env file.")
         return
     
-    # Check if we already have a valid token cached
-    if cache.id_token:
-        log("Host", "cache", f"Using cached token for {cache.user_email}")
-        return
-    
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-    payload = {"email": cache.user_email, "password": HOST_PASSWORD, "returnSecureToken": True}
-    
-    log("Host", "api_call", f"POST {url}", payload={"email": cache.user_email, "password": "..."})
-
     try:
-        resp = requests.post(url, json=payload, timeout=10)
-        if resp.status_code == 200:
-            content = resp.json()
-            cache.id_token = content.get("idToken")
-            log("Host", "api_resp", f"Status 200 OK - Authenticated host ({cache.user_email})", payload=content)
-            log("Host", "cache", f"Cached authentication token for {cache.user_email}")
-        else:
-            log("Host", "error", f"Host auth failed: {resp.json().get('error', {}).get('message', 'Unknown error')}")
+        credential, how = TokenManager.ensure(cache.user_email, HOST_PASSWORD, source="Host")
+    except AuthError as e:
+        log("Host", "error", f"Host auth failed: {e}")
+        return
     except requests.RequestException as e:
         log("Host", "error", f"Error during host auth: {e}")
+        return
+    if how == "cached":
+        log("Host", "cache", f"Using cached token for {cache.user_email} (expires in {credential.expires_in():.0f}s)")
+    else:
+        log("Host", "api_resp", f"Authenticated host ({cache.user_email}) - token {how}, expires in {credential.expires_in():.0f}s")
 
 def create_host_room():
     cache = get_current_user_cache()
@@ -945,6 +4291,16 @@ def host_select_song():
     else:
         log("Host", "error", "Failed to set song.", payload=resp.get('content') if resp else 'N/A')
 
+def show_prefetched_page(cache):
+    """Render the host's current page from PagePrefetcher, looked up by (song, page); False if not prefetched."""
+    song_id, page = cache.host_current_song_id, cache.host_current_page
+    etag, img_bytes = PagePrefetcher.lookup(cache, song_id, page)
+    if not img_bytes:
+        return False
+    log("Host", "cache", f"Page {page} of song {song_id} was prefetched (ETag {etag[:10]}...). Rendering without a fetch.")
+    display_image_bytes(song_display_frame, img_bytes, max_size=PagePrefetcher.DISPLAY_SIZE, etag=etag)
+    return True
+
 def host_change_page(direction):
     cache = get_current_user_cache()
     if not cache.host_current_song_id: log("Host", "warning", "Select a song first."); return
@@ -963,7 +4319,9 @@ def host_change_page(direction):
         with cache.host_state_lock:
             cache.host_current_page = new_page
             page_indicator.configure(text=f"Page: {cache.host_current_page}/{cache.host_total_pages}")
-            # Image will be fetched when WebSocket confirms page change
+            # Show a prefetched copy now instead of waiting for the WebSocket confirmation
+            show_prefetched_page(cache)
+        PagePrefetcher.schedule(cache)
     else:
         log("Host", "error", "Failed to change page.", payload=resp.get('content') if resp else 'N/A')
 
@@ -979,6 +4337,7 @@ async def host_ws_client_loop():
     cache = get_current_user_cache()
     ws_url = _normalize_websocket_url(WEBSOCKET_URL, cache.id_token)
     log("Host", "info", "Host attempting WebSocket connection...")
+    trace = WebSocketTrace(ws_url)
     try:
         async with websockets.connect(ws_url) as websocket:
             host_ws_connection = websocket
@@ -986,16 +4345,20 @@ async def host_ws_client_loop():
             
             cache = get_current_user_cache()
             join_payload = {"type": "join_room", "room_id": cache.room_id}
-            await websocket.send(json.dumps(join_payload))
+            join_message = json.dumps(join_payload)
+            await websocket.send(join_message)
+            trace.sent(join_message)
             log("Host", "ws_send", "Sent join_room message.", payload=join_payload)
 
             async for message in websocket:
+                trace.received(message)
                 cache = get_current_user_cache()
                 if cache.host_is_disconnecting: break
                 schedule_gui_update(handle_host_message, message)
     except Exception as e:
         log("Host", "error", f"Host WebSocket connection error: {e}")
     finally:
+        trace.close()
         host_ws_connection = None
         log("Host", "info", "Host WebSocket disconnected.")
 
@@ -1032,6 +4395,7 @@ def handle_host_message(msg):
                 song_info_label.configure(text=f"Song: {song_details.get('title', cache.host_current_song_id)}")
                 page_indicator.configure(text=f"Page: {cache.host_current_page}/{cache.host_total_pages}")
                 host_fetch_and_display_image(room_state.get('image_etag'))
+                PagePrefetcher.schedule(cache)
                 log("Host", "info", "Received initial room state via WebSocket")
         elif msg_type == "song_updated":
             cache.host_current_song_id = msg_data.get("song_id", cache.host_current_song_id)
@@ -1040,11 +4404,15 @@ def handle_host_message(msg):
             song_info_label.configure(text=f"Song: {msg_data.get('title', cache.host_current_song_id)}")
             page_indicator.configure(text=f"Page: {cache.host_current_page}/{cache.host_total_pages}")
             host_fetch_and_display_image(msg_data.get("image_etag"))
+            PagePrefetcher.schedule(cache)
         elif msg_type == "page_updated":
             if "current_page" in msg_data:
                 cache.host_current_page = msg_data.get("current_page")
                 page_indicator.configure(text=f"Page: {cache.host_current_page}/{cache.host_total_pages}")
-            host_fetch_and_display_image(msg_data.get("image_etag"))
+            # The room image ETag names the room's copy, not the page; prefetched pages are keyed by (song, page)
+            if not show_prefetched_page(cache):
+                host_fetch_and_display_image(msg_data.get("image_etag"))
+            PagePrefetcher.schedule(cache)
     
     # Handle non-state messages outside the lock
     if msg_type == "participant_joined":
@@ -1065,25 +4433,18 @@ def authenticate_songs_tab():
         log("Songs", "error", "FIREBASE_API_KEY is not set. Check .env file.")
         return
     
-    # Use existing token if available
-    if cache.id_token:
-        log("Songs", "cache", f"Using cached token for {cache.user_email}")
-        update_songs_console(f"✓ Using cached authentication for {cache.user_email}")
-        return
-    
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-    payload = {"email": cache.user_email, "password": HOST_PASSWORD, "returnSecureToken": True}
-    
     try:
-        resp = requests.post(url, json=payload, timeout=10)
-        if resp.status_code == 200:
-            cache.id_token = resp.json().get("idToken")
-            log("Songs", "success", f"Authenticated as {cache.user_email}")
-            update_songs_console(f"✓ Authenticated as {cache.user_email}")
+        credential, how = TokenManager.ensure(cache.user_email, HOST_PASSWORD, source="Songs")
+        if how == "cached":
+            log("Songs", "cache", f"Using cached token for {cache.user_email}")
+            update_songs_console(f"✓ Using cached authentication for {cache.user_email}")
         else:
-            error_msg = f"Auth failed: {resp.json().get('error', {}).get('message', 'Unknown error')}"
-            log("Songs", "error", error_msg)
-            update_songs_console(f"✗ {error_msg}")
+            log("Songs", "success", f"Authenticated as {cache.user_email} (token {how})")
+            update_songs_console(f"✓ Authenticated as {cache.user_email}")
+    except AuthError as e:
+        error_msg = f"Auth failed: {e}"
+        log("Songs", "error", error_msg)
+        update_songs_console(f"✗ {error_msg}")
     except requests.RequestException as e:
         error_msg = f"Auth error: {e}"
         log("Songs", "error", error_msg)
@@ -1110,20 +4471,48 @@ def load_all_songs_clean():
     
     log("Songs", "info", "Loading all songs...")
     update_songs_console("Loading all songs...")
-    resp = make_api_request('Songs', 'GET', endpoint, token=cache.id_token)
-    
-    if resp and resp['status'] == 200:
-        cache.songs_current_list = resp['content']
-        cache.cache_api_response(endpoint, resp)  # Cache the response
-        display_songs_list(cache.songs_current_list)
-        display_songs_list_proper(cache.songs_current_list)  # Update both displays
-        success_msg = f"✓ Loaded {len(cache.songs_current_list)} songs"
-        log("Songs", "success", f"Loaded {len(cache.songs_current_list)} songs")
-        update_songs_console(success_msg)
-    else:
-        error_msg = f"✗ Failed to load - {resp.get('content') if resp else 'N/A'}"
-        log("Songs", "error", f"Failed to load - {resp.get('content') if resp else 'N/A'}")
-        update_songs_console(error_msg)
+    started = time.perf_counter()
+    first_row = {}
+    shown = [0]  # Rows drawn so far; only touched on the Tk thread
+
+    def show_rows(rows):
+        display_songs_list_proper(rows, append=shown[0] > 0)
+        shown[0] += len(rows)
+
+    def download():
+        # Runs off the Tk thread; rows are handed over in batches as the body arrives
+        batch, flushed = [], [time.perf_counter()]
+
+        def on_row(row):
+            first_row.setdefault("at", time.perf_counter() - started)
+            batch.append(row)
+            if len(batch) >= SONG_ROW_BATCH or time.perf_counter() - flushed[0] > 0.05:
+                schedule_gui_update(show_rows, batch[:])
+                batch.clear()
+                flushed[0] = time.perf_counter()
+
+        resp = make_api_request_streaming('Songs', 'GET', endpoint, on_row=on_row, token=token)
+        schedule_gui_update(finish, batch[:], resp)
+
+    def finish(rest, resp):
+        if rest:
+            show_rows(rest)
+        if resp and resp['status'] == 200:
+            cache.songs_current_list = resp['content']
+            cache.cache_api_response(endpoint, resp)  # Cache the response
+            if not shown[0]:
+                display_songs_list_proper(cache.songs_current_list)
+            success_msg = f"✓ Loaded {len(cache.songs_current_list)} songs"
+            first_row_text = f", first row after {first_row['at'] * 1000:.0f}ms" if first_row else ""
+            log("Songs", "success", f"Loaded {len(cache.songs_current_list)} songs{first_row_text}")
+            update_songs_console(success_msg)
+        else:
+            error_msg = f"✗ Failed to load - {resp.get('content') if resp else 'N/A'}"
+            log("Songs", "error", f"Failed to load - {resp.get('content') if resp else 'N/A'}")
+            update_songs_console(error_msg)
+
+    token = cache.id_token
+    threading.Thread(target=download, daemon=True, name="songs-download").start()
 
 def search_songs_clean():
     cache = get_current_user_cache()
@@ -1268,7 +4657,7 @@ def test_song_image(song):
     log("Songs", "info", f"Testing GET /songs/{song_id}/image")
     
     try:
-        resp = requests.get(f"{BASE_URL.rstrip('/')}/songs/{song_id}/image", timeout=10)
+        resp = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}/songs/{song_id}/image")
         if resp.status_code == 200:
             log("Songs", "success", f"GET /songs/{song_id}/image - Success ({len(resp.content)} bytes)")
             show_image_popup(song, resp.content)
@@ -1296,7 +4685,7 @@ def test_song_page(song, page_num):
     log("Songs", "info", f"Testing GET /songs/{song_id}/page/{page_num}")
     
     try:
-        resp = requests.get(f"{BASE_URL.rstrip('/')}/songs/{song_id}/page/{page_num}", timeout=10)
+        resp = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}/songs/{song_id}/page/{page_num}")
         if resp.status_code == 200:
             log("Songs", "success", f"GET /songs/{song_id}/page/{page_num} - Success ({len(resp.content)} bytes)")
             show_page_popup(song, page_num, resp.content)
@@ -1308,9 +4697,6 @@ def test_song_page(song, page_num):
 def show_image_popup(song, image_data):
     """Show song image in popup."""
     try:
-        from PIL import Image, ImageTk
-        import io
-        
         popup = ctk.CTkToplevel()
         popup.title(f"Image - {song.get('title', 'Unknown')}")
         popup.geometry("600x700")
@@ -1318,13 +4704,7 @@ def show_image_popup(song, image_data):
         ctk.CTkLabel(popup, text=f"{song.get('title', 'Unknown')} - Cover Image", 
                    font=ctk.CTkFont(size=14, weight="bold")).pack(pady=10)
         
-        image = Image.open(io.BytesIO(image_data))
-        image.thumbnail((500, 500), Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
-        
-        image_label = ctk.CTkLabel(popup, image=photo, text="")
-        image_label.pack(padx=10, pady=10)
-        image_label.image = photo
+        show_popup_image(popup, image_data, (500, 500), "Failed to display image")
         
     except Exception as e:
         log("Songs", "error", f"Failed to display image: {e}")
@@ -1332,9 +4712,6 @@ def show_image_popup(song, image_data):
 def show_page_popup(song, page_num, image_data):
     """Show song page in popup."""
     try:
-        from PIL import Image, ImageTk
-        import io
-        
         popup = ctk.CTkToplevel()
         popup.title(f"Page {page_num} - {song.get('title', 'Unknown')}")
         popup.geometry("600x700")
@@ -1342,13 +4719,7 @@ def show_page_popup(song, page_num, image_data):
         ctk.CTkLabel(popup, text=f"{song.get('title', 'Unknown')} - Page {page_num}", 
                    font=ctk.CTkFont(size=14, weight="bold")).pack(pady=10)
         
-        image = Image.open(io.BytesIO(image_data))
-        image.thumbnail((500, 600), Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
-        
-        image_label = ctk.CTkLabel(popup, image=photo, text="")
-        image_label.pack(padx=10, pady=10)
-        image_label.image = photo
+        show_popup_image(popup, image_data, (500, 600), "Failed to display page")
         
     except Exception as e:
         log("Songs", "error", f"Failed to display page: {e}")
@@ -1421,8 +4792,12 @@ def get_song_by_id_proper(song_id):
     else:
         log("Songs", "error", f"Failed to get song {song_id}", payload=resp.get('content') if resp else 'N/A')
 
-def display_songs_list_proper(songs):
-    """Display songs in the songs list frame with ALL endpoint actions."""
+def display_songs_list_proper(songs, append=False):
+    """Display songs in the songs list frame with ALL endpoint actions.
+
+    With append=True the rows are added below those already shown (used while
+    a list is still streaming in).
+    """
     # Find the songs tab and its scrollable frame
     for widget in main_frame.winfo_children():
         if hasattr(widget, '_name') and 'tabview' in str(type(widget)).lower():
@@ -1436,11 +4811,13 @@ def display_songs_list_proper(songs):
                 songs_frame = songs_tab.songs_scrollable
                 
                 # Clear previous songs
-                for child in songs_frame.winfo_children():
-                    child.destroy()
+                if not append:
+                    for child in songs_frame.winfo_children():
+                        child.destroy()
                 
                 if not songs:
-                    ctk.CTkLabel(songs_frame, text="No songs found\nTry loading all songs or searching").pack(pady=20)
+                    if not append:
+                        ctk.CTkLabel(songs_frame, text="No songs found\nTry loading all songs or searching").pack(pady=20)
                     return
                 
                 # Display each song with ALL endpoint actions
@@ -1510,8 +4887,7 @@ def test_song_image_endpoint(song):
     
     # Make request without token for image
     try:
-        import requests
-        resp = requests.get(f"{BASE_URL}/songs/{song_id}/image", timeout=10)
+        resp = HTTPTransport.request("GET", f"{BASE_URL}/songs/{song_id}/image")
         
         if resp.status_code == 200:
             log("Songs", "success", f"GET /songs/{song_id}/image - Image retrieved ({len(resp.content)} bytes)")
@@ -1565,8 +4941,7 @@ def test_single_page_endpoint(song, page_num):
     log("Songs", "info", f"Testing GET /songs/{song_id}/page/{page_num} endpoint")
     
     try:
-        import requests
-        resp = requests.get(f"{BASE_URL}/songs/{song_id}/page/{page_num}", timeout=10)
+        resp = HTTPTransport.request("GET", f"{BASE_URL}/songs/{song_id}/page/{page_num}")
         
         if resp.status_code == 200:
             log("Songs", "success", f"GET /songs/{song_id}/page/{page_num} - Page image retrieved ({len(resp.content)} bytes)")
@@ -1644,9 +5019,6 @@ def display_single_song_details(song_details):
 def show_song_image_popup(song, image_data):
     """Show song cover image in a popup window."""
     try:
-        from PIL import Image, ImageTk
-        import io
-        
         # Create popup window
         popup = ctk.CTkToplevel()
         popup.title(f"Song Cover - {song.get('title', 'Unknown')}")
@@ -1661,13 +5033,7 @@ def show_song_image_popup(song, image_data):
         ctk.CTkLabel(info_frame, text=f"Endpoint: GET /songs/{song.get('id')}/image", font=ctk.CTkFont(size=10)).pack(pady=5)
         
         # Image display
-        image = Image.open(io.BytesIO(image_data))
-        image.thumbnail((500, 500), Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
-        
-        image_label = ctk.CTkLabel(popup, image=photo, text="")
-        image_label.pack(padx=10, pady=10)
-        image_label.image = photo  # Keep a reference
+        show_popup_image(popup, image_data, (500, 500), "Failed to display image")
         
         popup.transient()
         popup.grab_set()
@@ -1678,9 +5044,6 @@ def show_song_image_popup(song, image_data):
 def show_song_page_popup(song, page_num, image_data):
     """Show song page image in a popup window."""
     try:
-        from PIL import Image, ImageTk
-        import io
-        
         # Create popup window
         popup = ctk.CTkToplevel()
         popup.title(f"Page {page_num} - {song.get('title', 'Unknown')}")
@@ -1695,13 +5058,7 @@ def show_song_page_popup(song, page_num, image_data):
         ctk.CTkLabel(info_frame, text=f"Endpoint: GET /songs/{song.get('id')}/page/{page_num}", font=ctk.CTkFont(size=10)).pack(pady=5)
         
         # Image display
-        image = Image.open(io.BytesIO(image_data))
-        image.thumbnail((500, 600), Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
-        
-        image_label = ctk.CTkLabel(popup, image=photo, text="")
-        image_label.pack(padx=10, pady=10)
-        image_label.image = photo  # Keep a reference
+        show_popup_image(popup, image_data, (500, 600), "Failed to display page image")
         
         popup.transient()
         popup.grab_set()
@@ -1984,13 +5341,14 @@ def show_song_image_enhanced(song):
     # Fetch and display image
     try:
         cache = get_current_user_cache()
-        headers = {"Authorization": f"Bearer {cache.id_token}"}
-        resp = requests.get(f"{BASE_URL.rstrip('/')}/songs/{song_id}/image", headers=headers, timeout=10)
+        headers = {"Authorization": f"Bearer {cache.id_token}", **image_negotiation_headers((650, 700))}
+        resp = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}/songs/{song_id}/image", headers=headers)
         
         if resp.status_code == 200:
             image_frame = ctk.CTkFrame(image_window)
             image_frame.pack(fill="both", expand=True, padx=10, pady=10)
-            display_image_bytes(image_frame, resp.content, max_size=(650, 700))
+            display_image_bytes(image_frame, resp.content, max_size=(650, 700),
+                                etag=_normalize_etag(resp.headers.get("ETag")))
             log("Songs", "success", f"Loaded image for song {song_id}")
         else:
             ctk.CTkLabel(image_window, text=f"Failed to load image\nStatus: {resp.status_code}").pack(expand=True)
@@ -2059,13 +5417,14 @@ def show_song_page_enhanced(song, page_number):
     # Fetch and display page
     try:
         cache = get_current_user_cache()
-        headers = {"Authorization": f"Bearer {cache.id_token}"}
-        resp = requests.get(f"{BASE_URL.rstrip('/')}/songs/{song_id}/page/{page_number}", headers=headers, timeout=10)
+        headers = {"Authorization": f"Bearer {cache.id_token}", **image_negotiation_headers((650, 700))}
+        resp = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}/songs/{song_id}/page/{page_number}", headers=headers)
         
         if resp.status_code == 200:
             image_frame = ctk.CTkFrame(page_window)
             image_frame.pack(fill="both", expand=True, padx=10, pady=10)
-            display_image_bytes(image_frame, resp.content, max_size=(650, 700))
+            display_image_bytes(image_frame, resp.content, max_size=(650, 700),
+                                etag=_normalize_etag(resp.headers.get("ETag")))
             log("Songs", "success", f"Loaded page {page_number} for song {song_id}")
         else:
             ctk.CTkLabel(page_window, text=f"Failed to load page\nStatus: {resp.status_code}").pack(expand=True)
@@ -2109,13 +5468,14 @@ def show_song_page(song_details, page_number):
     # Fetch and display page
     try:
         cache = get_current_user_cache()
-        headers = {"Authorization": f"Bearer {cache.id_token}"}
-        resp = requests.get(f"{BASE_URL.rstrip('/')}/songs/{song_id}/page/{page_number}", headers=headers, timeout=10)
+        headers = {"Authorization": f"Bearer {cache.id_token}", **image_negotiation_headers((550, 650))}
+        resp = HTTPTransport.request("GET", f"{BASE_URL.rstrip('/')}/songs/{song_id}/page/{page_number}", headers=headers)
         
         if resp.status_code == 200:
             image_frame = ctk.CTkFrame(page_window)
             image_frame.pack(fill="both", expand=True, padx=10, pady=10)
-            display_image_bytes(image_frame, resp.content, max_size=(550, 650))
+            display_image_bytes(image_frame, resp.content, max_size=(550, 650),
+                                etag=_normalize_etag(resp.headers.get("ETag")))
             log("Songs", "success", f"Loaded page {page_number} for song {song_id}")
         else:
             ctk.CTkLabel(page_window, text=f"Failed to load page\nStatus: {resp.status_code}").pack(expand=True)
@@ -2154,19 +5514,18 @@ def authenticate_playlists_tab():
         log("Playlists", "error", "FIREBASE_API_KEY is not set. Check .env file.")
         return
     
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-    payload = {"email": HOST_EMAIL, "password": HOST_PASSWORD, "returnSecureToken": True}
-    
     try:
-        resp = requests.post(url, json=payload, timeout=10)
-        if resp.status_code == 200:
-            cache.id_token = resp.json().get("idToken")
-            log("Playlists", "success", f"Authenticated as {HOST_EMAIL}")
-            update_playlists_console(f"✓ Authenticated as {HOST_EMAIL}")
+        credential, how = TokenManager.ensure(cache.user_email, HOST_PASSWORD, source="Playlists")
+        if how == "cached":
+            log("Playlists", "cache", f"Using cached token for {cache.user_email}")
+            update_playlists_console(f"✓ Using cached authentication for {cache.user_email}")
         else:
-            error_msg = f"Auth failed: {resp.json().get('error', {}).get('message', 'Unknown error')}"
-            log("Playlists", "error", error_msg)
-            update_playlists_console(f"✗ {error_msg}")
+            log("Playlists", "success", f"Authenticated as {cache.user_email} (token {how})")
+            update_playlists_console(f"✓ Authenticated as {cache.user_email}")
+    except AuthError as e:
+        error_msg = f"Auth failed: {e}"
+        log("Playlists", "error", error_msg)
+        update_playlists_console(f"✗ {error_msg}")
     except requests.RequestException as e:
         error_msg = f"Auth error: {e}"
         log("Playlists", "error", error_msg)
@@ -2452,469 +5811,6 @@ def delete_playlist_clean(playlist):
 
 # === SECTION 5: CLIENT MANAGEMENT & SIMULATION ===
 
-class SimulatedClient:
-    """Enhanced client class with separate terminal for API logging."""
-    
-    def __init__(self, client_id):
-        self.client_id = client_id
-        self.log_source = f"Client {self.client_id}"
-        self.client_token = None
-        self.ws_thread = None
-        self.is_disconnecting = False
-        self.image_cache = {}  # Dictionary cache: {etag: image_bytes}
-        self.state_lock = threading.Lock()
-        
-        # Add to user cache
-        cache = get_current_user_cache()
-        cache.add_client(self)
-        
-        # Create client window with separate terminal
-        self.create_client_window()
-        
-        log("System", "success", f"Created client {self.client_id}")
-    
-    def create_client_window(self):
-        """Create client window with separate API terminal."""
-        self.window = ctk.CTkToplevel()
-        self.window.title(f"Client {self.client_id} - Room Simulator")
-        self.window.geometry("1200x800")
-        
-        # Main container with two panels
-        main_container = ctk.CTkFrame(self.window)
-        main_container.pack(fill="both", expand=True, padx=5, pady=5)
-        main_container.grid_columnconfigure(0, weight=1)
-        main_container.grid_columnconfigure(1, weight=1)
-        main_container.grid_rowconfigure(0, weight=1)
-        
-        # Left panel - Client controls
-        self.controls_frame = ctk.CTkFrame(main_container)
-        self.controls_frame.grid(row=0, column=0, sticky="nsew", padx=(0, 2))
-        
-        # Right panel - API Terminal
-        self.terminal_frame = ctk.CTkFrame(main_container)
-        self.terminal_frame.grid(row=0, column=1, sticky="nsew", padx=(2, 0))
-        
-        self.setup_client_controls()
-        self.setup_client_terminal()
-        
-        # Handle window close
-        self.window.protocol("WM_DELETE_WINDOW", self.disconnect)
-    
-    def setup_client_controls(self):
-        """Setup client control panel."""
-        # Header
-        header_frame = ctk.CTkFrame(self.controls_frame)
-        header_frame.pack(fill="x", padx=10, pady=10)
-        
-        ctk.CTkLabel(header_frame, text=f"Client {self.client_id}", 
-                    font=ctk.CTkFont(size=16, weight="bold")).pack(pady=5)
-        
-        # Authentication section
-        auth_frame = ctk.CTkFrame(self.controls_frame)
-        auth_frame.pack(fill="x", padx=10, pady=5)
-        
-        ctk.CTkLabel(auth_frame, text="Authentication", 
-                    font=ctk.CTkFont(size=12, weight="bold")).pack(pady=5)
-        
-        # User selection
-        self.user_var = ctk.StringVar(value=TEST_USERS[0]["email"])
-        user_dropdown = ctk.CTkComboBox(auth_frame, 
-                                       values=[user["email"] for user in TEST_USERS],
-                                       variable=self.user_var, state="readonly")
-        user_dropdown.pack(pady=5)
-        
-        ctk.CTkButton(auth_frame, text="Authenticate", 
-                     command=self.authenticate_client).pack(pady=5)
-        
-        self.auth_status = ctk.CTkLabel(auth_frame, text="Not authenticated", 
-                                       text_color="red")
-        self.auth_status.pack(pady=2)
-        
-        # Room controls
-        room_frame = ctk.CTkFrame(self.controls_frame)
-        room_frame.pack(fill="x", padx=10, pady=5)
-        
-        ctk.CTkLabel(room_frame, text="Room Controls", 
-                    font=ctk.CTkFont(size=12, weight="bold")).pack(pady=5)
-        
-        self.room_entry = ctk.CTkEntry(room_frame, placeholder_text="Room ID")
-        self.room_entry.pack(pady=5)
-        
-        ctk.CTkButton(room_frame, text="Join Room", 
-                     command=self.join_room).pack(pady=2)
-        ctk.CTkButton(room_frame, text="Connect WebSocket", 
-                     command=self.connect_websocket).pack(pady=2)
-        ctk.CTkButton(room_frame, text="Disconnect", 
-                     command=self.disconnect_websocket).pack(pady=2)
-        
-        # Status display
-        status_frame = ctk.CTkFrame(self.controls_frame)
-        status_frame.pack(fill="both", expand=True, padx=10, pady=5)
-        
-        ctk.CTkLabel(status_frame, text="Status", 
-                    font=ctk.CTkFont(size=12, weight="bold")).pack(pady=5)
-        
-        self.status_text = ctk.CTkTextbox(status_frame, height=100)
-        self.status_text.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        # Image display
-        self.image_frame = ctk.CTkFrame(self.controls_frame)
-        self.image_frame.pack(fill="x", padx=10, pady=5, ipady=10)
-        
-        ctk.CTkLabel(self.image_frame, text="Current Song Image").pack(pady=5)
-        
-        self.image_display = ctk.CTkFrame(self.image_frame)
-        self.image_display.pack(fill="x", padx=5, pady=5)
-        
-        ctk.CTkLabel(self.image_display, text="No image", text_color="gray").pack(pady=20)
-    
-    def setup_client_terminal(self):
-        """Setup separate API terminal for this client."""
-        # Terminal header
-        terminal_header = ctk.CTkFrame(self.terminal_frame)
-        terminal_header.pack(fill="x", padx=10, pady=10)
-        
-        ctk.CTkLabel(terminal_header, text=f"Client {self.client_id} - API Terminal", 
-                    font=ctk.CTkFont(size=14, weight="bold")).pack(side="left", pady=5)
-        
-        ctk.CTkButton(terminal_header, text="Clear", width=60,
-                     command=self.clear_terminal).pack(side="right", padx=5)
-        
-        # Terminal output
-        self.terminal_output = scrolledtext.ScrolledText(
-            self.terminal_frame, 
-            wrap=tk.WORD, 
-            height=35,
-            bg="#1a1a1a", 
-            fg="#ffffff", 
-            insertbackground="white",
-            font=("Consolas", 9)
-        )
-        self.terminal_output.pack(fill="both", expand=True, padx=10, pady=(0, 10))
-        
-        # Configure terminal colors
-        self.setup_terminal_colors()
-        
-        # Initial welcome message
-        self.log_to_terminal("System", "info", f"Client {self.client_id} terminal initialized")
-    
-    def setup_terminal_colors(self):
-        """Setup color tags for terminal output."""
-        self.terminal_output.tag_config("api_call", foreground="#00ff00")
-        self.terminal_output.tag_config("api_resp", foreground="#00ffff")
-        self.terminal_output.tag_config("ws_send", foreground="#ffff00")
-        self.terminal_output.tag_config("ws_recv", foreground="#ff8800")
-        self.terminal_output.tag_config("success", foreground="#00ff00")
-        self.terminal_output.tag_config("error", foreground="#ff0000")
-        self.terminal_output.tag_config("warning", foreground="#ffaa00")
-        self.terminal_output.tag_config("info", foreground="#ffffff")
-        self.terminal_output.tag_config("cache", foreground="#aa88ff")
-    
-    def log_to_terminal(self, source, log_type, text, payload=None):
-        """Log message to client's separate terminal."""
-        if not hasattr(self, 'terminal_output') or not self.terminal_output.winfo_exists():
-            return
-        
-        prefix_map = {
-            "api_call": "[API CALL] >", "api_resp": "[API RESP] <",
-            "ws_send": "[WS SEND]  >", "ws_recv": "[WS RECV]  <",
-            "cache": "[CACHE] *", "info": "[INFO]",
-            "success": "[SUCCESS]", "error": "[ERROR]", "warning": "[WARNING]"
-        }
-        
-        prefix = prefix_map.get(log_type, "[INFO]")
-        timestamp = time.strftime("%H:%M:%S")
-        
-        full_message = f"[{timestamp}] [{source}] {prefix} {text}\n"
-        if payload:
-            if isinstance(payload, dict):
-                if 'idToken' in payload: 
-                    payload['idToken'] = f"{payload['idToken'][:15]}..."
-                if 'token' in payload: 
-                    payload['token'] = f"{payload['token'][:15]}..."
-            payload_str = json.dumps(payload, indent=2)
-            full_message += f"  Payload: {payload_str}\n"
-        
-        self.terminal_output.configure(state='normal')
-        self.terminal_output.insert(tk.END, full_message, log_type)
-        self.terminal_output.configure(state='disabled')
-        self.terminal_output.see(tk.END)
-    
-    def clear_terminal(self):
-        """Clear the client terminal."""
-        self.terminal_output.configure(state='normal')
-        self.terminal_output.delete(1.0, tk.END)
-        self.terminal_output.configure(state='disabled')
-        self.log_to_terminal("System", "info", "Terminal cleared")
-    
-    def authenticate_client(self):
-        """Authenticate this client with selected user credentials."""
-        selected_email = self.user_var.get()
-        user_data = next((u for u in TEST_USERS if u["email"] == selected_email), None)
-        
-        if not user_data:
-            self.log_to_terminal("Auth", "error", f"User data not found for {selected_email}")
-            return
-        
-        self.log_to_terminal("Auth", "info", f"Authenticating as {selected_email}")
-        
-        if not FIREBASE_API_KEY:
-            self.log_to_terminal("Auth", "error", "Firebase API key not configured")
-            return
-        
-        payload = {
-            "email": user_data["email"],
-            "password": user_data["password"],
-            "returnSecureToken": True
-        }
-        
-        firebase_url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-        
-        try:
-            self.log_to_terminal("Auth", "api_call", f"POST Firebase Auth for {selected_email}")
-            resp = requests.post(firebase_url, json=payload, timeout=10)
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                self.client_token = data.get('idToken')
-                self.log_to_terminal("Auth", "success", f"Authentication successful for {selected_email}")
-                self.auth_status.configure(text=f"✓ Authenticated as {selected_email}", text_color="green")
-                self.update_status(f"Authenticated as {selected_email}")
-            else:
-                error_data = resp.json() if resp.content else {}
-                error_msg = error_data.get('error', {}).get('message', 'Unknown error')
-                self.log_to_terminal("Auth", "error", f"Authentication failed: {error_msg}")
-                self.auth_status.configure(text="✗ Authentication failed", text_color="red")
-                
-        except requests.RequestException as e:
-            self.log_to_terminal("Auth", "error", f"Authentication request failed: {e}")
-            self.auth_status.configure(text="✗ Network error", text_color="red")
-    
-    def join_room(self):
-        """Join a room using the room ID."""
-        room_id = self.room_entry.get().strip()
-        if not room_id:
-            self.log_to_terminal("Room", "warning", "Please enter a room ID")
-            return
-        
-        if not self.client_token:
-            self.log_to_terminal("Room", "warning", "Please authenticate first")
-            return
-        
-        self.log_to_terminal("Room", "info", f"Joining room {room_id}")
-        
-        # Make API request to join room
-        headers = {"Authorization": f"Bearer {self.client_token}"}
-        
-        try:
-            self.log_to_terminal("Room", "api_call", f"POST /rooms/{room_id}/join")
-            resp = requests.post(f"{BASE_URL.rstrip('/')}/rooms/{room_id}/join", headers=headers, timeout=10)
-            
-            if resp.status_code == 200:
-                self.log_to_terminal("Room", "success", f"Successfully joined room {room_id}")
-                self.update_status(f"Joined room: {room_id}")
-                self.current_room_id = room_id
-            else:
-                error_text = resp.text if resp.content else "Unknown error"
-                self.log_to_terminal("Room", "error", f"Failed to join room: {resp.status_code} - {error_text}")
-                
-        except requests.RequestException as e:
-            self.log_to_terminal("Room", "error", f"Room join request failed: {e}")
-    
-    def connect_websocket(self):
-        """Connect to WebSocket for real-time updates."""
-        if not hasattr(self, 'current_room_id'):
-            self.log_to_terminal("WebSocket", "warning", "Please join a room first")
-            return
-        
-        if not self.client_token:
-            self.log_to_terminal("WebSocket", "warning", "Please authenticate first")
-            return
-        
-        if self.ws_thread and self.ws_thread.is_alive():
-            self.log_to_terminal("WebSocket", "warning", "WebSocket already connected")
-            return
-        
-        self.is_disconnecting = False
-        self.ws_thread = threading.Thread(target=self.websocket_loop, daemon=True)
-        self.ws_thread.start()
-        
-        self.log_to_terminal("WebSocket", "info", "Starting WebSocket connection...")
-    
-    def websocket_loop(self):
-        """WebSocket connection loop for this client."""
-        ws_url = f"{WEBSOCKET_URL.rstrip('/')}/rooms/{self.current_room_id}?token={self.client_token}"
-        
-        try:
-            self.log_to_terminal("WebSocket", "info", f"Connecting to {ws_url}")
-            
-            async def ws_handler():
-                async with websockets.connect(ws_url) as websocket:
-                    self.log_to_terminal("WebSocket", "success", "WebSocket connected")
-                    
-                    async for message in websocket:
-                        if self.is_disconnecting:
-                            break
-                        
-                        try:
-                            data = json.loads(message)
-                            self.handle_websocket_message(data)
-                        except json.JSONDecodeError:
-                            self.log_to_terminal("WebSocket", "error", f"Invalid JSON received: {message}")
-            
-            # Run the async WebSocket handler
-            asyncio.run(ws_handler())
-            
-        except Exception as e:
-            if not self.is_disconnecting:
-                self.log_to_terminal("WebSocket", "error", f"WebSocket error: {e}")
-    
-    def handle_websocket_message(self, data):
-        """Handle incoming WebSocket messages."""
-        msg_type = data.get('type', 'unknown')
-        self.log_to_terminal("WebSocket", "ws_recv", f"Received {msg_type}", payload=data)
-        
-        if msg_type == 'song_change':
-            song_data = data.get('song', {})
-            self.update_status(f"Song changed: {song_data.get('title', 'Unknown')}")
-            
-            # Fetch and display new song image
-            expected_etag = data.get('image_etag')
-            if expected_etag:
-                self.fetch_and_display_image(expected_etag)
-        
-        elif msg_type == 'room_state':
-            # Initial room state
-            current_song = data.get('current_song', {})
-            if current_song:
-                self.update_status(f"Current song: {current_song.get('title', 'Unknown')}")
-                expected_etag = data.get('image_etag')
-                if expected_etag:
-                    self.fetch_and_display_image(expected_etag)
-    
-    def fetch_and_display_image(self, expected_etag):
-        """Fetch and display room image with ETag caching."""
-        if not hasattr(self, 'current_room_id') or not self.client_token:
-            return
-        
-        # Check cache first
-        cache = get_current_user_cache()
-        cached_image = cache.get_cached_image(expected_etag)
-        
-        if cached_image:
-            self.log_to_terminal("Cache", "info", f"Using cached image for ETag {expected_etag[:10]}...")
-            self.display_image_bytes(cached_image)
-            return
-        
-        # Fetch from server using client's own logging
-        headers = {"Authorization": f"Bearer {self.client_token}"}
-        # Remove old single-image cache references
-        # This method needs to be updated for dictionary cache
-        if False:  # Disabled - needs refactoring
-            normalized_etag = ""
-            if not normalized_etag.startswith('"'):
-                normalized_etag = f'"{normalized_etag}"'
-            headers["If-None-Match"] = normalized_etag
-            self.log_to_terminal("Cache", "info", f"Requesting image with If-None-Match header for ETag: {normalized_etag[:15]}...")
-        else:
-            self.log_to_terminal("Cache", "info", "No previous ETag. Requesting full image.")
-
-        self.log_to_terminal("Image", "api_call", f"GET /rooms/{self.current_room_id}/image")
-
-        try:
-            resp = requests.get(f"{BASE_URL.rstrip('/')}/rooms/{self.current_room_id}/image", headers=headers, timeout=10)
-            if resp.status_code == 200:
-                etag_raw = resp.headers.get('ETag', '')
-                etag_hex = ImageHelper.normalize_etag(etag_raw)
-                self.log_to_terminal("Image", "api_resp", f"Status 200 OK. Received new image ({len(resp.content)} bytes). New ETag: {etag_hex}")
-                img_bytes = resp.content
-                status = 200
-            elif resp.status_code == 304:
-                self.log_to_terminal("Image", "api_resp", "Status 304 Not Modified. Server confirms cached image is still valid.")
-                img_bytes = None
-                etag_hex = None  # Needs refactoring for dict cache
-                status = 304
-            else:
-                self.log_to_terminal("Image", "error", f"Image fetch failed: {resp.status_code} - {resp.text}")
-                return
-        except requests.RequestException as e:
-            self.log_to_terminal("Image", "error", f"Image fetch error: {e}")
-            return
-        
-        if status == 200 and img_bytes:
-            # Store in dictionary cache instead
-            if etag_hex:
-                self.image_cache[etag_hex] = img_bytes
-            cache.cache_image(etag_hex, img_bytes)
-            self.display_image_bytes(img_bytes)
-        elif status == 304:
-            # Find image in cache for 304 response
-            for cached_etag, cached_bytes in self.image_cache.items():
-                if cached_bytes:
-                    self.display_image_bytes(cached_bytes)
-                    break
-    
-    def display_image_bytes(self, image_bytes):
-        """Display image in client window."""
-        try:
-            for widget in self.image_display.winfo_children():
-                widget.destroy()
-            
-            pil_img = Image.open(io.BytesIO(image_bytes))
-            pil_img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-            ctk_img = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=pil_img.size)
-            img_label = ctk.CTkLabel(self.image_display, image=ctk_img, text="")
-            img_label.image = ctk_img
-            img_label.pack(expand=True)
-            
-        except Exception as e:
-            self.log_to_terminal("Image", "error", f"Error displaying image: {e}")
-            ctk.CTkLabel(self.image_display, text="Error loading image", text_color="red").pack(pady=10)
-    
-    def update_status(self, message):
-        """Update client status display."""
-        timestamp = time.strftime("%H:%M:%S")
-        status_message = f"[{timestamp}] {message}\n"
-        
-        self.status_text.insert(tk.END, status_message)
-        self.status_text.see(tk.END)
-    
-    def disconnect_websocket(self):
-        """Disconnect WebSocket connection."""
-        self.is_disconnecting = True
-        if self.ws_thread and self.ws_thread.is_alive():
-            self.log_to_terminal("WebSocket", "info", "Disconnecting WebSocket...")
-            # Thread will terminate naturally
-        self.update_status("WebSocket disconnected")
-    
-    def disconnect(self):
-        """Disconnect and close client window."""
-        self.is_disconnecting = True
-        
-        # Disconnect WebSocket
-        if self.ws_thread and self.ws_thread.is_alive():
-            self.log_to_terminal("System", "info", "Disconnecting...")
-        
-        # Remove from cache
-        cache = get_current_user_cache()
-        cache.remove_client(self)
-        
-        # Close window
-        if hasattr(self, 'window') and self.window.winfo_exists():
-            self.window.destroy()
-        
-        log("System", "info", f"Client {self.client_id} disconnected")
-
-def add_client_user():
-    """Add a new simulated client user."""
-    cache = get_current_user_cache()
-    client_id = len(cache.simulated_clients) + 1
-    
-    # Create new client with separate terminal
-    client = SimulatedClient(client_id)
-    
-    log("System", "success", f"Added client {client_id} with separate API terminal")
-
 # === SECTION 6: PLAYLIST MANAGEMENT FUNCTIONS ===
 
 def load_all_songs_for_playlist():
@@ -3596,10 +6492,12 @@ class SimulatedClient:
     def __init__(self, client_id):
         self.client_id = client_id
         self.log_source = f"Client {self.client_id}"
-        self.client_token = None
-        self.ws_thread = None
+        self.email = None  # Signed-in user; the token itself lives in TokenManager
+        self.ws_task = None  # Future of _ws_client_loop on the shared ClientEventLoop
         self.is_disconnecting = False
-        self.image_cache = {}  # Dictionary cache: {etag: image_bytes}
+        self.image_cache = ImageCacheView(f"Client {client_id}", CLIENT_IMAGE_CACHE_MAX_BYTES, source=f"Client {client_id}")  # etag -> image_bytes
+        self.last_image_etag = None  # Sent as If-None-Match on the next room image fetch
+        self._display_seq = 0  # Bumped per song/page update so a late image fetch is not drawn
         self.state_lock = threading.Lock()  # Prevent race conditions
         simulated_clients.append(self)
         
@@ -3623,7 +6521,7 @@ class SimulatedClient:
         
         self.song_display_frame = ctk.CTkFrame(main_frame, fg_color="#1a1a1a")
         self.song_display_frame.pack(fill="both", expand=True, pady=10)
-        ctk.CTkLabel(self.song_display_frame, text="Awaiting connection...").pack(expand=True)
+        ImageView.for_frame(self.song_display_frame).show_text("Awaiting connection...")
 
         self.console_text = scrolledtext.ScrolledText(main_frame, height=10, bg="#2b2b2b", fg="white", state="disabled", font=("Courier", 10))
         self.console_text.pack(fill="x", pady=10, padx=5)
@@ -3644,29 +6542,46 @@ class SimulatedClient:
             self.console_text.config(state="disabled")
         if self.client_window.winfo_exists(): self.client_window.after(0, do_log)
     
+    def ui_call(self, func, *args):
+        """Run func on the Tk thread (safe to call from ClientEventLoop)."""
+        if self.client_window.winfo_exists(): self.client_window.after(0, func, *args)
+    
+    @property
+    def client_token(self):
+        return TokenManager.current_token(self.email)
+
     def get_client_token(self):
-        user = TEST_USERS[self.client_id - 1]
-        url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-        payload = {"email": user["email"], "password": user["password"], "returnSecureToken": True}
+        ClientEventLoop.submit(self._sign_in())
+
+    async def _sign_in(self):
+        # Wrap around so any number of clients can be opened from a small pool
+        user = TEST_USERS[(self.client_id - 1) % len(TEST_USERS)]
         
         self.log("api_call", f"Signing in as {user['email']}...")
-        resp = requests.post(url, json=payload, timeout=10)
-        if resp.status_code == 200:
-            self.client_token = resp.json().get("idToken")
-            self.signin_button.configure(state="disabled", text=f"Signed in")
-            self.join_button.configure(state="normal")
-            self.log("success", "Authentication successful.")
-        else:
-            self.log("error", f"Auth failed: {resp.json().get('error', {}).get('message')}")
+        try:
+            credential, how = await TokenManager.ensure_async(user["email"], user["password"], source=self.log_source)
+        except AuthError as e:
+            self.log("error", f"Auth failed: {e}")
+            return
+        except requests.RequestException as e:
+            self.log("error", f"Auth request failed: {e}")
+            return
+        self.email = credential.email
+        self.ui_call(lambda: self.signin_button.configure(state="disabled", text=f"Signed in"))
+        self.ui_call(lambda: self.join_button.configure(state="normal"))
+        self.log("success", f"Authentication successful (token {how}).")
 
     def join_room_api(self):
         cache = get_current_user_cache()
         if not cache.room_id: self.log("error", "Host has not created a room."); return
-        resp = make_api_request(self.log_source, 'POST', f'/rooms/{cache.room_id}/join', token=self.client_token)
+        ClientEventLoop.submit(self._join_room(cache.room_id))
+
+    async def _join_room(self, room_id):
+        resp = await make_api_request_async(self.log_source, 'POST', f'/rooms/{room_id}/join', token=self.client_token)
         if resp and resp['status'] < 400:
-            self.log("success", f"Joined room {cache.room_id} via REST.")
-            self.join_button.configure(state="disabled")
-            self.connect_button.configure(state="normal")
+            self.log("success", f"Joined room {room_id} via REST.")
+            self.ui_call(lambda: self.join_button.configure(state="disabled"))
+            self.ui_call(lambda: self.connect_button.configure(state="normal"))
             # No longer need to call /sync - WebSocket will provide initial state
             self.log("info", "Room joined. Connect via WebSocket to receive real-time updates.")
         else:
@@ -3674,47 +6589,57 @@ class SimulatedClient:
 
     def display_song(self, data):
         with self.state_lock:  # Prevent race conditions during UI updates
-            for widget in self.song_display_frame.winfo_children(): widget.destroy()
-            
+            self._display_seq += 1
             title = data.get('title', 'Unknown')
             page = data.get('current_page', 1)
             total_pages = data.get('total_pages', 1)
             image_etag = data.get('image_etag')
      
-            ctk.CTkLabel(self.song_display_frame, text=f"{title} - Page {page}/{total_pages}").pack(pady=5)
-            image_frame = ctk.CTkFrame(self.song_display_frame, fg_color="#333333")
-            image_frame.pack(fill="both", expand=True, padx=5, pady=5)
+            view = ImageView.for_frame(self.song_display_frame)
+            view.set_caption(f"{title} - Page {page}/{total_pages}")
             
             # Normalize both ETags for consistent comparison
             expected_normalized = _normalize_etag(image_etag) if image_etag else None
-            # Remove old single-cache reference
-            cached_normalized = None
             
             # Check dictionary cache first
-            if expected_normalized and expected_normalized in self.image_cache:
+            cached_image = self.image_cache.get(expected_normalized) if expected_normalized else None
+            if cached_image:
+                self.last_image_etag = expected_normalized
                 self.log("cache", f"Retrieved cached image for ETag {expected_normalized[:10]}...")
                 self.log("cache", f"ETag from WebSocket ({expected_normalized[:10]}...) found in client cache. Using stored image.")
-                display_image_bytes(image_frame, self.image_cache[expected_normalized], max_size=(450, 550))
+                display_image_bytes(self.song_display_frame, cached_image, max_size=(450, 550), etag=expected_normalized)
             else:
                 cache = get_current_user_cache()
-                # Don't send If-None-Match if we don't have the image cached
-                # This prevents 304 responses when client cache is empty
-                status, img_bytes, etag_hex = fetch_room_image(self.log_source, self.client_token, cache.room_id, None)
-                if status == 200 and img_bytes:
-                    # Store in dictionary cache
-                    if etag_hex:
-                        self.image_cache[etag_hex] = img_bytes
-                        self.log("cache", f"Cached image with ETag {etag_hex[:10]}... ({len(img_bytes)} bytes)")
-                    display_image_bytes(image_frame, img_bytes, max_size=(450, 550))
-                elif status == 304:
-                    # This shouldn't happen since we didn't send If-None-Match
-                    self.log("warning", f"Unexpected 304 response - requesting full image")
-                    status, img_bytes, etag_hex = fetch_room_image(self.log_source, self.client_token, cache.room_id, None)
-                    if status == 200 and img_bytes and etag_hex:
-                        self.image_cache[etag_hex] = img_bytes
-                        display_image_bytes(image_frame, img_bytes, max_size=(450, 550))
-                else:
-                    ctk.CTkLabel(image_frame, text="Image not available yet.").pack(expand=True)
+                view.show_text("Loading image...")
+                ClientEventLoop.submit(self._fetch_song_image(self._display_seq, cache.room_id))
+
+    async def _fetch_song_image(self, seq, room_id):
+        # Revalidate the last image this client holds; with none, fetch_room_image_async falls back to
+        # a disk-cached copy or omits If-None-Match so an empty cache never gets a bare 304
+        prev_etag = self.last_image_etag if self.last_image_etag in self.image_cache else None
+        cached_bytes = self.image_cache.peek(prev_etag)
+        status, img_bytes, etag_hex = await fetch_room_image_async(self.log_source, self.client_token, room_id,
+                                                                   prev_etag, cached_bytes=cached_bytes, display_size=(450, 550))
+        if status == 304 and not img_bytes:
+            # The copy we revalidated is gone; only a full response can be displayed
+            self.log("warning", f"Unexpected 304 response - requesting full image")
+            status, img_bytes, etag_hex = await fetch_room_image_async(self.log_source, self.client_token, room_id, None)
+        self.ui_call(self._show_song_image, seq, status, img_bytes, etag_hex)
+
+    def _show_song_image(self, seq, status, img_bytes, etag_hex):
+        with self.state_lock:
+            if seq != self._display_seq or not self.song_display_frame.winfo_exists():
+                return  # A newer song/page update superseded this fetch
+            if status in (200, 304) and img_bytes:
+                # Store in dictionary cache
+                if status == 304:
+                    self.log("cache", f"Server confirmed ETag {etag_hex[:10]}... unchanged; reused {len(img_bytes)} cached bytes")
+                elif etag_hex and self.image_cache.put(etag_hex, img_bytes):
+                    self.log("cache", f"Cached image with ETag {etag_hex[:10]}... ({len(img_bytes)} bytes)")
+                self.last_image_etag = etag_hex
+                display_image_bytes(self.song_display_frame, img_bytes, max_size=(450, 550), etag=etag_hex)
+            else:
+                ImageView.for_frame(self.song_display_frame).show_text("Image not available yet.")
 
     def handle_message(self, msg):
         try:
@@ -3749,9 +6674,8 @@ class SimulatedClient:
                 self.log("warning", f"Room {msg_data.get('room_id', 'unknown')} was closed: {msg_data.get('reason', 'Unknown reason')}")
                 # Clear display safely
                 with self.state_lock:
-                    for widget in self.song_display_frame.winfo_children(): 
-                        widget.destroy()
-                    ctk.CTkLabel(self.song_display_frame, text="Room closed by host").pack(expand=True)
+                    self._display_seq += 1  # Drop any image fetch still in flight
+                    ImageView.for_frame(self.song_display_frame).show_text("Room closed by host")
             elif msg_type == "error":
                 self.log("error", f"WebSocket error: {data.get('message', 'Unknown error')}")
             else:
@@ -3764,6 +6688,7 @@ class SimulatedClient:
     async def _ws_client_loop(self):
         ws_url = _normalize_websocket_url(WEBSOCKET_URL, self.client_token)
         self.log("info", f"Connecting to WebSocket...")
+        trace = WebSocketTrace(ws_url)
         try:
             async with websockets.connect(ws_url) as websocket:
                 if self.client_window.winfo_exists():
@@ -3771,29 +6696,253 @@ class SimulatedClient:
                 self.log("success", "WebSocket connected.")
                 cache = get_current_user_cache()
                 join_payload = {"type": "join_room", "room_id": cache.room_id}
-                await websocket.send(json.dumps(join_payload))
+                join_message = json.dumps(join_payload)
+                await websocket.send(join_message)
+                trace.sent(join_message)
                 self.log("ws_send", "Sent join_room message.", payload=join_payload)
 
                 async for message in websocket:
+                    trace.received(message)
                     if self.is_disconnecting: break
                     if self.client_window.winfo_exists():
                         self.client_window.after(0, self.handle_message, message)
         except Exception as e:
             self.log("error", f"WebSocket connection failed: {e}")
         finally:
+            trace.close()
             if self.client_window.winfo_exists():
                 self.client_window.after(0, lambda: self.connect_button.configure(state="normal"))
             self.log("info", "WebSocket disconnected.")
 
     def connect(self):
         self.is_disconnecting = False
-        self.ws_thread = threading.Thread(target=lambda: asyncio.run(self._ws_client_loop()), daemon=True)
-        self.ws_thread.start()
+        self.ws_task = ClientEventLoop.submit(self._ws_client_loop())
 
     def disconnect(self):
         self.is_disconnecting = True
+        if self.ws_task: self.ws_task.cancel()
+        self.image_cache.clear()  # Unpin this client's images in the shared store
         if self.client_window.winfo_exists(): self.client_window.destroy()
 
+# --- User Pool ---
+def load_user_pool(path):
+    """Read test accounts from CSV (email,password header) or JSON (list or {"users": [...]})."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = json.load(f)
+            rows = rows.get("users", []) if isinstance(rows, dict) else rows
+    users, seen = [], set()
+    for row in rows:
+        email, password = (row.get("email") or "").strip(), row.get("password")
+        if email and password and email not in seen:
+            seen.add(email)
+            users.append({"email": email, "password": password})
+    return users
+
+def use_user_pool(path):
+    """Replace TEST_USERS in place (clients keep their reference) with the accounts in path."""
+    try:
+        users = load_user_pool(path)
+    except (OSError, ValueError, csv.Error) as e:
+        log("Users", "error", f"Cannot load user pool {path}: {e}")
+        return False
+    if not users:
+        log("Users", "warning", f"No email/password rows found in {path}")
+        return False
+    TEST_USERS[:] = users
+    LocalAuthServer.load_accounts(users)
+    log("Users", "success", f"Loaded {len(users)} test users from {path}")
+    return True
+
+def bulk_sign_in(users, concurrency=BULK_SIGNIN_CONCURRENCY, rate=BULK_SIGNIN_RATE):
+    """Sign in every user through TokenManager, concurrently; returns (signed in, failures).
+
+    rate caps sign-ins per second via the auth RateLimiter. Progress is
+    logged about every 5% and failures are grouped by Firebase error message.
+    """
+    if rate:
+        RateLimiter.configure(target=AUTH_TARGET, endpoint_class="auth", rate=rate, burst=max(1, int(rate)))
+    total = len(users)
+    log("Users", "info", f"Signing in {total} users ({concurrency} at a time{f', {rate:g}/s' if rate else ''})...")
+    started = time.perf_counter()
+    done, failures = 0, {}
+    step = max(1, total // 20)
+
+    def sign_in(user):
+        return TokenManager.ensure(user["email"], user["password"], source=None)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bulk-signin") as pool:
+        futures = {pool.submit(sign_in, user): user for user in users}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except (AuthError, requests.RequestException) as e:
+                reason = str(e) if isinstance(e, AuthError) else type(e).__name__
+                failures.setdefault(reason, []).append(futures[future]["email"])
+            done += 1
+            if done % step == 0 or done == total:
+                failed = sum(len(v) for v in failures.values())
+                elapsed = time.perf_counter() - started
+                log("Users", "info", f"Sign-in progress {done}/{total} ({failed} failed, {done / elapsed:.0f}/s)")
+    signed_in = total - sum(len(v) for v in failures.values())
+    log("Users", "success" if not failures else "warning",
+        f"Bulk sign-in finished in {time.perf_counter() - started:.1f}s: {signed_in}/{total} users have tokens")
+    for reason, emails in sorted(failures.items(), key=lambda item: -len(item[1])):
+        log("Users", "error", f"{len(emails)} failed with {reason} (e.g. {', '.join(emails[:3])})")
+    return signed_in, failures
+
+def start_bulk_sign_in():
+    if not TEST_USERS:
+        log("Users", "warning", "No test users loaded.")
+        return
+    threading.Thread(target=bulk_sign_in, args=(list(TEST_USERS),), daemon=True, name="bulk-signin").start()
+
+def choose_user_pool():
+    path = filedialog.askopenfilename(title="Select user pool", filetypes=[("User pools", "*.csv *.json"), ("All files", "*.*")])
+    if path:
+        use_user_pool(path)
+
+# --- Traffic Replay ---
+REPLAY_SPEEDS = {"1x": 1.0, "10x": 10.0, "Max speed": 0.0}
+
+def start_traffic_replay(speed_label):
+    """Pick a recorded HAR and replay it against the selected target with fresh tokens."""
+    # Host, clients and bulk-signed-in pool users all live in TokenManager
+    tokens = [c.id_token for c in TokenManager.credentials() if c.is_valid()]
+    if not tokens:
+        log("Replay", "warning", "Sign in the host, clients or the user pool first; their tokens replace the recorded ones.")
+        return
+    path = filedialog.askopenfilename(title="Select HAR recording", initialdir=HAR_DIR,
+                                      filetypes=[("HAR recordings", "*.har"), ("All files", "*.*")])
+    if not path:
+        return
+    try:
+        replayer = TrafficReplayer(path, CURRENT_TARGET, tokens, speed=REPLAY_SPEEDS[speed_label])
+    except (OSError, ValueError, KeyError) as e:
+        log("Replay", "error", f"Cannot load {path}: {e}")
+        return
+    ClientEventLoop.submit(replayer.run())
+
+# --- Transport Statistics ---
+def show_http_stats():
+    """Log per-endpoint timing aggregates from RequestMetrics to the main console."""
+    rows = RequestMetrics.summary()
+    if not rows:
+        log("Stats", "info", "No HTTP requests recorded yet.")
+        return
+    log("Stats", "info", f"HTTP timings for {sum(r['count'] for r in rows)} requests "
+                         f"({SingleFlight.coalesced_count} coalesced into in-flight GETs):")
+    for r in rows:
+        log("Stats", "info", f"{r['endpoint']}: n={r['count']} p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms | "
+                             f"dns {r['dns_ms']:.1f} connect {r['connect_ms']:.1f} tls {r['tls_ms']:.1f} "
+                             f"ttfb {r['ttfb_ms']:.1f} body {r['body_ms']:.1f} ms | "
+                             f"avg {r['avg_bytes']} B | new conns {r['new_connections']}")
+    compression = RequestMetrics.compression_summary()
+    if compression:
+        log("Stats", "info", f"Compression (Accept-Encoding: {HTTPTransport.accept_encoding}):")
+    for r in compression:
+        log("Stats", "info", f"{r['endpoint']}: {r['wire_bytes']} B on the wire -> {r['decoded_bytes']} B decoded "
+                             f"(ratio {r['ratio']:.2f}x, saved {r['saved_pct']:.0f}%, {'/'.join(r['encodings'])})")
+    for (target, method), n in sorted(RetryPolicy.retry_counts.items()):
+        gave_up = RetryPolicy.exhausted_counts.get((target, method), 0)
+        log("Stats", "info", f"Retries {target} {method}: {n} retried, {gave_up} gave up after last attempt")
+    for breaker in CircuitBreaker.all():
+        log("Stats", "warning" if breaker.state != "closed" else "info", f"Circuit {breaker.describe()}")
+    for limiter in RateLimiter.all():
+        log("Stats", "info", f"Limiter {limiter.describe()}")
+    log("Stats", "info", f"Tokens: {TokenManager.describe()}")
+    log("Stats", "info", f"Image cache {SHARED_IMAGE_CACHE.describe()}")
+    for view in ImageCacheView.all():
+        log("Stats", "info", f"Image cache view {view.describe()}")
+    if DiskImageStore.enabled():
+        log("Stats", "info", f"Image disk cache {DiskImageStore.describe()}")
+    log("Stats", "info", f"Thumbnail cache: {ThumbnailCache.describe()}")
+    log("Stats", "info", f"Image decode: {DecodePipeline.describe()}")
+    log("Stats", "info", f"Image views: {ImageView.describe()}")
+    for mode, size, n, p50, p95 in ThumbnailCache.timing_summary():
+        log("Stats", "info", f"Decode+resize {mode} to {size[0]}x{size[1]}: n={n} p50={p50:.1f}ms p95={p95:.1f}ms")
+    log("Stats", "info", f"Host page prefetch: {PagePrefetcher.describe()}")
+    for source, full, not_modified, saved, _ in ConditionalGetStats.summary():
+        log("Stats", "info", f"Room image {source}: {full} full downloads, {not_modified} revalidated (304), "
+                             f"{saved / 1024:.0f} KiB saved")
+
+# --- Image Cache Metrics ---
+IMAGE_METRIC_TOTALS = ("hits", "misses", "full_downloads", "revalidated_304", "bytes_downloaded", "bytes_avoided", "released")
+
+def image_cache_metrics():
+    """Snapshot of every host and client image cache view, with totals, as plain JSON-ready data."""
+    rows = [view.metrics() for view in ImageCacheView.all()]
+    totals = {key: sum(r[key] for r in rows) for key in IMAGE_METRIC_TOTALS}
+    # Views share one copy of each image, so resident size comes from the store, not the sum of views
+    totals["resident_images"] = len(SHARED_IMAGE_CACHE)
+    totals["resident_bytes"] = SHARED_IMAGE_CACHE.resident_bytes
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "target": CURRENT_TARGET,
+        "totals": totals,
+        "views": rows,
+        "thumbnails": {"hits": ThumbnailCache.hits, "misses": ThumbnailCache.misses, "evictions": ThumbnailCache.evictions},
+        "disk": {"enabled": DiskImageStore.enabled(), "hits": DiskImageStore.hits, "misses": DiskImageStore.misses,
+                 "evictions": DiskImageStore.evictions},
+    }
+
+def export_image_metrics(path):
+    snapshot = image_cache_metrics()
+    try:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        log("Stats", "error", f"Could not export image cache metrics to {path}: {e}")
+        return
+    t = snapshot["totals"]
+    log("Stats", "success", f"Exported image cache metrics for {len(snapshot['views'])} caches to {path} "
+                            f"({t['bytes_avoided'] / 1024:.0f} KiB avoided, {t['bytes_downloaded'] / 1024:.0f} KiB downloaded)")
+
+def _format_image_metrics(snapshot):
+    header = f"{'Owner':<28}{'Hits':>7}{'Miss':>7}{'Hit%':>6}{'200':>6}{'304':>6}{'Down KiB':>10}{'Saved KiB':>11}{'Held':>6}{'KiB':>8}"
+    lines = [f"{snapshot['timestamp']}  target {snapshot['target']}", "", header, "-" * len(header)]
+    for r in snapshot["views"]:
+        lines.append(f"{r['owner'][:27]:<28}{r['hits']:>7}{r['misses']:>7}{r['hit_rate'] * 100:>6.0f}{r['full_downloads']:>6}"
+                     f"{r['revalidated_304']:>6}{r['bytes_downloaded'] / 1024:>10.0f}{r['bytes_avoided'] / 1024:>11.0f}"
+                     f"{r['resident_images']:>6}{r['resident_bytes'] / 1024:>8.0f}")
+    t = snapshot["totals"]
+    lookups = t["hits"] + t["misses"]
+    lines += ["-" * len(header),
+              f"{'Total (shared store)':<28}{t['hits']:>7}{t['misses']:>7}{(100 * t['hits'] / lookups if lookups else 0):>6.0f}"
+              f"{t['full_downloads']:>6}{t['revalidated_304']:>6}{t['bytes_downloaded'] / 1024:>10.0f}"
+              f"{t['bytes_avoided'] / 1024:>11.0f}{t['resident_images']:>6}{t['resident_bytes'] / 1024:>8.0f}"]
+    return "\n".join(lines)
+
+def show_cache_metrics():
+    """Live table of image cache counters, refreshed every second until the window is closed."""
+    metrics_window = ctk.CTkToplevel(window)
+    metrics_window.title("Image Cache Metrics")
+    metrics_window.geometry("860x420")
+    textbox = ctk.CTkTextbox(metrics_window, wrap="none", font=("Courier", 13))
+    textbox.pack(expand=True, fill="both", padx=10, pady=(10, 5))
+
+    def export():
+        path = filedialog.asksaveasfilename(parent=metrics_window, title="Export image cache metrics",
+                                            defaultextension=".json", initialfile="image_cache_metrics.json",
+                                            filetypes=[("JSON", "*.json"), ("All files", "*.*")])
+        if path:
+            export_image_metrics(path)
+
+    def refresh():
+        if not metrics_window.winfo_exists():
+            return
+        textbox.configure(state="normal")
+        textbox.delete("1.0", "end")
+        textbox.insert("1.0", _format_image_metrics(image_cache_metrics()))
+        textbox.configure(state="disabled")
+        metrics_window.after(1000, refresh)
+
+    ctk.CTkButton(metrics_window, text="Export JSON...", command=export).pack(pady=(0, 10))
+    refresh()
+
 # --- UI Setup ---
 def clear_main_frame():
     for widget in main_frame.winfo_children(): widget.destroy()
@@ -3896,6 +7045,54 @@ For this tool to work, create a `.env` file in the same directory with your Fire
 You can also add custom environment URLs:
 `VM1_BASE_URL="http://your.vm.ip:8000/"`
 `VM1_WS_URL="ws://your.vm.ip:8000/ws"`
+Connections are reused (HTTP keep-alive) per target; tune the pool with:
+`HTTP_POOL_SIZE=20`
+Identical concurrent GETs sent with the same token (e.g. repeated `/rooms/{id}/image` polls) share one response.
+Set `COALESCE_GETS=0` (or use the switch under Client Controls) to generate real fan-out load.
+Failed GETs are retried with jittered backoff (`HTTP_RETRY_ATTEMPTS=3`, POSTs only with `HTTP_RETRY_POST=1`);
+requests sent from the UI thread are tried once so a dead target cannot freeze the window.
+After `BREAKER_FAILURE_THRESHOLD=5` failures in a row a target fails fast for `BREAKER_RESET_SECONDS=15`.
+Outbound traffic is shaped per target and endpoint class (auth / REST / images) with `RATE_LIMIT_RPS`,
+`RATE_LIMIT_BURST` and `MAX_IN_FLIGHT` (0 = unlimited); set `PRODUCTION_RATE_LIMIT_RPS=20` to cap Production
+when no `RATE_LIMIT_RPS` is set (logged when the cap first applies). Requests from the UI thread are refused with a
+"Throttled" error instead of freezing the window; background and client requests wait their turn.
+Use Apply Limits under Client Controls to change the active target's limits at runtime.
+Toggle Record HAR trace (or start with `HAR_RECORD=1`) to stream all REST and WebSocket traffic into
+`HAR_DIR`; bodies over `HAR_INLINE_BODY_MAX` bytes go to a side folder and secrets are masked unless `HAR_REDACT=0`.
+Replay HAR... re-issues a recording against the selected target at 1x, 10x or max speed; recorded users are
+mapped onto the tokens of the signed-in host and clients, and newly created room IDs replace recorded ones.
+Every sign-in path shares one TokenManager: tokens are reused until near expiry and renewed in the
+background with the refresh token `TOKEN_REFRESH_MARGIN=300` seconds before they lapse.
+Load a user pool (`TEST_USERS_FILE=users.csv` with an `email,password` header, or JSON) and use Sign In All
+Users to authenticate it concurrently (`BULK_SIGNIN_CONCURRENCY=50`, `BULK_SIGNIN_RATE` sign-ins/s, 0 = unlimited).
+Enable Local auth stand-in (or `LOCAL_AUTH=1`) to sign in offline: it serves signInWithPassword and token
+refresh on `LOCAL_AUTH_PORT=9099` and issues HS256 JWTs a local backend can verify with `LOCAL_AUTH_SECRET`.
+Set `TOKEN_CACHE_PATH=~/.music_room_tokens.json` to keep tokens (never passwords) across restarts in a 0600 file.
+Responses are requested with gzip (plus br / zstd when brotli / zstandard are installed); set
+`HTTP_ACCEPT_ENCODING=identity` for an uncompressed baseline and compare ratios in Show HTTP Stats.
+Cached images are held in a segmented LRU hard-capped at `IMAGE_CACHE_MAX_BYTES` (64 MiB, one store for the whole process).
+The host may pin `HOST_IMAGE_CACHE_MAX_BYTES` (24 MiB) and each client `CLIENT_IMAGE_CACHE_MAX_BYTES` (16 MiB) of it;
+when pinned images fill the store, new ones are shown but not cached. Show HTTP Stats reports hits, misses, evictions
+and refusals.
+The host and all clients share one copy of each image; per-client views only record which ETags each holds.
+Resized, display-ready images are reused per (ETag, size) up to `THUMBNAIL_CACHE_MAX_BYTES` (32 MiB decoded).
+Every room image fetch sends the last held ETag as If-None-Match; Show HTTP Stats counts 200s vs 304s and bytes saved.
+With `IMAGE_NEGOTIATION=1`, image requests send `Accept` (AVIF / WebP when Pillow can decode them) and
+`X-Display-Size: WxH` for the frame they fill (off by default; the backend is not known to honour them). Compare Image Sizes
+always sends them and starts a local stand-in on `IMAGE_VARIANT_PORT=9098`
+that honours both, then logs bytes and decode time against the full-size original at each display size.
+Resizing uses `RESAMPLE_MODE=quality` (LANCZOS) for pages and `TILE_RESAMPLE_MODE=fast` (JPEG draft decode plus
+bilinear) for tiles up to 256px; switch them under Client Controls and compare timings in Show HTTP Stats.
+Images are decoded on `DECODE_WORKERS` background threads; a newer image for the same frame cancels a stale decode.
+Image areas keep their labels and only swap the picture and caption; render time per update is in Show HTTP Stats.
+Image Cache Metrics shows live hits, misses, 304s, bytes downloaded and avoided per host and client; set
+`IMAGE_METRICS_PATH=image_cache_metrics.json` to export the same counters when the app exits.
+The host prefetches `PREFETCH_WINDOW=2` pages either side of the current one in the background, capped at
+`PREFETCH_MAX_BYTES_PER_SEC` (2 MiB/s, 0 = unlimited), so Next/Prev Page render without waiting for the network.
+With `IMAGE_DISK_CACHE=1`, images are also kept on disk in `IMAGE_DISK_CACHE_DIR` (default
+`~/.cache/educationalGUI/images`, capped at `IMAGE_DISK_CACHE_MAX_BYTES`, 512 MiB) so after a restart the room image
+is revalidated with a 304 instead of downloaded again. Files are keyed by target, URL and ETag and are read and
+written off the UI thread.
     """
     textbox.insert("1.0", guide_text)
     textbox.configure(state="disabled")
@@ -3949,11 +7146,26 @@ def main():
     # Initialize song dropdown variable
     song_dropdown_var = ctk.StringVar()
     
+    if os.getenv("HAR_RECORD") == "1":
+        HARRecorder.start()
+    if os.getenv("LOCAL_AUTH") == "1":
+        LocalAuthServer.start()
+    if TokenStore.path:
+        TokenManager.warm_from_disk()
+    if TEST_USERS_FILE:
+        use_user_pool(TEST_USERS_FILE)
+
     # Start with mode selection
     setup_mode_selection_ui()
     
     # Start the GUI
     window.mainloop()
+    if IMAGE_METRICS_PATH:
+        export_image_metrics(IMAGE_METRICS_PATH)
+    HARRecorder.stop()
+    LocalAuthServer.stop()
+    ImageVariantServer.stop()
+    TokenStore.flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file